@@ -50,7 +50,13 @@ The resulting file will be:
     @t2 [{2},{null}]
 """
 
-from .template import JSVTemplate, JSVRecordDecodeError, JSVTemplateDecodeError
-from .template_io import JSVCollection, JSVReader, JSVWriter
+from .template import JSVTemplate, JSVRecord, JSVRecordDecodeError, JSVTemplateDecodeError
+from .template_io import JSVCollection, JSVReader, JSVWriter, iter_buffer, transcode_to_json, transcode_from_json
+from .partition import PartitionedJSVWriter
+from .shards import split, merge
+from .stats import JSVStats, TemplateStats
+from .intern import Interner
+from .memo import MemoEncoder
+from . import hooks
 from .__version__ import __description__, __url__, __version__, __commit_hash__, __author__, __author_email__
 from .__version__ import __license__, __copyright__
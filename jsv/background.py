@@ -0,0 +1,85 @@
+from queue import Queue
+from threading import Thread, Event
+
+
+DEFAULT_QUEUE_SIZE = 1024
+
+_STOP = object()
+
+
+class _Call:
+    __slots__ = ('fn', 'done', 'result', 'error')
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.done = Event()
+        self.result = None
+        self.error = None
+
+
+class BackgroundWorker:
+    """Run ``handle(item)`` on a background thread for each item put on a bounded queue, in the order they were put.
+
+    When the queue is full, :meth:`put` either blocks until there is room or raises :class:`queue.Full`. An exception
+    raised by ``handle`` does not stop the thread; the first one is kept, and raised to the caller by the next
+    :meth:`check`, :meth:`call` or :meth:`close`.
+
+    Args:
+        handle (callable): Called on the background thread with each item.
+        queue_size (int): Maximum number of items waiting in the queue.
+        name (str): Name of the thread.
+    """
+    def __init__(self, handle, queue_size=DEFAULT_QUEUE_SIZE, name='jsv-background'):
+        if not isinstance(queue_size, int) or queue_size < 1:
+            raise ValueError('argument `queue_size` must be a positive integer')
+        self._handle = handle
+        self._queue = Queue(maxsize=queue_size)
+        self._error = None
+        self._thread = Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            if isinstance(item, _Call):
+                try:
+                    item.result = item.fn()
+                except BaseException as ex:
+                    item.error = ex
+                item.done.set()
+                continue
+            try:
+                self._handle(item)
+            except BaseException as ex:
+                if self._error is None:
+                    self._error = ex
+
+    def put(self, item, block=True):
+        """Queue ``item``. If ``block`` is false and the queue is full, raise :class:`queue.Full` instead of waiting."""
+        self._queue.put(item, block)
+
+    def call(self, fn):
+        """Run ``fn`` on the background thread once the items queued before it are handled, and return its result."""
+        c = _Call(fn)
+        self._queue.put(c)
+        c.done.wait()
+        self.check()
+        if c.error is not None:
+            raise c.error
+        return c.result
+
+    def check(self):
+        """Raise the first exception raised by ``handle`` since the last check, if any."""
+        ex = self._error
+        if ex is not None:
+            self._error = None
+            raise ex
+
+    def close(self):
+        """Handle the items already queued, then stop the thread and wait for it to exit."""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        self.check()
@@ -0,0 +1,217 @@
+"""Benchmarks comparing JSV to JSON lines.
+
+Run from the command line with ``python -m jsv.bench``. Each benchmark case encodes or decodes a synthetic dataset
+(see :mod:`jsv.bench.datasets`) with both JSV and JSON lines, and reports records per second, MB per second, bytes on
+disk and peak memory as measured by :mod:`tracemalloc`. Results are returned as a json-compatible dict so that runs
+from different versions can be saved and compared.
+"""
+import json
+import os
+import platform
+import sys
+import tracemalloc
+from tempfile import TemporaryDirectory
+from time import perf_counter, strftime, gmtime
+
+from jsv import JSVCollection, JSVReader, JSVWriter
+from jsv.__version__ import __version__, __commit_hash__
+from jsv.bench.datasets import DATASETS
+
+
+CASES = ['template_encode', 'template_decode', 'writer', 'reader']
+json_dumps = json.JSONEncoder(separators=(',', ':')).encode
+
+
+def _encode_jsv(coll, records):
+    return [coll[tid].encode(obj) for tid, obj in records]
+
+
+def _decode_jsv(coll, encoded):
+    return [coll[tid].decode(s) for tid, s in encoded]
+
+
+def _encode_json(records):
+    return [json_dumps(obj) for _, obj in records]
+
+
+def _decode_json(encoded):
+    return [json.loads(s) for s in encoded]
+
+
+def _write_jsv(path, template_dict, records):
+    with JSVWriter(path, 'wt', template_dict) as w:
+        for tid, obj in records:
+            w.write(obj, tid)
+
+
+def _write_json(path, records):
+    with open(path, 'wt') as f:
+        for _, obj in records:
+            f.write(json_dumps(obj))
+            f.write('\n')
+
+
+def _read_jsv(path):
+    n = 0
+    with JSVReader(path) as r:
+        for _ in r:
+            n += 1
+    return n
+
+
+def _read_json(path):
+    n = 0
+    with open(path, 'rt') as f:
+        for line in f:
+            json.loads(line)
+            n += 1
+    return n
+
+
+def _best_time(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = perf_counter()
+        fn()
+        elapsed = perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def _peak_memory(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def _byte_len(strings):
+    return sum(len(s.encode('utf-8')) + 1 for s in strings)
+
+
+def _cases(dataset_name, template_dict, records, tmp_dir):
+    """Yield ``(case, fmt, fn, n_bytes)`` for every benchmark case of a dataset."""
+    coll = JSVCollection(template_dict)
+    jsv_encoded = _encode_jsv(coll, records)
+    json_encoded = _encode_json(records)
+    jsv_pairs = [(tid, s) for (tid, _), s in zip(records, jsv_encoded)]
+    jsv_bytes = _byte_len(jsv_encoded)
+    json_bytes = _byte_len(json_encoded)
+
+    yield 'template_encode', 'jsv', lambda: _encode_jsv(coll, records), jsv_bytes
+    yield 'template_encode', 'jsonl', lambda: _encode_json(records), json_bytes
+    yield 'template_decode', 'jsv', lambda: _decode_jsv(coll, jsv_pairs), jsv_bytes
+    yield 'template_decode', 'jsonl', lambda: _decode_json(json_encoded), json_bytes
+
+    jsv_path = os.path.join(tmp_dir, dataset_name + '.jsv')
+    json_path = os.path.join(tmp_dir, dataset_name + '.jsonl')
+    _write_jsv(jsv_path, template_dict, records)
+    _write_json(json_path, records)
+
+    yield 'writer', 'jsv', lambda: _write_jsv(jsv_path, template_dict, records), os.path.getsize(jsv_path)
+    yield 'writer', 'jsonl', lambda: _write_json(json_path, records), os.path.getsize(json_path)
+    yield 'reader', 'jsv', lambda: _read_jsv(jsv_path), os.path.getsize(jsv_path)
+    yield 'reader', 'jsonl', lambda: _read_json(json_path), os.path.getsize(json_path)
+
+
+def run(datasets=None, cases=None, records=1000, repeat=3, seed=0, memory=True):
+    """Run the benchmark suite.
+
+    Args:
+        datasets (list): Names of the datasets to run (see :data:`jsv.bench.datasets.DATASETS`). Defaults to all.
+        cases (list): Names of the cases to run (see :data:`CASES`). Defaults to all.
+        records (int): Number of records in each generated dataset.
+        repeat (int): Number of timing runs per case. The best time is reported.
+        seed (int): Seed for the dataset generators.
+        memory (bool): If true, make an additional traced run of each case to measure peak memory.
+
+    Returns:
+        dict: json-compatible results, with keys ``meta``, ``results`` and ``sizes``.
+    """
+    datasets = datasets or sorted(DATASETS)
+    cases = cases or CASES
+    for name in datasets:
+        if name not in DATASETS:
+            raise ValueError('Unknown dataset `{}`'.format(name))
+    for case in cases:
+        if case not in CASES:
+            raise ValueError('Unknown case `{}`'.format(case))
+
+    results = []
+    sizes = {}
+    with TemporaryDirectory() as tmp_dir:
+        for name in datasets:
+            template_dict, recs = DATASETS[name](records, seed)
+            n = len(recs)
+            for case, fmt, fn, n_bytes in _cases(name, template_dict, recs, tmp_dir):
+                if case == 'writer':
+                    sizes.setdefault(name, {})[fmt + '_bytes'] = n_bytes
+                if case not in cases:
+                    continue
+                seconds = _best_time(fn, repeat)
+                results.append({
+                    'dataset': name,
+                    'case': case,
+                    'format': fmt,
+                    'records': n,
+                    'bytes': n_bytes,
+                    'seconds': seconds,
+                    'records_per_sec': n / seconds if seconds else None,
+                    'mb_per_sec': n_bytes / 1e6 / seconds if seconds else None,
+                    'peak_memory_bytes': _peak_memory(fn) if memory else None
+                })
+            s = sizes.get(name)
+            if s and s.get('jsonl_bytes'):
+                s['ratio'] = s['jsv_bytes'] / s['jsonl_bytes']
+
+    return {
+        'meta': {
+            'jsv_version': __version__,
+            'commit_hash': __commit_hash__,
+            'python': sys.version.split()[0],
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'timestamp': strftime('%Y-%m-%dT%H:%M:%SZ', gmtime()),
+            'records': records,
+            'repeat': repeat,
+            'seed': seed
+        },
+        'results': results,
+        'sizes': sizes
+    }
+
+
+def compare(current, previous):
+    """Compare two result dicts returned by :func:`run`.
+
+    Returns:
+        list: ``(dataset, case, format, ratio)`` tuples, where ``ratio`` is the current records per second divided by
+        the previous records per second. Cases missing from either result are omitted.
+    """
+    prev = {(r['dataset'], r['case'], r['format']): r for r in previous['results']}
+    out = []
+    for r in current['results']:
+        key = (r['dataset'], r['case'], r['format'])
+        if key in prev and prev[key]['records_per_sec'] and r['records_per_sec']:
+            out.append(key + (r['records_per_sec'] / prev[key]['records_per_sec'],))
+    return out
+
+
+def format_table(res):
+    """Return a human readable table of the results returned by :func:`run`."""
+    lines = ['{0:<12} {1:<16} {2:<6} {3:>14} {4:>10} {5:>12} {6:>12}'.format(
+        'dataset', 'case', 'format', 'records/sec', 'MB/s', 'bytes', 'peak mem')]
+    for r in res['results']:
+        lines.append('{0:<12} {1:<16} {2:<6} {3:>14,.0f} {4:>10.2f} {5:>12,d} {6:>12}'.format(
+            r['dataset'], r['case'], r['format'], r['records_per_sec'] or 0, r['mb_per_sec'] or 0, r['bytes'],
+            '-' if r['peak_memory_bytes'] is None else '{:,d}'.format(r['peak_memory_bytes'])))
+    lines.append('')
+    lines.append('{0:<12} {1:>14} {2:>14} {3:>8}'.format('dataset', 'jsv bytes', 'jsonl bytes', 'ratio'))
+    for name, s in sorted(res['sizes'].items()):
+        lines.append('{0:<12} {1:>14,d} {2:>14,d} {3:>8.3f}'.format(
+            name, s.get('jsv_bytes', 0), s.get('jsonl_bytes', 0), s.get('ratio', 0)))
+    return '\n'.join(lines)
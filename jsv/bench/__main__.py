@@ -0,0 +1,44 @@
+import argparse
+import json
+import sys
+
+from jsv.bench import CASES, run, compare, format_table
+from jsv.bench.datasets import DATASETS
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m jsv.bench', description='Benchmark JSV against JSON lines.')
+    parser.add_argument('-n', '--records', type=int, default=1000, help='records per dataset (default: 1000)')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='timing runs per case (default: 3)')
+    parser.add_argument('-d', '--dataset', action='append', choices=sorted(DATASETS),
+                        help='dataset to run; may be repeated (default: all)')
+    parser.add_argument('-c', '--case', action='append', choices=CASES,
+                        help='case to run; may be repeated (default: all)')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the dataset generators')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc peak memory runs')
+    parser.add_argument('-o', '--output', help='write json results to this file ("-" for stdout)')
+    parser.add_argument('--compare', help='json results of a previous run to compare against')
+    args = parser.parse_args(argv)
+
+    res = run(args.dataset, args.case, args.records, args.repeat, args.seed, not args.no_memory)
+
+    if args.output == '-':
+        json.dump(res, sys.stdout, indent=2)
+        print()
+    else:
+        print(format_table(res), file=sys.stderr)
+        if args.output:
+            with open(args.output, 'wt') as f:
+                json.dump(res, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'rt') as f:
+            previous = json.load(f)
+        print('', file=sys.stderr)
+        print('{0:<12} {1:<16} {2:<6} {3:>8}'.format('dataset', 'case', 'format', 'speedup'), file=sys.stderr)
+        for dataset, case, fmt, ratio in compare(res, previous):
+            print('{0:<12} {1:<16} {2:<6} {3:>8.3f}'.format(dataset, case, fmt, ratio), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
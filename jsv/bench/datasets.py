@@ -0,0 +1,117 @@
+"""Synthetic datasets used by the benchmark suite.
+
+Each dataset is a function ``f(n, seed)`` that returns a tuple ``(template_dict, records)``. ``template_dict`` is
+suitable for the :class:`jsv.JSVCollection` constructor, and ``records`` is a list of ``(tid, obj)`` tuples. Output is
+deterministic for a given ``n`` and ``seed``.
+"""
+from random import Random
+
+
+WORDS = ['alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf', 'hotel', 'india', 'juliet', 'kilo', 'lima']
+STATUSES = ['pending', 'active', 'closed', 'suspended']
+COUNTRIES = ['US', 'CA', 'MX', 'GB', 'FR', 'DE', 'JP', 'BR']
+
+
+def _scalar(rnd, i):
+    r = i % 5
+    if r == 0:
+        return rnd.randint(-10 ** 6, 10 ** 6)
+    elif r == 1:
+        return round(rnd.uniform(-1000, 1000), 4)
+    elif r == 2:
+        return rnd.choice(WORDS)
+    elif r == 3:
+        return rnd.random() < 0.5
+    else:
+        return None
+
+
+def flat(n, seed=0):
+    """Small flat records with a mix of primitive types."""
+    rnd = Random(seed)
+    records = []
+    for i in range(n):
+        records.append(('flat', {
+            'account_number': rnd.randint(10 ** 7, 10 ** 8),
+            'amount': round(rnd.uniform(0, 10000), 2),
+            'country': rnd.choice(COUNTRIES),
+            'memo': ' '.join(rnd.choice(WORDS) for _ in range(rnd.randint(1, 6))),
+            'posted': rnd.random() < 0.9,
+            'status': rnd.choice(STATUSES)
+        }))
+    return {'flat': records[0][1] if records else {}}, records
+
+
+def wide(n, seed=0, width=64):
+    """Flat records with many keys."""
+    rnd = Random(seed)
+    keys = ['field_{0:03d}'.format(k) for k in range(width)]
+    records = []
+    for i in range(n):
+        records.append(('wide', {k: _scalar(rnd, j) for j, k in enumerate(keys)}))
+    return {'wide': {k: None for k in keys}}, records
+
+
+def nested(n, seed=0, depth=12):
+    """Records with a single deeply nested path of objects."""
+    rnd = Random(seed)
+    records = []
+    for i in range(n):
+        obj = {'leaf': rnd.choice(WORDS), 'value': rnd.randint(0, 1000)}
+        for d in range(depth):
+            obj = {'level_{}'.format(d): obj, 'id': rnd.randint(0, 1000)}
+        records.append(('nested', obj))
+    return {'nested': records[0][1] if records else {}}, records
+
+
+def array_heavy(n, seed=0, length=20):
+    """Records dominated by arrays of small objects and arrays of numbers."""
+    rnd = Random(seed)
+    records = []
+    for i in range(n):
+        records.append(('arrays', {
+            'id': i,
+            'events': [{'kind': rnd.choice(STATUSES), 'ts': rnd.randint(0, 2 ** 31), 'value': rnd.random()}
+                       for _ in range(length)],
+            'samples': [rnd.randint(0, 255) for _ in range(length)]
+        }))
+    tmpl = {'id': None, 'events': [{'kind': None, 'ts': None, 'value': None}], 'samples': None}
+    return {'arrays': tmpl}, records
+
+
+def mixed(n, seed=0):
+    """Interleaved records from several templates, plus some untemplated and overflow records."""
+    rnd = Random(seed)
+    f_tmpl, f_recs = flat(n, seed)
+    a_tmpl, a_recs = array_heavy(n, seed, length=5)
+    n_tmpl, n_recs = nested(n, seed, depth=3)
+    template_dict = {}
+    template_dict.update(f_tmpl)
+    template_dict.update(a_tmpl)
+    template_dict.update(n_tmpl)
+    records = []
+    for i in range(n):
+        r = rnd.random()
+        if r < 0.4:
+            records.append(f_recs[i])
+        elif r < 0.6:
+            records.append(a_recs[i])
+        elif r < 0.8:
+            records.append(n_recs[i])
+        elif r < 0.9:
+            tid, obj = f_recs[i]
+            obj = dict(obj)
+            obj['overflow_{}'.format(i % 7)] = rnd.choice(WORDS)
+            records.append((tid, obj))
+        else:
+            records.append(('_', {'free_form': rnd.choice(WORDS), 'n': i}))
+    return template_dict, records
+
+
+DATASETS = {
+    'flat': flat,
+    'wide': wide,
+    'nested': nested,
+    'array_heavy': array_heavy,
+    'mixed': mixed
+}
@@ -0,0 +1,371 @@
+"""Command line interface, run with ``python -m jsv``.
+
+``encode`` converts json lines to jsv, and ``decode`` converts jsv to json lines. Input is read from the given files, or
+from stdin, and processed in batches of lines, so memory use does not depend on the size of the input. With
+``--workers N``, batches are encoded or decoded by a pool of ``N`` processes, and written in their original order.
+
+``split`` cuts a jsv file into shards of bounded size that can each be read on their own, and ``merge`` concatenates jsv
+files, renaming templates whose ids collide. See :func:`jsv.split` and :func:`jsv.merge`.
+"""
+import argparse
+import json
+import os
+import sys
+from collections import deque
+from multiprocessing import Pool
+from time import perf_counter
+
+from jsv.shards import split, merge
+from jsv.template import cached_template, get_template_str, sorted_template_str
+from jsv.template_io import JSVCollection, JSVWriter, DEFAULT_TEMPLATE_ID, validate_id, populate_from_tmpl_file, \
+    line_to_json
+
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_MAX_TEMPLATES = 1000
+
+
+def iter_lines(paths):
+    """Yield the lines of each file in ``paths`` in turn. ``-`` or no paths at all means stdin."""
+    if not paths:
+        paths = ['-']
+    for path in paths:
+        if path == '-':
+            for line in sys.stdin:
+                yield line
+        else:
+            with open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    yield line
+
+
+def iter_batches(lines, size):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ordered_map(fn, batches, workers, initializer=None, initargs=()):
+    """Like ``map(fn, batches)``, but on a pool of ``workers`` processes.
+
+    At most ``2 * workers`` batches are in flight at once, so the input is consumed only as fast as results are used.
+    """
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for batch in batches:
+            yield fn(batch)
+        return
+
+    with Pool(workers, initializer, initargs) as pool:
+        pending = deque()
+        for batch in batches:
+            pending.append(pool.apply_async(fn, (batch,)))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+# Per-process state for the batch functions, set by the pool initializer.
+_worker = {}
+
+
+def _init_encoder(template_dict, auto_template, ensure_ascii=True):
+    coll = JSVCollection(template_dict)
+    _worker['coll'] = coll
+    _worker['auto'] = auto_template
+    _worker['ensure_ascii'] = ensure_ascii
+    # given templates by the sorted string of their keys, for records derived with the same keys in any order
+    _worker['given'] = {s: coll[tid] for s, tid in sorted_template_ids(coll).items()}
+
+
+def sorted_template_ids(coll):
+    """Map the :func:`.sorted_template_str` of each template in ``coll`` to its id, preferring the default template
+    and then the first one added."""
+    ids = {}
+    for tid, tmpl in coll.items():
+        ids.setdefault(sorted_template_str(tmpl), tid)
+    ids[sorted_template_str(coll[DEFAULT_TEMPLATE_ID])] = DEFAULT_TEMPLATE_ID
+    return ids
+
+
+def encode_batch(lines):
+    """Encode a batch of json lines.
+
+    Returns a list of ``(tid, line)`` tuples, or with ``--auto-template``, a list of ``(template_str, body)`` tuples so
+    that template ids can be assigned in order by the calling process.
+    """
+    out = []
+    if _worker['auto']:
+        ensure_ascii = _worker['ensure_ascii']
+        given = _worker['given']
+        for line in lines:
+            if not line.strip():
+                continue
+            obj = json.loads(line)
+            # empty records and scalars have no keys, so they go with the default template
+            t_str = get_template_str(obj) or '{}'
+            tmpl = cached_template(t_str)
+            # the derived template has its keys sorted, so a given template with the same keys sets their order
+            tmpl = given.get(str(tmpl), tmpl)
+            out.append((t_str, tmpl.encode(obj, ensure_ascii=ensure_ascii)))
+    else:
+        tmpl = _worker['coll'][DEFAULT_TEMPLATE_ID]
+        for line in lines:
+            if line.strip():
+                out.append((DEFAULT_TEMPLATE_ID, tmpl.from_json_text(line)))
+    return out
+
+
+class AutoTemplates:
+    """Assign template ids to template strings, in the order they are first seen.
+
+    Templates already in ``writer``, such as those given with ``-t``, are used for records with the same keys, in any
+    order, and count towards ``max_templates``. :func:`encode_batch` encodes those records with the given template.
+    """
+    def __init__(self, writer, max_templates):
+        self._writer = writer
+        self._max_templates = max_templates
+        self._ids = sorted_template_ids(writer)
+        self._next = 0
+
+    def line(self, t_str, body):
+        tid = self._ids.get(t_str)
+        if tid is None:
+            tmpl = cached_template(t_str)
+            # derived template strings repeat the element template of arrays, which a parsed template holds once
+            tid = self._ids.get(str(tmpl))
+            if tid is None:
+                if len(self._writer) >= self._max_templates:
+                    # out of template ids, so fall back to the default template
+                    return self._writer.get_record_line(tmpl.decode(body))
+                while True:
+                    tid = 't{}'.format(self._next)
+                    self._next += 1
+                    if tid not in self._writer:
+                        break
+                self._writer[tid] = tmpl
+                self._ids[str(tmpl)] = tid
+            self._ids[t_str] = tid
+        if tid == DEFAULT_TEMPLATE_ID:
+            return body
+        return '@{0} {1}'.format(tid, body)
+
+
+def decode_batch(batch):
+    """Decode a batch of jsv lines to json lines.
+
+    ``batch`` is a tuple ``(template_dict, lines)``, where ``template_dict`` holds the template strings in effect at the
+    start of the batch. Returns a list of json lines.
+    """
+    template_dict, lines = batch
+    coll = JSVCollection({tid: cached_template(t_str) for tid, t_str in template_dict.items()})
+    out = []
+    for line in lines:
+        js = line_to_json(coll, line)
+        if js is not None:
+            out.append(js)
+    return out
+
+
+def iter_decode_batches(lines, size, template_dict):
+    """Group jsv lines into batches for :func:`decode_batch`, tracking the template lines seen so far."""
+    templates = dict(template_dict)
+    batch = []
+    snapshot = dict(templates)
+    for line in lines:
+        if line.startswith('#'):
+            tid, _, t_str = line[1:].partition(' ')
+            templates[tid] = t_str.strip()
+        batch.append(line)
+        if len(batch) >= size:
+            yield snapshot, batch
+            batch = []
+            snapshot = dict(templates)
+    if batch:
+        yield snapshot, batch
+
+
+def parse_template_args(args):
+    out = {}
+    for arg in args or []:
+        tid, sep, t_str = arg.partition('=')
+        if not sep or not validate_id(tid):
+            raise ValueError('Template must be given as ID=TEMPLATE, got `{}`'.format(arg))
+        out[tid] = t_str
+    return out
+
+
+class Throughput:
+    def __init__(self):
+        self.records = 0
+        self.chars = 0
+        self._start = perf_counter()
+
+    def report(self, fp):
+        elapsed = perf_counter() - self._start
+        print('{0:,d} records, {1:,d} characters in {2:.3f}s: {3:,.0f} records/s, {4:.2f} MB/s'.format(
+            self.records, self.chars, elapsed, self.records / elapsed if elapsed else 0,
+            self.chars / 1e6 / elapsed if elapsed else 0), file=fp)
+
+
+def counted(lines, tp):
+    for line in lines:
+        tp.chars += len(line)
+        yield line
+
+
+def open_output(path):
+    if path is None or path == '-':
+        return sys.stdout
+    return path
+
+
+def run_encode(args):
+    template_dict = parse_template_args(args.template)
+    if not args.auto_template and set(template_dict) - {DEFAULT_TEMPLATE_ID}:
+        # records are only matched against templates by their keys with --auto-template
+        raise ValueError('Templates other than `{}` are only used with --auto-template'.format(DEFAULT_TEMPLATE_ID))
+    tp = Throughput()
+    batches = iter_batches(counted(iter_lines(args.input), tp), args.batch_size)
+    results = ordered_map(encode_batch, batches, args.workers, _init_encoder,
+                          (template_dict, args.auto_template, not args.raw_unicode))
+    writer = JSVWriter(open_output(args.output), 'wt', template_dict, args.template_file, 'wt',
+                       buffer_size=args.buffer_size, ensure_ascii=not args.raw_unicode)
+    with writer as w:
+        auto = AutoTemplates(w, args.max_templates) if args.auto_template else None
+        for batch in results:
+            for key, body in batch:
+                w.write_line(auto.line(key, body) if auto else body)
+            tp.records += len(batch)
+    return tp
+
+
+def run_decode(args):
+    tp = Throughput()
+    template_dict = {}
+    if args.template_file:
+        coll = JSVCollection()
+        with open(args.template_file, 'rt', encoding='utf-8') as f:
+            populate_from_tmpl_file(f, coll)
+        template_dict = {tid: str(t) for tid, t in coll.items()}
+    batches = iter_decode_batches(counted(iter_lines(args.input), tp), args.batch_size, template_dict)
+    out = sys.stdout if args.output is None or args.output == '-' else open(args.output, 'wt', encoding='utf-8')
+    try:
+        for lines in ordered_map(decode_batch, batches, args.workers):
+            if lines:
+                out.write('\n'.join(lines))
+                out.write('\n')
+            tp.records += len(lines)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        else:
+            out.flush()
+    return tp
+
+
+def run_split(args):
+    tp = Throughput()
+    for path, records in split(args.input, args.max_bytes, args.output, args.template_file):
+        print(path)
+        tp.records += records
+    tp.chars = os.path.getsize(args.input)
+    return tp
+
+
+def run_merge(args):
+    tp = Throughput()
+    coll = merge(args.input, args.output, args.template_file, stats=True)
+    tp.records = coll.stats.totals.records
+    tp.chars = sum(os.path.getsize(path) for path in args.input)
+    return tp
+
+
+_size_suffixes = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+
+
+def parse_size(s):
+    """Parse a number of bytes, such as ``1000``, ``64K``, ``256M`` or ``2G``."""
+    factor = _size_suffixes.get(s[-1:].upper())
+    n = int(s[:-1] if factor else s) * (factor or 1)
+    if n < 1:
+        raise ValueError(s)
+    return n
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m jsv', description='Convert between json lines and jsv.')
+    sub = parser.add_subparsers(dest='command')
+    sub.required = True
+
+    def common(p):
+        p.add_argument('input', nargs='*', help='input files; reads stdin if none are given or for `-`')
+        p.add_argument('-o', '--output', help='output file (default: stdout)')
+        p.add_argument('-w', '--workers', type=int, default=1, help='number of worker processes (default: 1)')
+        p.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                       help='lines per batch (default: {})'.format(DEFAULT_BATCH_SIZE))
+        p.add_argument('-q', '--quiet', action='store_true', help='do not report throughput on stderr')
+
+    enc = sub.add_parser('encode', help='convert json lines to jsv')
+    common(enc)
+    enc.add_argument('--template-file', help='write templates to this file (.jsvt), and records to the output (.jsvr)')
+    enc.add_argument('-t', '--template', action='append', metavar='ID=TEMPLATE',
+                     help='add a template, such as \'_={"key_1","key_2"}\'; may be repeated. Templates other than _ '
+                          'require --auto-template, which uses them for records with matching keys')
+    enc.add_argument('--auto-template', action='store_true',
+                     help='derive a template from the keys of each record, and add new ones as they are seen')
+    enc.add_argument('--max-templates', type=int, default=DEFAULT_MAX_TEMPLATES,
+                     help='with --auto-template, maximum number of templates, including the default one and those '
+                          'given with -t (default: {})'.format(
+                         DEFAULT_MAX_TEMPLATES))
+    enc.add_argument('--buffer-size', type=int, default=1 << 16, help='output buffer size in characters')
+    enc.add_argument('--raw-unicode', action='store_true',
+                     help='write non-ascii characters in templates and derived records as they are, not as \\u escapes')
+    enc.set_defaults(run=run_encode)
+
+    dec = sub.add_parser('decode', help='convert jsv to json lines')
+    common(dec)
+    dec.add_argument('--template-file', help='read templates from this file (.jsvt)')
+    dec.set_defaults(run=run_decode)
+
+    spl = sub.add_parser('split', help='split a jsv file into shards of bounded size')
+    spl.add_argument('input', help='input file')
+    spl.add_argument('--max-bytes', type=parse_size, required=True, metavar='SIZE',
+                     help='maximum size of a shard, such as 256M')
+    spl.add_argument('-o', '--output', metavar='PATTERN',
+                     help='path of the shards, with a {} field for the shard number, such as \'part.{:04d}.jsv\' '
+                          '(default: the input path with .00000, .00001 and so on before the extension)')
+    spl.add_argument('--template-file', help='read templates from this file (.jsvt), with a record file as input')
+    spl.add_argument('-q', '--quiet', action='store_true', help='do not report throughput on stderr')
+    spl.set_defaults(run=run_split, workers=1)
+
+    mrg = sub.add_parser('merge', help='concatenate jsv files, renaming templates whose ids collide')
+    mrg.add_argument('input', nargs='+', help='input files')
+    mrg.add_argument('-o', '--output', required=True, help='output file')
+    mrg.add_argument('--template-file', help='write templates to this file (.jsvt), and records to the output (.jsvr)')
+    mrg.add_argument('-q', '--quiet', action='store_true', help='do not report throughput on stderr')
+    mrg.set_defaults(run=run_merge, workers=1)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.workers < 1:
+        print('--workers must be at least 1', file=sys.stderr)
+        return 2
+    try:
+        tp = args.run(args)
+    except (ValueError, OSError) as ex:
+        print('error: {}'.format(ex), file=sys.stderr)
+        return 1
+    if not args.quiet:
+        tp.report(sys.stderr)
+    return 0
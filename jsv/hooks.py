@@ -0,0 +1,108 @@
+"""Registry of profiling and tracing hooks.
+
+Hooks are called on the hot path of every :class:`.JSVCollection`, :class:`.JSVReader` and :class:`.JSVWriter`. Each
+hook is called as ``callback(tid, nchars, duration)``, where ``tid`` is the template id (``None`` for a flush),
+``nchars`` is the number of characters in the line or lines involved, and ``duration`` is the time taken in seconds.
+For example:
+
+    >>> import jsv.hooks
+    >>> @jsv.hooks.on_decode(every=100)
+    ... def trace(tid, nchars, duration):
+    ...     histogram[tid].add(duration)
+
+When no hooks are registered for an event, records take the same path as with hooks disabled, and no timing is done.
+Setting ``every`` to ``N`` calls the hook for only one in every ``N`` events, and only those events are timed.
+"""
+
+
+class Hook:
+    __slots__ = ('callback', 'every', '_count')
+
+    def __init__(self, callback, every=1):
+        if not callable(callback):
+            raise TypeError('argument `callback` must be callable')
+        if not isinstance(every, int) or every < 1:
+            raise ValueError('argument `every` must be a positive integer')
+        self.callback = callback
+        self.every = every
+        self._count = 0
+
+    def tick(self):
+        self._count += 1
+        if self._count >= self.every:
+            self._count = 0
+            return True
+        return False
+
+
+encode_hooks = []
+decode_hooks = []
+flush_hooks = []
+
+
+def _register(hooks, callback, every):
+    if callback is None:
+        return lambda cb: _register(hooks, cb, every)
+    hooks.append(Hook(callback, every))
+    return callback
+
+
+def on_encode(callback=None, every=1):
+    """Register a hook called after a record is encoded. Can also be used as a decorator.
+
+    Args:
+        callback (callable): Called as ``callback(tid, nchars, duration)``.
+        every (int): Call the hook for only one in every ``every`` records.
+    """
+    return _register(encode_hooks, callback, every)
+
+
+def on_decode(callback=None, every=1):
+    """Register a hook called after a record is decoded. Can also be used as a decorator.
+
+    Args:
+        callback (callable): Called as ``callback(tid, nchars, duration)``.
+        every (int): Call the hook for only one in every ``every`` records.
+    """
+    return _register(decode_hooks, callback, every)
+
+
+def on_flush(callback=None, every=1):
+    """Register a hook called after a :class:`.JSVWriter` flushes its files. Can also be used as a decorator.
+
+    Args:
+        callback (callable): Called as ``callback(None, nchars, duration)``, where ``nchars`` is the number of
+            characters written since the previous flush.
+        every (int): Call the hook for only one in every ``every`` flushes.
+    """
+    return _register(flush_hooks, callback, every)
+
+
+def remove(callback):
+    """Unregister every hook that calls ``callback``.
+
+    Raises:
+        ValueError: if ``callback`` is not registered.
+    """
+    found = False
+    for hooks in (encode_hooks, decode_hooks, flush_hooks):
+        for h in [h for h in hooks if h.callback == callback]:
+            hooks.remove(h)
+            found = True
+    if not found:
+        raise ValueError('callback is not registered')
+
+
+def clear():
+    """Unregister all hooks."""
+    for hooks in (encode_hooks, decode_hooks, flush_hooks):
+        del hooks[:]
+
+
+def sample(hooks):
+    return [h for h in hooks if h.tick()]
+
+
+def fire(hooks, tid, nchars, duration):
+    for h in hooks:
+        h.callback(tid, nchars, duration)
@@ -0,0 +1,90 @@
+from functools import lru_cache
+
+
+DEFAULT_MAXSIZE = 4096
+
+
+def _identity(s):
+    return s
+
+
+class Interner:
+    """Bounded LRU caches that make equal decoded strings share a single object.
+
+    Fields with few distinct values, such as ``country`` or ``status``, otherwise get a new string object for every
+    record. Passing an :class:`Interner` to :meth:`.JSVTemplate.decode` or :class:`.JSVReader` returns the object
+    already in the cache for a repeated string, so long-lived decoded records hold one copy of each value. Keys not in
+    the template are interned too.
+
+        >>> interner = jsv.Interner(['country', 'status'])
+        >>> with jsv.JSVReader('in.jsv', intern=interner) as r:
+        ...     records = list(r)
+
+    Args:
+        fields (iterable of str): If given, only string values of these keys are interned, each key with a cache of
+            its own. The keys are matched at any level of nesting. Otherwise all string values share one cache.
+        maxsize (int): Maximum number of strings kept in each cache. The least recently used strings are dropped
+            first.
+    """
+    def __init__(self, fields=None, maxsize=DEFAULT_MAXSIZE):
+        if not isinstance(maxsize, int) or maxsize < 1:
+            raise ValueError('argument `maxsize` must be a positive integer')
+        self.maxsize = maxsize
+        self.fields = None if fields is None else frozenset(fields)
+        self.keys = lru_cache(maxsize)(_identity)
+        # decoding nodes compiled for this interner by JSVTemplate, by template and class
+        self._nodes = {}
+        if self.fields is None:
+            self._values = lru_cache(maxsize)(_identity)
+            self._caches = None
+        else:
+            self._values = None
+            self._caches = {f: lru_cache(maxsize)(_identity) for f in self.fields}
+
+    def cache_for(self, key):
+        """Return the cache for the values of ``key``, or ``None`` if they are not interned."""
+        if self._caches is None:
+            return self._values
+        return self._caches.get(key)
+
+    def intern_dict(self, obj):
+        """Return a copy of ``obj`` with its keys and string values interned."""
+        out = {}
+        keys = self.keys
+        for k, v in obj.items():
+            k = keys(k)
+            if type(v) is str:
+                cache = self.cache_for(k)
+                if cache is not None:
+                    v = cache(v)
+            out[k] = v
+        return out
+
+    def cache_info(self):
+        """Return a dict of cache statistics, as from :func:`functools.lru_cache`, for ``'keys'`` and either
+        ``'values'`` or each of ``fields``."""
+        info = {'keys': self.keys.cache_info()}
+        if self._caches is None:
+            info['values'] = self._values.cache_info()
+        else:
+            info.update((f, c.cache_info()) for f, c in self._caches.items())
+        return info
+
+    def clear(self):
+        """Empty all caches."""
+        self.keys.cache_clear()
+        for c in ([self._values] if self._caches is None else self._caches.values()):
+            c.cache_clear()
+
+
+def as_interner(intern):
+    """Convert the ``intern`` argument of :class:`.JSVReader` to an :class:`Interner` or ``None``."""
+    if intern is None or intern is False:
+        return None
+    if intern is True:
+        return Interner()
+    if isinstance(intern, Interner):
+        return intern
+    if isinstance(intern, str):
+        raise TypeError('argument `intern` must be a bool, an Interner or an iterable of field names')
+    return Interner(intern)
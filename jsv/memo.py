@@ -0,0 +1,82 @@
+from functools import lru_cache
+
+from jsv.template import json_encode, json_encode_unicode
+
+
+DEFAULT_MAXSIZE = 4096
+
+
+def memoized(maxsize, base):
+    cached = lru_cache(maxsize)(base)
+
+    def encode_value(v):
+        if type(v) is str:
+            return cached(v)
+        return base(v)
+    encode_value.cache = cached
+    return encode_value
+
+
+class MemoEncoder:
+    """Bounded LRU caches of encoded string values, so that repeated strings are escaped only once.
+
+    Only strings are cached; other values are always encoded with :mod:`json`. Pass a :class:`MemoEncoder` to
+    :meth:`.JSVTemplate.encode`, or use the ``memoize`` argument of :class:`.JSVWriter`:
+
+        >>> with jsv.JSVWriter('out.jsv', memoize=['country', 'status']) as w:
+        ...     w.write(obj)
+
+    Args:
+        fields (iterable of str): If given, only values of these keys are cached, each key with a cache of its own.
+            The keys are matched at any level of nesting, and elements of an array use the cache of the array's key.
+            Otherwise all string values share one cache.
+        maxsize (int): Maximum number of strings kept in each cache. The least recently used strings are dropped
+            first.
+        ensure_ascii (bool): If false, non-ascii characters are written as they are. See :meth:`.JSVTemplate.encode`.
+    """
+    def __init__(self, fields=None, maxsize=DEFAULT_MAXSIZE, ensure_ascii=True):
+        if not isinstance(maxsize, int) or maxsize < 1:
+            raise ValueError('argument `maxsize` must be a positive integer')
+        self.maxsize = maxsize
+        self.fields = None if fields is None else frozenset(fields)
+        self.ensure_ascii = ensure_ascii
+        base = json_encode if ensure_ascii else json_encode_unicode
+        if self.fields is None:
+            self._encode = memoized(maxsize, base)
+            self._encoders = None
+        else:
+            self._encode = None
+            self._encoders = {f: memoized(maxsize, base) for f in self.fields}
+
+    def get(self, key, default=None):
+        """Return the function that encodes values of ``key``, or ``default`` if they are not cached."""
+        if self._encoders is None:
+            return self._encode
+        return self._encoders.get(key, default)
+
+    def cache_info(self):
+        """Return a dict of cache statistics, as from :func:`functools.lru_cache`, for ``'values'`` or each of
+        ``fields``."""
+        if self._encoders is None:
+            return {'values': self._encode.cache.cache_info()}
+        return {f: enc.cache.cache_info() for f, enc in self._encoders.items()}
+
+    def clear(self):
+        """Empty all caches."""
+        for enc in ([self._encode] if self._encoders is None else self._encoders.values()):
+            enc.cache.cache_clear()
+
+
+def as_memo_encoder(memoize, ensure_ascii=True):
+    """Convert the ``memoize`` argument of :class:`.JSVWriter` to a :class:`MemoEncoder` or ``None``."""
+    if memoize is None or memoize is False:
+        return None
+    if memoize is True:
+        return MemoEncoder(ensure_ascii=ensure_ascii)
+    if isinstance(memoize, MemoEncoder):
+        if memoize.ensure_ascii != ensure_ascii:
+            raise ValueError('argument `memoize` must have the same `ensure_ascii` as the writer')
+        return memoize
+    if isinstance(memoize, str):
+        raise TypeError('argument `memoize` must be a bool, a MemoEncoder or an iterable of field names')
+    return MemoEncoder(memoize, ensure_ascii=ensure_ascii)
@@ -0,0 +1,172 @@
+from collections import OrderedDict
+from operator import itemgetter
+from os import fsdecode
+from time import perf_counter
+from zlib import crc32
+
+from jsv.template import json_encode
+from jsv.template_io import JSVCollection, DEFAULT_TEMPLATE_ID
+from jsv.memo import as_memo_encoder
+
+
+DEFAULT_BUFFER_SIZE = 1 << 16
+DEFAULT_MAX_OPEN = 64
+
+
+class PartitionedJSVWriter(JSVCollection):
+    """Context manager for writing records to several record files, chosen by the value of a key.
+
+    A record is written to partition ``crc32(value) % partitions``, where ``value`` is the json encoding of
+    ``record[key]``, so records with equal keys always go to the same partition, in every run. Partition ``n`` is the
+    record file ``<base_path>.<n>.jsvr``, and all partitions share the template file ``<base_path>.jsvt``, where each
+    template is written once.
+
+        >>> with jsv.PartitionedJSVWriter('out/accounts', 8, 'account_number') as w:
+        ...     for obj in records:
+        ...         w.write(obj)
+        >>> with jsv.JSVReader(w.partition_path(3), 'out/accounts.jsvt') as r:
+        ...     records_3 = list(r)
+
+    Records are buffered per partition, and a buffer is written to its file once it holds ``buffer_size`` characters.
+    At most ``max_open`` record files are open at a time: when another one is needed, the least recently written is
+    closed, and it is opened again for appending if it is written to later. As the template file is read before any
+    record, a template id should not be redefined while writing.
+
+    Args:
+        base_path (filepath): Path of the files, without an extension.
+        partitions (int): Number of record files.
+        key (str or callable): Key whose value chooses the partition of a record, or a function that returns that value
+            for a record.
+        template_dict (dict): Dictionary of templates. See :class:`JSVCollection`.
+        mode (str): ``'wt'`` to replace existing files, or ``'at'`` to append to them. In ``'wt'`` mode, every record
+            file is created, even those of partitions with no records.
+        stats (bool): If true, keep runtime counters, available through :attr:`stats`.
+        buffer_size (int): Number of characters held in memory for each partition.
+        max_open (int): Maximum number of record files open at a time.
+        memoize (bool, iterable of str or :class:`.MemoEncoder`): See :class:`JSVWriter`.
+        ensure_ascii (bool): See :class:`JSVWriter`.
+        encoding (str): Encoding of the files.
+    """
+    def __init__(self, base_path, partitions, key, template_dict=None, mode='wt', stats=False,
+                 buffer_size=DEFAULT_BUFFER_SIZE, max_open=DEFAULT_MAX_OPEN, memoize=None, ensure_ascii=True,
+                 encoding='utf-8'):
+        super().__init__(template_dict, stats)
+        if not isinstance(partitions, int) or partitions < 1:
+            raise ValueError('argument `partitions` must be a positive integer')
+        if not isinstance(buffer_size, int) or buffer_size < 1:
+            raise ValueError('argument `buffer_size` must be a positive integer')
+        if not isinstance(max_open, int) or max_open < 1:
+            raise ValueError('argument `max_open` must be a positive integer')
+        if mode not in ('wt', 'at'):
+            raise ValueError("argument `mode` must be 'wt' or 'at'")
+        self._base_path = fsdecode(base_path)
+        self._partitions = partitions
+        self._key = key if callable(key) else itemgetter(key)
+        self._mode = mode
+        self._buffer_size = buffer_size
+        self._max_open = max_open
+        self._encoding = encoding
+        self._ensure_ascii = ensure_ascii
+        self._memo = as_memo_encoder(memoize, ensure_ascii)
+        self._bufs = [[] for _ in range(partitions)]
+        self._buf_lens = [0] * partitions
+        # open record files by partition, least recently written first
+        self._fps = OrderedDict()
+        self._tmpl_fp = None
+
+    @property
+    def partitions(self):
+        """The number of record files."""
+        return self._partitions
+
+    @property
+    def template_path(self):
+        """The path of the template file."""
+        return self._base_path + '.jsvt'
+
+    def partition_path(self, n):
+        """Return the path of the record file of partition ``n``."""
+        return '{0}.{1:0{2}d}.jsvr'.format(self._base_path, n, len(str(self._partitions - 1)))
+
+    def partition(self, obj):
+        """Return the partition that ``obj`` is written to."""
+        return crc32(json_encode(self._key(obj)).encode('utf-8')) % self._partitions
+
+    def __enter__(self):
+        if self._mode == 'wt':
+            for n in range(self._partitions):
+                open(self.partition_path(n), 'wt', encoding=self._encoding).close()
+        self._tmpl_fp = open(self.template_path, self._mode, encoding=self._encoding)
+        for line in self.template_lines():
+            self._tmpl_fp.write(line + '\n')
+        self._tmpl_fp.flush()
+        return self
+
+    def __exit__(self, t, v, tr):
+        self.close()
+
+    def __setitem__(self, tid, tmpl):
+        super().__setitem__(tid, tmpl)
+        if self._tmpl_fp is not None:
+            # flushed now, so the template is on disk before any record that uses it
+            self._tmpl_fp.write(self.get_template_line(tid) + '\n')
+            self._tmpl_fp.flush()
+
+    def write(self, obj, tid=DEFAULT_TEMPLATE_ID):
+        """Writes an object to the record file of its partition.
+
+        Args:
+            obj (json-compatible object): Object to be written.
+            tid (str): Id of the template used to encode ``obj``.
+        """
+        if self._tmpl_fp is None:
+            raise RuntimeError('No file pointer to a template file. Are you in the context manager?')
+        n = self.partition(obj)
+        line = self.get_record_line(obj, tid) + '\n'
+        self._bufs[n].append(line)
+        self._buf_lens[n] += len(line)
+        if self._buf_lens[n] >= self._buffer_size:
+            self._drain(n)
+
+    def flush(self):
+        """Write the buffers of all partitions, and flush the files."""
+        if self._tmpl_fp is None:
+            return
+        for n in range(self._partitions):
+            if self._bufs[n]:
+                self._drain(n)
+        for fp in self._fps.values():
+            fp.flush()
+        self._tmpl_fp.flush()
+
+    def close(self):
+        """Write the buffers of all partitions, and close the files. This is called on exiting the context manager."""
+        if self._tmpl_fp is None:
+            return
+        try:
+            self.flush()
+        finally:
+            while self._fps:
+                self._fps.popitem()[1].close()
+            self._tmpl_fp.close()
+            self._tmpl_fp = None
+
+    def _drain(self, n):
+        st = self._stats
+        start = None if st is None else perf_counter()
+        self._get_fp(n).write(''.join(self._bufs[n]))
+        self._bufs[n] = []
+        self._buf_lens[n] = 0
+        if st is not None:
+            st.io_time += perf_counter() - start
+
+    def _get_fp(self, n):
+        fps = self._fps
+        fp = fps.get(n)
+        if fp is not None:
+            fps.move_to_end(n)
+            return fp
+        if len(fps) >= self._max_open:
+            fps.popitem(last=False)[1].close()
+        fp = fps[n] = open(self.partition_path(n), 'at', encoding=self._encoding)
+        return fp
@@ -0,0 +1,94 @@
+from queue import Queue, Empty, Full
+from threading import Thread, Event
+from time import perf_counter
+
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+_POLL_INTERVAL = 0.05
+
+
+class Prefetcher:
+    """Read a file in large chunks on a background thread, and split them into lines on the calling thread.
+
+    The background thread keeps at most ``depth`` chunks in a bounded queue, so reading from the file overlaps with
+    decoding the lines already read. :meth:`close` stops the thread and must be called before the file is closed; it
+    is also called when the generator returned by :meth:`lines` is exhausted or closed.
+
+    Args:
+        fp (:class:`io.TextIOBase`): File to read from.
+        depth (int): Maximum number of chunks read ahead.
+        chunk_size (int): Number of characters per read.
+        stats (:class:`.JSVStats`): If given, time spent waiting for chunks is added to ``stats.io_time``.
+    """
+    def __init__(self, fp, depth, chunk_size=DEFAULT_CHUNK_SIZE, stats=None):
+        if not isinstance(depth, int) or depth < 1:
+            raise ValueError('argument `prefetch` must be a positive integer')
+        self._fp = fp
+        self._chunk_size = chunk_size
+        self._stats = stats
+        self._queue = Queue(maxsize=depth)
+        self._stop = Event()
+        self._thread = Thread(target=self._run, name='jsv-prefetch', daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=_POLL_INTERVAL)
+                return True
+            except Full:
+                pass
+        return False
+
+    def _run(self):
+        try:
+            while True:
+                chunk = self._fp.read(self._chunk_size)
+                if not self._put(chunk) or not chunk:
+                    return
+        except BaseException as ex:
+            self._put(ex)
+
+    def _get(self):
+        st = self._stats
+        if st is None:
+            item = self._queue.get()
+        else:
+            start = perf_counter()
+            item = self._queue.get()
+            st.io_time += perf_counter() - start
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    def lines(self):
+        """Generator that yields the lines of the file, including the trailing ``\\n``."""
+        pending = ''
+        try:
+            while True:
+                chunk = self._get()
+                if not chunk:
+                    if pending:
+                        yield pending
+                    return
+                buf = pending + chunk if pending else chunk
+                start = 0
+                while True:
+                    end = buf.find('\n', start)
+                    if end < 0:
+                        break
+                    yield buf[start:end + 1]
+                    start = end + 1
+                pending = buf[start:]
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop the background thread and wait for it to exit."""
+        self._stop.set()
+        while self._thread.is_alive():
+            try:
+                self._queue.get_nowait()
+            except Empty:
+                pass
+            self._thread.join(_POLL_INTERVAL)
@@ -0,0 +1,201 @@
+"""Split and merge ``.jsv`` files by copying their lines as bytes, without decoding or encoding any record."""
+from os import fsdecode
+from os.path import splitext
+
+from jsv.template import cached_template
+from jsv.template_io import JSVCollection, DEFAULT_TEMPLATE_ID
+
+
+def split(path, max_bytes, out_pattern=None, template_file=None):
+    """Split a ``.jsv`` file into shards of at most ``max_bytes`` bytes, each of which can be read on its own.
+
+    Record lines are copied as they are. Each shard holds the templates used by its records, as they were defined at
+    that point of the input: a template line is copied into a shard just before the first record that uses it, and
+    again if it is redefined. Templates that no record of a shard uses are left out. A record line longer than
+    ``max_bytes`` gets a shard to itself.
+
+        >>> jsv.split('events.jsv', 256 << 20, 'shards/events.{:04d}.jsv')
+        [('shards/events.0000.jsv', 1948021), ('shards/events.0001.jsv', 1951870), ...]
+
+    Args:
+        path (filepath): The file to split.
+        max_bytes (int): Maximum size of a shard.
+        out_pattern (str): Path of the shards, with a :meth:`str.format` field for the shard number, starting at 0. By
+            default, ``.00000``, ``.00001`` and so on are inserted before the extension of ``path``.
+        template_file (filepath): If given, a template file (``.jsvt``) for ``path``, which is then a record file.
+
+    Returns:
+        list of (str, int): The path of each shard and the number of records in it.
+    """
+    if not isinstance(max_bytes, int) or max_bytes < 1:
+        raise ValueError('argument `max_bytes` must be a positive integer')
+    path = fsdecode(path)
+    if out_pattern is None:
+        root, ext = splitext(path)
+        out_pattern = root + '.{:05d}' + (ext or '.jsv')
+    if out_pattern.format(0) == out_pattern.format(1):
+        raise ValueError('argument `out_pattern` must have a replacement field for the shard number')
+
+    # template lines by id, as last defined in the input
+    templates = {}
+    if template_file is not None:
+        with open(template_file, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    templates[line_tid(line)] = terminated(line)
+
+    shards = []
+    out = None
+    try:
+        with open(path, 'rb') as f:
+            for line in f:
+                c = line[:1]
+                if c == HASH:
+                    templates[line_tid(line)] = terminated(line)
+                    continue
+                if not line.strip():
+                    continue
+                line = terminated(line)
+                tid = line_tid(line) if c == AT else DEFAULT_TEMPLATE_ID_BYTES
+                tmpl_line = templates.get(tid)
+                size = len(line)
+                if out is not None and tmpl_line is not None and emitted.get(tid) is not tmpl_line:
+                    size += len(tmpl_line)
+                if out is None or (written and written + size > max_bytes):
+                    if out is not None:
+                        out.close()
+                    shard_path = out_pattern.format(len(shards))
+                    out = open(shard_path, 'wb')
+                    shards.append([shard_path, 0])
+                    emitted = {}
+                    written = 0
+                    size = len(line) + (len(tmpl_line) if tmpl_line is not None else 0)
+                if tmpl_line is not None and emitted.get(tid) is not tmpl_line:
+                    out.write(tmpl_line)
+                    emitted[tid] = tmpl_line
+                out.write(line)
+                written += size
+                shards[-1][1] += 1
+    finally:
+        if out is not None:
+            out.close()
+    return [tuple(s) for s in shards]
+
+
+def merge(inputs, output, template_file=None, stats=False):
+    """Concatenate ``.jsv`` files, giving templates new ids where the inputs disagree.
+
+    Template ids are reconciled through a single :class:`JSVCollection`. A template already in it, under any id, keeps
+    that id; a new template keeps its id from the input if that id is free, or else gets the id followed by ``_1``,
+    ``_2`` and so on. Ids are never redefined in the output. Record lines are copied as they are, apart from the
+    ``@tid`` prefix, which is replaced when the id of the record's template changed.
+
+        >>> coll = jsv.merge(['a.jsv', 'b.jsv', ('c.jsvr', 'c.jsvt')], 'all.jsv')
+
+    Args:
+        inputs (iterable): The files to merge, in order. Each is either the path of a ``.jsv`` file, or a tuple of
+            the paths of a record file and its template file.
+        output (filepath): The merged file.
+        template_file (filepath): If given, templates are written to this file, and ``output`` is a record file.
+        stats (bool): If true, count the records written for each template id of the output, in the
+            :attr:`~JSVCollection.stats` of the returned collection.
+
+    Returns:
+        :class:`JSVCollection`: The templates of the merged file.
+    """
+    coll = JSVCollection(stats=stats)
+    st = coll.stats
+    # ids in the output that are defined, or used with the default template
+    claimed = set()
+
+    def define(in_tid, t_bytes):
+        tmpl = cached_template(t_bytes.decode('utf-8'))
+        if tmpl in coll.templates:
+            tid = coll.templates[tmpl]
+            if not isinstance(tid, str):
+                tid = in_tid if in_tid in tid else min(tid)
+            if tid in claimed:
+                return tid
+        else:
+            tid = in_tid
+            base = '' if in_tid == DEFAULT_TEMPLATE_ID else in_tid
+            k = 0
+            while tid in claimed or (tid in coll and tid != DEFAULT_TEMPLATE_ID):
+                k += 1
+                tid = '{0}_{1}'.format(base, k)
+            coll[tid] = tmpl
+        claimed.add(tid)
+        if tid != DEFAULT_TEMPLATE_ID or t_bytes.strip() != b'{}':
+            tmpl_out.write(b'#' + tid.encode('utf-8') + b' ' + t_bytes)
+        return tid
+
+    rec_out = open(output, 'wb')
+    try:
+        tmpl_out = rec_out if template_file is None else open(template_file, 'wb')
+        try:
+            for inp in inputs:
+                if isinstance(inp, tuple):
+                    rec_path, tmpl_path = inp
+                else:
+                    rec_path, tmpl_path = inp, None
+                # output id of each template id of this input, and as the prefix of record lines
+                prefixes = {}
+
+                def add(line):
+                    in_tid = line_tid(line)
+                    tid = define(in_tid.decode('utf-8'), terminated(line[len(in_tid) + 2:]))
+                    prefixes[in_tid] = tid, b'' if tid == DEFAULT_TEMPLATE_ID else b'@' + tid.encode('utf-8') + b' '
+
+                if tmpl_path is not None:
+                    with open(tmpl_path, 'rb') as f:
+                        for line in f:
+                            if line.strip():
+                                add(line)
+                with open(rec_path, 'rb') as f:
+                    for line in f:
+                        c = line[:1]
+                        if c == HASH:
+                            add(line)
+                            continue
+                        if not line.strip():
+                            continue
+                        if c == AT:
+                            in_tid = line_tid(line)
+                            start = len(in_tid) + 2
+                        else:
+                            in_tid = DEFAULT_TEMPLATE_ID_BYTES
+                            start = 0
+                        if in_tid not in prefixes:
+                            if in_tid != DEFAULT_TEMPLATE_ID_BYTES:
+                                raise ValueError('Template `{}` is not defined in {}'.format(
+                                    in_tid.decode('utf-8'), fsdecode(rec_path)))
+                            add(b'#_ {}')
+                        tid, prefix = prefixes[in_tid]
+                        if len(prefix) != start or not line.startswith(prefix):
+                            line = prefix + line[start:]
+                        line = terminated(line)
+                        rec_out.write(line)
+                        if st is not None:
+                            st.template(tid).records += 1
+        finally:
+            if tmpl_out is not rec_out:
+                tmpl_out.close()
+    finally:
+        rec_out.close()
+    return coll
+
+
+def line_tid(line):
+    """Return the template id of a template or record line, as bytes."""
+    end = line.find(b' ', 1)
+    if end < 0:
+        raise ValueError('Expecting a space after the template id')
+    return line[1:end]
+
+
+def terminated(line):
+    return line if line.endswith(b'\n') else line + b'\n'
+
+
+HASH, AT = b'#', b'@'
+DEFAULT_TEMPLATE_ID_BYTES = DEFAULT_TEMPLATE_ID.encode('ascii')
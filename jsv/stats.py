@@ -0,0 +1,93 @@
+class TemplateStats:
+    """Counters for a single template id.
+
+    Attributes:
+        records (int): Number of records encoded or decoded.
+        chars (int): Total number of characters in the record lines, excluding line terminators. For files that are
+            not ascii this is less than their size in bytes.
+        overflow_keys (int): Number of keys not present in the template, and so written in the ``"k":v`` form.
+        redefinitions (int): Number of times the template id was assigned a different template after it was first
+            defined. Defining the default template ``_`` when it was only implied is not a redefinition.
+        encode_time (float): Cumulative seconds spent encoding records.
+        decode_time (float): Cumulative seconds spent decoding records.
+    """
+    __slots__ = ('records', 'chars', 'overflow_keys', 'redefinitions', 'encode_time', 'decode_time')
+
+    def __init__(self):
+        self.records = 0
+        self.chars = 0
+        self.overflow_keys = 0
+        self.redefinitions = 0
+        self.encode_time = 0.0
+        self.decode_time = 0.0
+
+    def __repr__(self):
+        return 'TemplateStats({})'.format(', '.join('{0}={1!r}'.format(k, getattr(self, k)) for k in self.__slots__))
+
+    def as_dict(self):
+        """Return the counters as a dict."""
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+class JSVStats:
+    """Runtime counters for a :class:`.JSVCollection`, :class:`.JSVReader` or :class:`.JSVWriter`.
+
+    Counters are kept per template id, and can be looked up by id:
+
+        >>> w = jsv.JSVWriter(fp, stats=True)
+        >>> w['trns'] = '{"account_number","amount"}'
+        >>> w.write({'account_number': 1, 'amount': 2.5, 'memo': 'x'}, 'trns')
+        >>> w.stats['trns'].records, w.stats['trns'].overflow_keys
+        (1, 1)
+
+    Time spent reading from or writing to files is reported separately in :attr:`io_time`.
+    """
+    def __init__(self):
+        self._templates = {}
+        self.io_time = 0.0
+
+    def __getitem__(self, tid):
+        return self._templates[tid]
+
+    def __contains__(self, tid):
+        return tid in self._templates
+
+    def __iter__(self):
+        return iter(self._templates)
+
+    def __len__(self):
+        return len(self._templates)
+
+    def items(self):
+        """Iterator that yields the tuple (tid, :class:`TemplateStats`)."""
+        return self._templates.items()
+
+    def template(self, tid):
+        """Return the :class:`TemplateStats` for ``tid``, creating it if needed."""
+        ts = self._templates.get(tid)
+        if ts is None:
+            ts = TemplateStats()
+            self._templates[tid] = ts
+        return ts
+
+    @property
+    def totals(self):
+        """A :class:`TemplateStats` summed over all template ids."""
+        out = TemplateStats()
+        for ts in self._templates.values():
+            for k in TemplateStats.__slots__:
+                setattr(out, k, getattr(out, k) + getattr(ts, k))
+        return out
+
+    def reset(self):
+        """Set all counters back to zero."""
+        self._templates = {}
+        self.io_time = 0.0
+
+    def as_dict(self):
+        """Return all counters as a json-compatible dict."""
+        return {
+            'templates': {tid: ts.as_dict() for tid, ts in self._templates.items()},
+            'totals': self.totals.as_dict(),
+            'io_time': self.io_time
+        }
@@ -1,7 +1,25 @@
 import json
+from functools import lru_cache, partial
+from json.encoder import encode_basestring, encode_basestring_ascii
 from collections import OrderedDict
+from collections.abc import Iterator
 from enum import unique, Enum
+from keyword import iskeyword
 from re import compile
+from threading import Lock
+
+try:
+    import dataclasses
+except ImportError:  # python < 3.7
+    dataclasses = None
+try:
+    from typing import get_type_hints, Union
+except ImportError:  # python < 3.5
+    get_type_hints = Union = None
+
+
+# number of classes given to `JSVTemplate.decode` as `into` whose compiled nodes are kept on a template
+INTO_CACHE_SIZE = 8
 
 
 class JSVDecodeError(ValueError):
@@ -39,21 +57,36 @@ class JSVTemplate:
     """
 
     def __hash__(self):
-        return hash(str(self))
+        return hash(self.to_string())
 
     def __eq__(self, other):
         if type(self) is type(other):
-            return str(self) == str(other)
+            return self.to_string() == other.to_string()
         else:
             return False
 
     def __repr__(self):
-        if isinstance(self._key_tree, list):
-            return encode_template_list(self._key_tree)
-        elif isinstance(self._key_tree, OrderedDict):
-            return encode_template_dict(self._key_tree)
+        return self.to_string()
+
+    def to_string(self, ensure_ascii=True):
+        """Return the template string, as written after the template id in a ``.jsv`` file.
+
+        Args:
+            ensure_ascii (bool): If false, non-ascii characters in keys are written as they are, rather than as
+                ``\\uXXXX`` escapes.
+        """
+        if ensure_ascii and self._str is not None:
+            return self._str
+        key_enc = encode_string if ensure_ascii else encode_string_unicode
+        if self._key_tree is None:
+            out = '{}'
         else:
-            return '{}'
+            out = encode_template(self._key_tree, key_enc)
+        if ensure_ascii:
+            # the key tree is never changed, so the string (and the hash) can be kept; threads that race here store
+            # equal strings
+            self._str = out
+        return out
 
     def __init__(self, key_source='{}'):
         if isinstance(key_source, str):
@@ -64,79 +97,420 @@ class JSVTemplate:
         else:
             raise TypeError('Expecting a string, dict, list or None')
         self._key_tree = parse_template_string(template_str)
-
-    def encode(self, obj):
+        self._str = None
+        self._row_node = None
+        self._record_node = None
+        self._node = None
+        # nodes for decoding into classes, and for decode_bytes with keys, most recently used last
+        self._into_nodes = OrderedDict()
+        self._projected_nodes = OrderedDict()
+        # templates from cached_template are shared between threads, so the nodes above are compiled under this lock
+        self._lock = Lock()
+
+    def encode(self, obj, overflow=None, memo=None, ensure_ascii=True):
         """Encode a json-compatible object into jsv
         
         Args:
             obj (json-compatible object): obj must also conform to the key structure of the Template, otherwise
                 an error will be raised.
+            overflow (list): If given, every key of ``obj`` (or of a nested object) that is not in the template, and so
+                is written in the ``"k":v`` form, is appended to this list.
+            memo (:class:`.MemoEncoder`): If given, string values are encoded through its caches, so that repeated
+                strings are escaped only once. Its ``ensure_ascii`` must match.
+            ensure_ascii (bool): If false, non-ascii characters are written as they are, rather than as ``\\uXXXX``
+                escapes. This is more compact for non-latin text, and is read back the same way.
         """
         c = self._key_tree
+        base = json_encode if ensure_ascii else json_encode_unicode
 
         if isinstance(c, OrderedDict):
-            return encode_dict(obj, c)
+            return encode_dict(obj, c, overflow, memo, base)
         elif isinstance(c, list):
-            return encode_list(obj, c)
+            return encode_list(obj, c, overflow, memo, base if memo is None else memo.get(None, base), base)
+        elif memo is not None:
+            return memo.get(None, base)(obj)
         else:
-            return json_encode(obj)
+            return base(obj)
+
+    def iter_encode(self, obj, overflow=None, memo=None, ensure_ascii=True):
+        """Encode a json-compatible object into jsv in pieces, consuming iterators one element at a time.
+
+        Iterators in ``obj``, such as generators, are encoded as arrays, and their elements are encoded and yielded as
+        they are produced, with the element template if the array is part of the template. Joining the pieces gives the
+        same string as :meth:`encode` would for the object with its iterators made into lists.
+
+            >>> t = jsv.JSVTemplate('{"id","events":[{"type","time"}]}')
+            >>> ''.join(t.iter_encode({'id': 1, 'events': ({'type': 'click', 'time': i} for i in range(2))}))
+            '{1,[{"click",0},{"click",1}]}'
+
+        Args:
+            obj (json-compatible object): As for :meth:`encode`, except that arrays may be iterators.
+            overflow (list): See :meth:`encode`.
+            memo (:class:`.MemoEncoder`): See :meth:`encode`.
+            ensure_ascii (bool): See :meth:`encode`.
+
+        Returns:
+            A generator of strings.
+        """
+        base = json_encode if ensure_ascii else json_encode_unicode
+        return iter_encode(obj, self._key_tree, overflow, memo, base if memo is None else memo.get(None, base), base)
+
+    def decode(self, s, into=None, intern=None):
+        """Decode a jsv string into a json-compatible object, or into an instance of a given class.
+
+        If ``into`` is given, it must be a dataclass or a namedtuple, and the record is constructed as
+        ``into(**kwargs)`` with a keyword argument for each template key that matches a field. Template keys that are
+        not fields are dropped, and so are keys not in the template, unless they match a field. Missing values are left
+        to the field's default, or ``None`` if there is no default. Nested dicts are constructed the same way if the
+        type hint of their field is a dataclass or a namedtuple, or a ``List`` or ``Optional`` of one. If the template
+        is an array, ``into`` is used for the dicts in the array. The mapping from keys to fields is computed once for
+        each class, and cached on the template for the last few classes used, or on ``intern`` if it is given.
+
+            >>> @dataclass
+            ... class Transaction:
+            ...     account_number: int
+            ...     amount: float = 0.0
+            >>> jsv.JSVTemplate('{"account_number","amount","memo"}').decode('{111,,"x"}', into=Transaction)
+            Transaction(account_number=111, amount=0.0)
 
-    def decode(self, s):
-        """Decode a jsv string into a json-compatible object
-        
         Args:
             s (str): s represents a json object that has been encoded with the given template. If it does not conform
                 to the template, or is not parsable as jsv, a :class:`.JSVRecordDecodeError` will be raised.
+            into (type): If given, the class to decode the record into.
+            intern (:class:`.Interner`): If given, repeated strings are looked up in its caches, so that they share a
+                single object.
+        """
+        if into is not None or intern is not None:
+            if self._key_tree is None:
+                if into is not None:
+                    raise ValueError('Cannot decode into a class without a dict or array template')
+                return intern_value(self.decode(s), intern)
+            return decode_nodes(s, self._class_nodes(into, intern))
+
+        c = self._key_tree
+        if c is None and isinstance(s, str):
+            # untemplated records are plain json, so hand the whole string to the C decoder
+            try:
+                return json_loads(s)
+            except ValueError as ex:
+                raise JSVRecordDecodeError('Error decoding raw json', getattr(ex, 'pos', 0)) from ex
+        node = self._node
+        if node is None and c is not None:
+            node = self._dict_node()
+        try:
+            return decode_nodes(s, node)
+        except JSVRecordDecodeError as ex:
+            err = ex
+        # the character level decoder describes most errors in terms of the template, so report its error if it has one
+        try:
+            decode_chars(c, list(reversed(s)) if isinstance(s, str) else s, len(s))
+        except JSVRecordDecodeError as ex:
+            err = ex
+        except RuntimeError:  # it recurses, so it cannot describe errors in deeply nested records
+            pass
+        raise err
+
+    def decode_bytes(self, buf, start=0, end=None, keys=None):
+        """Decode a record held in ``buf[start:end]`` of a bytes-like buffer of utf-8, such as a :class:`mmap.mmap`.
+
+        The record is scanned in place with integer offsets, and only the values in it are converted to python
+        objects, so the line is never copied into a :class:`str`. The result is the same as that of :meth:`decode`.
+
+        With ``keys``, only those top-level keys are kept. The values of the other keys are stepped over in the buffer
+        without being decoded, so they create no python objects, and are only checked to be complete. Records of the
+        default template ``{}`` are decoded whole, and then filtered.
+
+            >>> jsv.JSVTemplate('{"id","name","events":[{"type"}]}').decode_bytes(b'{1,"x",[{"a"}]}', keys=['id'])
+            {'id': 1}
+
+        Args:
+            buf (bytes, bytearray, memoryview or :class:`mmap.mmap`): Buffer holding the record.
+            start (int): Offset of the first byte of the record.
+            end (int): Offset just past the last byte of the record. Defaults to the end of ``buf``.
+            keys (iterable of str): If given, the top-level keys to decode. Only dicts are filtered; a record of an
+                array template is decoded whole.
+
+        Errors are reported as a :class:`.JSVRecordDecodeError` at a byte offset in ``buf``.
+        """
+        if end is None:
+            end = len(buf)
+        with memoryview(buf) as mv:
+            if self._key_tree is None:
+                s = utf8_str(mv, start, end)
+                try:
+                    obj = json_loads(s)
+                except ValueError as ex:
+                    raise JSVRecordDecodeError('Error decoding raw json', start + getattr(ex, 'pos', 0)) from ex
+                if keys is not None and isinstance(obj, dict):
+                    keys = frozenset(keys)
+                    obj = {k: v for k, v in obj.items() if k in keys}
+                return obj
+            if keys is not None:
+                node = self._projected_node(frozenset(keys))
+            else:
+                node = self._node
+                if node is None:
+                    node = self._dict_node()
+            return decode_nodes_bytes(buf, mv, start, end, node)
+
+    def to_json(self, s):
+        """Convert a jsv record string straight to a json string, without decoding it into python objects.
+
+        Template keys are spliced into the record text, and values are copied through unchanged once they are checked
+        to be valid json. For records written by this library, the result is identical to
+        ``json.dumps(self.decode(s), separators=(',', ':'))``.
+
+        Args:
+            s (str): A record string encoded with this template. If it does not conform to the template, a
+                :class:`.JSVRecordDecodeError` will be raised.
         """
         c = self._key_tree
-        if isinstance(s, str):
-            char_list = list(reversed(s))
-        elif isinstance(s, list):
-            char_list = s
+        out = []
+        if c is None:
+            i = skip_ws(s, 0)
+            end = scan_json(s, i)
         else:
-            raise TypeError('argument `s` must be a string or a list of characters')
+            end = value_to_json(s, skip_ws(s, 0), c, out)
+        if skip_ws(s, end) != len(s):
+            raise JSVRecordDecodeError('Unexpected data after record', end)
+        if c is None:
+            return s[i:end]
+        return ''.join(out)
 
-        def ex_loc(cl):
-            return len(s) - len(cl) - 1
+    def from_json_text(self, s):
+        """Convert a json string straight to a jsv record string, without decoding it into python objects.
 
+        The json text is scanned once. Keys that are in the template are dropped, keys that are not are written in the
+        ``"k":v`` form, and values are copied through unchanged. Values are only scanned to find where they end, not
+        validated. For compact json, the result is identical to ``self.encode(json.loads(s))``.
+
+        Args:
+            s (str): A json string. If its structure is malformed, or does not conform to the key structure of the
+                template, a :class:`ValueError` will be raised.
+        """
+        c = self._key_tree
+        i = skip_ws(s, 0)
         if c is None:
-            return get_json_value(char_list, ex_loc)
-        if isinstance(c, list):
+            end = scan_value(s, i)
+            out = s[i:end]
+        else:
             out = []
-            it = iter(c)
-            decode_array_entries(char_list, out, it, ex_loc)
-            return out
+            if isinstance(c, list):
+                end = array_from_json(s, i, c, out)
+            else:
+                end = dict_from_json(s, i, c, out)
+            out = ''.join(out)
+        if skip_ws(s, end) != len(s):
+            raise JSVRecordDecodeError('Unexpected data after json value', end)
+        return out
+
+    def encode_row(self, row, ensure_ascii=True):
+        """Encode a row of values, given in template order, into jsv.
+
+        For a template such as ``{"key_1","key_2":{"key_3","key_4"}}``, the row ``(1, (3, 4))`` is encoded to the same
+        string as the object ``{'key_1': 1, 'key_2': {'key_3': 3, 'key_4': 4}}``. Nested objects are given as nested
+        rows, and arrays as sequences whose elements are rows or values, as given by the template. ``None`` in the
+        place of a nested row or array means that the key is missing.
+
+        Args:
+            row (list or tuple): Values in the order of the keys of the template.
+            ensure_ascii (bool): If false, non-ascii characters are written as they are, as in :meth:`encode`.
+        """
+        c = self._key_tree
+        enc = json_encode if ensure_ascii else json_encode_unicode
+        if isinstance(c, OrderedDict):
+            return encode_row_dict(row, c, enc)
+        elif isinstance(c, list):
+            return encode_row_list(row, c, enc)
         else:
-            out = {}
-            it = is_last(c.items())
-            decode_dict_entries(char_list, out, it, ex_loc)
-            return out
+            return enc(row)
+
+    def decode_row(self, s):
+        """Decode a jsv string into a row of values, the inverse of :meth:`encode_row`.
+
+        Nested objects are decoded into nested tuples, in the order of the keys of the template. Missing values are
+        decoded as ``None``, and keys that are not in the template are discarded.
+
+        Args:
+            s (str): s represents a json object that has been encoded with the given template. If it does not conform
+                to the template, or is not parsable as jsv, a :class:`.JSVRecordDecodeError` will be raised.
+        """
+        node = self._row_node
+        if node is None:
+            with self._lock:
+                node = self._row_node
+                if node is None:
+                    node = self._row_node = compile_nodes(self._key_tree, make_row)
+        return decode_nodes(s, node)
+
+    def record_class(self):
+        """Return a class with ``__slots__`` for records of this template, which must be a dict template.
+
+        The class has one slot for each top-level key of the template, and an ``extra`` slot holding a dict of any keys
+        that are not in the template, or ``None``. Nested dicts in the template get nested record classes. The classes
+        are generated once and cached on the template, and the nested classes are found in ``_types`` by key; for an
+        array, ``_types`` holds a list with a class (or ``None``) for each element template. Keys must be valid python
+        identifiers that do not start with an underscore, other than ``extra``, or a :class:`ValueError` is raised.
+
+            >>> Record = jsv.JSVTemplate('{"key_1","key_2":{"key_3"}}').record_class()
+            >>> Record(1, Record._types['key_2'](3))
+            Record(key_1=1, key_2=Record_key_2(key_3=3))
+        """
+        if not isinstance(self._key_tree, OrderedDict):
+            raise ValueError('Record classes can only be made for dict templates')
+        cls = self._get_record_node().cls
+        if cls is None:
+            compile_record_nodes(self._key_tree, 'Record')  # raises the error for the offending key
+        return cls
+
+    def decode_record(self, s, intern=None):
+        """Decode a jsv string into an instance of :meth:`record_class`.
+
+        Nested dicts are decoded into instances of the nested record classes. Dicts inside arrays are also decoded into
+        record classes. Missing values are decoded as ``None``. If the template is not a dict template, dicts within
+        it are still decoded into record classes, and records of the default template ``{}`` are decoded as with
+        :meth:`decode`. So are records of templates with keys that cannot be record class attributes, such as
+        ``"first-name"`` or ``"class"``.
 
+        Args:
+            s (str): s represents a json object that has been encoded with the given template. If it does not conform
+                to the template, or is not parsable as jsv, a :class:`.JSVRecordDecodeError` will be raised.
+            intern (:class:`.Interner`): If given, repeated strings are looked up in its caches, so that they share a
+                single object.
+        """
+        node = self._record_node
+        if node is None:
+            node = self._get_record_node()
+        if intern is None:
+            return decode_nodes(s, node)
+        if self._key_tree is None:
+            return intern_value(decode_nodes(s, None), intern)
+        return decode_nodes(s, self._class_nodes(JSVRecord, intern))
+
+    def _dict_node(self):
+        with self._lock:
+            if self._node is None:
+                self._node = compile_nodes(self._key_tree, make_dict, MISSING, True)
+            return self._node
+
+    def _projected_node(self, keys):
+        if not isinstance(self._key_tree, OrderedDict):
+            return self._node or self._dict_node()
+        cache = self._projected_nodes
+        with self._lock:
+            node = cache.get(keys)
+            if node is not None:
+                cache.move_to_end(keys)
+                return node
+        node = compile_nodes(self._key_tree, make_dict, MISSING, True)
+        node.children = [c if k in keys else SKIP for k, c in zip(node.keys, node.children)]
+        node.keep_extra = keys.difference(node.keys)
+        with self._lock:
+            cache[keys] = node
+            if len(cache) > INTO_CACHE_SIZE:
+                cache.popitem(last=False)
+        return node
+
+    def _get_record_node(self):
+        # under the lock, so that all threads decode into the same record classes
+        with self._lock:
+            if self._record_node is None:
+                try:
+                    self._record_node = compile_record_nodes(self._key_tree, 'Record')
+                except ValueError:
+                    self._record_node = compile_nodes(self._key_tree, make_dict, MISSING, True)
+            return self._record_node
+
+    def _compile_class_nodes(self, into, intern):
+        """Compile the nodes for decoding into ``into`` with ``intern``, without caching them."""
+        node = self._get_record_node() if into is JSVRecord else compile_into_nodes(self._key_tree, into)
+        if intern is not None:
+            node = intern_nodes(node, intern)
+        return node
+
+    def _class_nodes(self, into, intern):
+        # Nodes that refer to an interner are cached on the interner, so that they go with it. Nodes for a class refer
+        # to the class, so a weak mapping would never release it; instead only the last few classes are kept.
+        if intern is not None:
+            key = (self, into)
+            node = intern._nodes.get(key)
+            if node is None:
+                node = intern._nodes[key] = self._compile_class_nodes(into, intern)
+            return node
+        cache = self._into_nodes
+        with self._lock:
+            node = cache.get(into)
+            if node is not None:
+                cache.move_to_end(into)
+                return node
+        node = self._compile_class_nodes(into, None)
+        with self._lock:
+            cache[into] = node
+            if len(cache) > INTO_CACHE_SIZE:
+                cache.popitem(last=False)
+        return node
+
+    def iter_array(self, fp, path, chunk_size=None):
+        """Decode the elements of an array in a record one at a time, reading the record from a text stream.
+
+        The record is read in chunks, and values before the array are skipped without being decoded, so memory use is
+        bounded by the largest element rather than by the size of the record. Each element is decoded with its element
+        template, as with :meth:`decode`.
+
+            >>> t = jsv.JSVTemplate('{"id","events":[{"type","time"}]}')
+            >>> with open('big.jsv') as f:
+            ...     for event in t.iter_array(f, 'events'):
+            ...         print(event)
+            {'type': 'click', 'time': 1}
 
-def encode_dict(obj, fm):
+        Args:
+            fp (:class:`io.TextIOBase`): Stream positioned at the start of the record. It is read past the end of the
+                array.
+            path (str, int or list): Key of the array in the template, or a list of keys and array positions leading to
+                it, such as ``['session', 'events']``. Every step must be part of the template.
+            chunk_size (int): Number of characters per read.
+
+        Returns:
+            A generator of the elements. If the array is missing from the record, it yields nothing.
+        """
+        steps, nodes = resolve_array_path(self._key_tree, path)
+        stream = fp if isinstance(fp, RecordStream) else RecordStream(fp, chunk_size)
+        return iter_stream_array(stream, steps, nodes)
+
+
+def encode_dict(obj, fm, overflow=None, memo=None, base=None):
     if not isinstance(obj, dict):
         raise ValueError('Expecting a dictionary')
+    if base is None:
+        base = json_encode
 
     entries = [''] * len(fm)
     indexes = list(fm.keys())
     for k, v in sorted(obj.items()):
+        enc = base if memo is None else memo.get(k, base)
         if k in fm:
             child_fm = fm[k]
             if isinstance(child_fm, OrderedDict):
-                entries[indexes.index(k)] = encode_dict(v, child_fm)
+                entries[indexes.index(k)] = encode_dict(v, child_fm, overflow, memo, base)
             elif isinstance(child_fm, list):
-                entries[indexes.index(k)] = encode_list(v, child_fm)
+                entries[indexes.index(k)] = encode_list(v, child_fm, overflow, memo, enc, base)
             else:
-                entries[indexes.index(k)] = json_encode(v)
+                entries[indexes.index(k)] = enc(v)
         else:
-            entries.append('"{0}":{1}'.format(k, json_encode(v)))
+            entries.append('{0}:{1}'.format(base(k if isinstance(k, str) else str(k)), enc(v)))
+            if overflow is not None:
+                overflow.append(k)
 
     return '{{{}}}'.format(','.join(entries))
 
 
-def encode_list(arr, fm):
+def encode_list(arr, fm, overflow=None, memo=None, enc=None, base=None):
     if not (isinstance(arr, list) or isinstance(arr, tuple)):
         raise ValueError('Expecting a list or tuple')
+    if base is None:
+        base = json_encode
+    if enc is None:
+        enc = base
 
     entries = []
     for i, v in enumerate(arr):
@@ -145,15 +519,479 @@ def encode_list(arr, fm):
         else:
             child_fm = fm[-1]
         if isinstance(child_fm, OrderedDict):
-            entries.append(encode_dict(v, child_fm))
+            entries.append(encode_dict(v, child_fm, overflow, memo, base))
         elif isinstance(child_fm, list):
-            entries.append(encode_list(v, child_fm))
+            entries.append(encode_list(v, child_fm, overflow, memo, enc, base))
         else:
-            entries.append(json_encode(v))
+            entries.append(enc(v))
 
     return '[{}]'.format(','.join(entries))
 
 
+def iter_encode(obj, fm, overflow, memo, enc, base):
+    if isinstance(fm, OrderedDict):
+        if not isinstance(obj, dict):
+            raise ValueError('Expecting a dictionary')
+        yield '{'
+        for idx, (k, child_fm) in enumerate(fm.items()):
+            if idx > 0:
+                yield ','
+            if k in obj:
+                yield from iter_encode(obj[k], child_fm, overflow, memo, base if memo is None else memo.get(k, base),
+                                       base)
+        for k in sorted(k for k in obj if k not in fm):
+            yield ',{}:'.format(base(k if isinstance(k, str) else str(k)))
+            yield from iter_encode(obj[k], None, overflow, memo, base if memo is None else memo.get(k, base), base)
+            if overflow is not None:
+                overflow.append(k)
+        yield '}'
+    elif fm is None and isinstance(obj, dict) and all(isinstance(k, str) for k in obj):
+        # an untemplated dict, written as json would write it
+        yield '{'
+        for idx, (k, v) in enumerate(obj.items()):
+            yield '{0}{1}:'.format(',' if idx > 0 else '', base(k))
+            yield from iter_encode(v, None, overflow, memo, base if memo is None else memo.get(k, base), base)
+        yield '}'
+    elif isinstance(fm, list) or isinstance(obj, (list, tuple, Iterator)):
+        if not isinstance(obj, (list, tuple, Iterator)):
+            raise ValueError('Expecting a list, tuple or iterator')
+        yield '['
+        for i, v in enumerate(obj):
+            if i > 0:
+                yield ','
+            if fm is None:
+                yield from iter_encode(v, None, overflow, memo, enc, base)
+            else:
+                yield from iter_encode(v, fm[i] if i < len(fm) else fm[-1], overflow, memo, enc, base)
+        yield ']'
+    else:
+        yield enc(obj)
+
+
+def encode_row_dict(row, fm, enc=None):
+    if not (isinstance(row, list) or isinstance(row, tuple)):
+        raise ValueError('Expecting a list or tuple')
+    if len(row) != len(fm):
+        raise ValueError('Expecting a row of {0:d} values, got {1:d}'.format(len(fm), len(row)))
+
+    if enc is None:
+        enc = json_encode
+
+    entries = []
+    for v, child_fm in zip(row, fm.values()):
+        if child_fm is None:
+            entries.append(enc(v))
+        elif v is None:
+            entries.append('')
+        elif isinstance(child_fm, list):
+            entries.append(encode_row_list(v, child_fm, enc))
+        else:
+            entries.append(encode_row_dict(v, child_fm, enc))
+
+    return '{{{}}}'.format(','.join(entries))
+
+
+def encode_row_list(arr, fm, enc=None):
+    if not (isinstance(arr, list) or isinstance(arr, tuple)):
+        raise ValueError('Expecting a list or tuple')
+    if enc is None:
+        enc = json_encode
+
+    entries = []
+    for i, v in enumerate(arr):
+        child_fm = fm[i] if i < len(fm) else fm[-1]
+        if child_fm is None:
+            entries.append(enc(v))
+        elif isinstance(child_fm, list):
+            entries.append(encode_row_list(v, child_fm, enc))
+        else:
+            entries.append(encode_row_dict(v, child_fm, enc))
+
+    return '[{}]'.format(','.join(entries))
+
+
+class RecordNode:
+    """A dict in a key tree, compiled for positional decoding.
+
+    ``make(node, values, extra)`` builds the decoded object from the values in key order, with ``missing`` in the
+    place of missing values. ``extra`` is a dict of the keys not in the template, or ``None`` if there are none; if
+    ``keep_extra`` is false, those values are skipped without being decoded and ``extra`` is always ``None``, and if
+    it is a set, only the keys in it are kept. A child of :data:`SKIP` means the value is skipped, and left missing.
+    ``cls`` is the class ``make`` instantiates, if any.
+    """
+    __slots__ = ('keys', 'children', 'make', 'missing', 'keep_extra', 'cls')
+
+    def __init__(self, keys, children, make, missing=None, keep_extra=False, cls=None):
+        self.keys = keys
+        self.children = children
+        self.make = make
+        self.missing = missing
+        self.keep_extra = keep_extra
+        self.cls = cls
+
+
+def make_row(node, values, extra):
+    return tuple(values)
+
+
+def compile_nodes(kt, make, missing=None, keep_extra=False):
+    """Compile a key tree into a tree of :class:`RecordNode`, lists and ``None``, mirroring its structure."""
+    root = [None]
+    stack = [(root, 0, kt)] if kt is not None else []
+    while stack:
+        parent, idx, t = stack.pop()
+        out = [None] * len(t)
+        if isinstance(t, list):
+            parent[idx] = out
+            items = enumerate(t)
+        else:
+            parent[idx] = RecordNode(list(t.keys()), out, make, missing, keep_extra)
+            items = enumerate(t.values())
+        stack.extend((out, i, c) for i, c in items if c is not None)
+    return root[0]
+
+
+class JSVRecord:
+    """Base class for the record classes generated by :meth:`.JSVTemplate.record_class`."""
+    __slots__ = ()
+    _fields = ()
+    _types = {}
+
+    def __repr__(self):
+        args = ['{0}={1!r}'.format(f, getattr(self, f)) for f in self._fields]
+        if self.extra is not None:
+            args.append('extra={!r}'.format(self.extra))
+        return '{0}({1})'.format(type(self).__name__, ', '.join(args))
+
+    def __eq__(self, other):
+        if type(self) is not type(other):
+            return NotImplemented
+        return all(getattr(self, f) == getattr(other, f) for f in self.__slots__)
+
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        return eq if eq is NotImplemented else not eq
+
+    __hash__ = None
+
+    def _asdict(self):
+        """Return the record as a dict, including the keys in ``extra``. Nested records are converted too."""
+        out = {}
+        for f in self._fields:
+            v = getattr(self, f)
+            if v is not None:
+                out[f] = record_to_obj(v)
+        if self.extra:
+            out.update(self.extra)
+        return out
+
+
+def record_to_obj(v):
+    if isinstance(v, JSVRecord):
+        return v._asdict()
+    elif isinstance(v, list):
+        return [record_to_obj(x) for x in v]
+    return v
+
+
+def make_record(node, values, extra):
+    return node.cls(*values, extra=extra)
+
+
+def make_record_class(name, fields, types):
+    for f in fields:
+        if not f.isidentifier() or iskeyword(f) or f == 'extra' or f.startswith('_'):
+            raise ValueError('Key `{}` cannot be used as a record class attribute'.format(f))
+    args = ''.join('{}=None, '.format(f) for f in fields)
+    body = ''.join('    self.{0} = {0}\n'.format(f) for f in fields)
+    src = 'def __init__(self, {0}extra=None):\n{1}    self.extra = extra\n'.format(args, body)
+    ns = {}
+    exec(src, ns)
+    attrs = {'__slots__': tuple(fields) + ('extra',), '_fields': tuple(fields), '_types': types,
+             '__init__': ns['__init__']}
+    return type(name, (JSVRecord,), attrs)
+
+
+def node_types(node):
+    if isinstance(node, list):
+        return [node_types(c) for c in node]
+    return node.cls if node is not None else None
+
+
+def compile_record_nodes(kt, name):
+    """Compile a key tree into nodes for :meth:`.JSVTemplate.decode_record`, generating a record class for each dict.
+    The record class of a dict node is ``node.cls``."""
+    if kt is None:
+        return None
+    elif isinstance(kt, list):
+        if len(kt) == 1:
+            return [compile_record_nodes(kt[0], name)]
+        return [compile_record_nodes(c, '{0}_{1:d}'.format(name, i)) for i, c in enumerate(kt)]
+    else:
+        keys = list(kt.keys())
+        children = [compile_record_nodes(c, '{0}_{1}'.format(name, k)) for k, c in kt.items()]
+        types = {k: node_types(c) for k, c in zip(keys, children) if c is not None}
+        cls = make_record_class(name, keys, types)
+        return RecordNode(keys, children, make_record, None, True, cls)
+
+
+# marks a missing value, as distinct from a null value, when decoding into a class
+MISSING = object()
+# a node for a value that decode_nodes_bytes steps over without decoding it
+SKIP = object()
+
+
+def class_fields(cls):
+    """Return ``(names, required, hints)`` for a dataclass or namedtuple: the names of the fields taken by
+    ``__init__``, the names of those without a default, and the type hints of the fields."""
+    if dataclasses is not None and isinstance(cls, type) and dataclasses.is_dataclass(cls):
+        fields = [f for f in dataclasses.fields(cls) if f.init]
+        names = [f.name for f in fields]
+        required = [f.name for f in fields
+                    if f.default is dataclasses.MISSING and f.default_factory is dataclasses.MISSING]
+        hints = {f.name: f.type for f in fields}
+    elif isinstance(cls, type) and issubclass(cls, tuple) and hasattr(cls, '_fields'):
+        names = list(cls._fields)
+        defaults = getattr(cls, '_field_defaults', {})
+        required = [f for f in names if f not in defaults]
+        hints = {}
+    else:
+        raise TypeError('argument `into` must be a dataclass or a namedtuple, got {}'.format(cls))
+    if get_type_hints is not None:
+        try:
+            hints.update(get_type_hints(cls))
+        except Exception:  # unresolvable forward references
+            pass
+    return names, required, hints
+
+
+def is_into_class(t):
+    return isinstance(t, type) and ((dataclasses is not None and dataclasses.is_dataclass(t)) or
+                                    (issubclass(t, tuple) and hasattr(t, '_fields')))
+
+
+def hint_class(t, array):
+    """Return the class to decode a value of type hint ``t`` into, or ``None``. If ``array`` is true, this is the
+    class of the elements of a ``List`` or other sequence type."""
+    args = getattr(t, '__args__', None) or ()
+    if Union is not None and getattr(t, '__origin__', None) is Union:
+        t = next((a for a in args if a is not type(None)), None)
+        args = getattr(t, '__args__', None) or ()
+    if array:
+        return hint_class(args[0], False) if len(args) == 1 else None
+    return t if is_into_class(t) else None
+
+
+def into_maker(cls, pairs, names, required):
+    def make(node, values, extra):
+        kwargs = {name: values[idx] for idx, name in pairs if values[idx] is not MISSING}
+        if extra:
+            for k, v in extra.items():
+                if k in names and k not in kwargs:
+                    kwargs[k] = v
+        for name in required:
+            if name not in kwargs:
+                kwargs[name] = None
+        return cls(**kwargs)
+    return make
+
+
+def compile_into_nodes(kt, cls):
+    """Compile a key tree into nodes for :meth:`.JSVTemplate.decode` with ``into=cls``. Dicts without a class are
+    decoded into dicts."""
+    if kt is None:
+        return None
+    elif isinstance(kt, list):
+        return [compile_into_nodes(c, cls) for c in kt]
+    keys = list(kt.keys())
+    if cls is None:
+        return compile_nodes(kt, make_dict, MISSING, True)
+
+    names, required, hints = class_fields(cls)
+    name_set = frozenset(names)
+    children = []
+    for k, c in kt.items():
+        hint = hints.get(k) if k in name_set else None
+        children.append(compile_into_nodes(c, hint_class(hint, isinstance(c, list)) if hint is not None else None))
+    pairs = [(idx, k) for idx, k in enumerate(keys) if k in name_set]
+    keep_extra = not name_set.issubset(keys)
+    return RecordNode(keys, children, into_maker(cls, pairs, name_set, required), MISSING, keep_extra, cls)
+
+
+def make_dict(node, values, extra):
+    obj = {k: v for k, v in zip(node.keys, values) if v is not MISSING}
+    if extra:
+        obj.update(extra)
+    return obj
+
+
+def intern_nodes(node, interner):
+    """Return a copy of a compiled node tree whose ``make`` functions intern string values and keys not in the
+    template with ``interner``."""
+    if node is None:
+        return None
+    elif isinstance(node, list):
+        return [intern_nodes(c, interner) for c in node]
+    positions = []
+    for idx, k in enumerate(node.keys):
+        cache = interner.cache_for(k)
+        if cache is not None:
+            positions.append((idx, cache))
+    return RecordNode(node.keys, [intern_nodes(c, interner) for c in node.children],
+                      interning_maker(node.make, positions, interner), node.missing, node.keep_extra, node.cls)
+
+
+def interning_maker(make, positions, interner):
+    def interning_make(node, values, extra):
+        for idx, cache in positions:
+            v = values[idx]
+            if type(v) is str:
+                values[idx] = cache(v)
+        if extra:
+            extra = interner.intern_dict(extra)
+        return make(node, values, extra)
+    return interning_make
+
+
+def intern_value(obj, interner):
+    return interner.intern_dict(obj) if isinstance(obj, dict) else obj
+
+
+def decode_nodes(s, node):
+    """Decode the record ``s`` with a compiled node tree.
+
+    Nesting is tracked on an explicit stack instead of by recursion, so records are not limited in depth by the
+    interpreter's recursion limit. A frame is ``[node, out]`` for an array, or ``[node, values, idx, extra]`` for a
+    dict, where ``idx`` is the position of the next templated value.
+    """
+    if isinstance(s, list):
+        s = ''.join(reversed(s))
+    elif not isinstance(s, str):
+        raise TypeError('argument `s` must be a string or a list of characters')
+    n = len(s)
+    i = skip_ws(s, 0)
+    stack = []
+    while True:
+        # decode the value at s[i] described by node, pushing a frame if it is a container with values to decode
+        if node is None:
+            try:
+                v, i = json_decode_raw(s, i)
+            except ValueError:
+                raise JSVRecordDecodeError('Error decoding raw json', i)
+        elif type(node) is list:
+            _, i = expect_char(s, i, '[')
+            i = skip_ws(s, i)
+            if i < n and s[i] == ']':
+                v = []
+                i += 1
+            else:
+                stack.append([node, []])
+                node = node[0]
+                continue
+        else:
+            _, i = expect_char(s, i, '{')
+            frame = [node, [node.missing] * len(node.children), 0, None]
+            descend, v, i = record_step(s, i, frame)
+            if descend:
+                stack.append(frame)
+                node = v
+                continue
+
+        # hand the finished value to the enclosing frames, popping those that are finished too
+        while stack:
+            frame = stack[-1]
+            if len(frame) == 2:
+                out = frame[1]
+                out.append(v)
+                c, i = expect_char(s, i, ',]')
+                if c == ']':
+                    stack.pop()
+                    v = out
+                    continue
+                node = frame[0]
+                node = node[len(out)] if len(out) < len(node) else node[-1]
+                i = skip_ws(s, i)
+                break
+            frame[1][frame[2]] = v
+            frame[2] += 1
+            descend, v, i = record_step(s, i, frame)
+            if descend:
+                node = v
+                break
+            stack.pop()
+        else:
+            if skip_ws(s, i) != n:
+                raise JSVRecordDecodeError('Unexpected data after record', i)
+            return v
+
+
+def record_step(s, i, frame):
+    """Advance a dict frame of :func:`decode_nodes` to its next templated value.
+
+    Returns ``(True, child, i)`` if the value at ``s[i]`` must be decoded with ``child``, or ``(False, obj, i)`` once
+    the closing brace is consumed and the dict has been made.
+    """
+    node, values, idx, extra = frame
+    children = node.children
+    n = len(children)
+    while idx < n:
+        if idx > 0:
+            _, i = expect_char(s, i, ',')
+        i = skip_ws(s, i)
+        if i < len(s) and (s[i] == ',' or (s[i] == '}' and idx == n - 1)):
+            idx += 1
+            continue
+        frame[2] = idx
+        return True, children[idx], i
+    frame[2] = idx
+
+    while True:
+        c, i = expect_char(s, i, '},')
+        if c == '}':
+            break
+        i = skip_ws(s, i)
+        try:
+            k, i = json_decode_raw(s, i)
+        except ValueError:
+            raise JSVRecordDecodeError('Error decoding raw json', i)
+        if not isinstance(k, str):
+            raise JSVRecordDecodeError('Expecting `"`', i)
+        _, i = expect_char(s, i, ':')
+        i = skip_ws(s, i)
+        if node.keep_extra:
+            if extra is None:
+                extra = {}
+            try:
+                extra[k], i = json_decode_raw(s, i)
+            except ValueError:
+                raise JSVRecordDecodeError('Error decoding raw json', i)
+        else:
+            i = scan_value(s, i)
+    return False, node.make(node, values, extra), i
+
+
+def decode_chars(c, char_list, n):
+    """Decode a reversed list of characters with key tree ``c``, one character at a time. This is slower than
+    :func:`decode_nodes`, but reports errors in terms of the template."""
+    def ex_loc(cl):
+        return n - len(cl) - 1
+
+    try:
+        if c is None:
+            return get_json_value(char_list, ex_loc)
+        if isinstance(c, list):
+            out = []
+            decode_array_entries(char_list, out, iter(c), ex_loc)
+        else:
+            out = {}
+            decode_dict_entries(char_list, out, is_last(c.items()), ex_loc)
+    except IndexError as ex:
+        if char_list:
+            raise
+        raise JSVRecordDecodeError('End of string reached unexpectedly', n) from ex
+    return out
+
+
 def decode_dict_entries(char_list, obj, it, ex_loc):
 
     consume_next(char_list, {'{'}, ex_loc)
@@ -254,6 +1092,570 @@ def decode_array_entries(char_list, arr, it, ex_loc):
             decode_dict_entries(char_list, n, it_next, ex_loc)
 
 
+def skip_ws(s, i):
+    return ws_re.match(s, i).end()
+
+
+def scan_value(s, i):
+    """Return the index just past the json value that starts at ``s[i]``, without decoding it."""
+    m = scalar_re.match(s, i)
+    if m:
+        return m.end()
+    if i >= len(s) or s[i] not in '[{':
+        raise JSVRecordDecodeError('Expecting a json value', i)
+    depth = 0
+    for m in container_re.finditer(s, i):
+        c = m.group()
+        if c == '[' or c == '{':
+            depth += 1
+        elif c == ']' or c == '}':
+            depth -= 1
+            if depth == 0:
+                return m.end()
+        elif c == '"':  # a string with no closing quote
+            break
+    raise JSVRecordDecodeError('End of string reached unexpectedly', len(s))
+
+
+def scan_json(s, i):
+    """Return the index just past the json value that starts at ``s[i]``, like :func:`scan_value`, but checking that
+    the value is valid json, so that it can be copied into json output as it is."""
+    m = plain_scalar_re.match(s, i)
+    if m:
+        return m.end()
+    try:
+        return json_decode_raw(s, i)[1]
+    except ValueError:
+        raise JSVRecordDecodeError('Error decoding raw json', i)
+
+
+def expect_char(s, i, chars):
+    i = skip_ws(s, i)
+    if i >= len(s):
+        raise JSVRecordDecodeError('End of string reached unexpectedly', i)
+    if s[i] not in chars:
+        raise JSVRecordDecodeError('Unexpected character `{}` encountered'.format(s[i]), i)
+    return s[i], i + 1
+
+
+def resolve_array_path(kt, path):
+    """Resolve ``path`` in key tree ``kt`` for :meth:`.JSVTemplate.iter_array`.
+
+    Returns a list of ``(is_dict, idx, n)`` steps, where ``idx`` is the position of the next value in a dict of ``n``
+    keys or in an array, and the nodes for the elements of the array at the end of the path.
+    """
+    if isinstance(path, (str, int)):
+        path = [path]
+    steps = []
+    for p in path:
+        if isinstance(kt, dict) and isinstance(p, str) and p in kt:
+            keys = list(kt)
+            steps.append((True, keys.index(p), len(keys)))
+            kt = kt[p]
+        elif isinstance(kt, list) and isinstance(p, int) and not isinstance(p, bool) and p >= 0:
+            steps.append((False, p, 0))
+            kt = kt[p] if p < len(kt) else kt[-1]
+        else:
+            raise ValueError('Path {!r} is not in the template'.format(path))
+    if isinstance(kt, dict):
+        raise ValueError('Path {!r} does not lead to an array in the template'.format(path))
+    return steps, compile_nodes(kt, make_dict, MISSING, True)
+
+
+def iter_stream_array(stream, steps, nodes):
+    for is_dict, idx, n in steps:
+        if is_dict:
+            stream.expect('{')
+            for j in range(idx + 1):
+                if j > 0:
+                    stream.expect(',')
+                c = stream.peek()
+                if c == ',' or (c == '}' and j == n - 1):
+                    if j == idx:
+                        return
+                elif j < idx:
+                    stream.skip_value()
+        else:
+            stream.expect('[')
+            if stream.peek() == ']':
+                return
+            for _ in range(idx):
+                stream.skip_value()
+                if stream.expect(',]') == ']':
+                    return
+
+    stream.expect('[')
+    if stream.peek() == ']':
+        stream.i += 1
+        return
+    count = 0
+    while True:
+        if nodes is None:
+            node = None
+        else:
+            node = nodes[count] if count < len(nodes) else nodes[-1]
+        yield decode_nodes(stream.take_value(), node)
+        count += 1
+        if stream.expect(',]') == ']':
+            return
+
+
+def decode_nodes_bytes(buf, mv, start, end, node):
+    """Decode ``buf[start:end]`` with a compiled node tree, as :func:`decode_nodes` does for a string. ``mv`` is a
+    memoryview of ``buf``, from which values are decoded without copying the buffer."""
+    # records written by this library have no whitespace, so structural characters are checked for directly first
+    i = ws_bytes_re.match(buf, start, end).end()
+    stack = []
+    while True:
+        if node is None:
+            v, i = decode_value_bytes(buf, mv, i, end)
+        elif type(node) is list:
+            _, i = expect_byte(buf, i, end, b'[')
+            if i < end and buf[i] in WS_BYTES:
+                i = ws_bytes_re.match(buf, i, end).end()
+            if i < end and buf[i] == CLOSE_BRACKET:
+                v = []
+                i += 1
+            else:
+                stack.append([node, []])
+                node = node[0]
+                continue
+        elif node is SKIP:
+            i = scan_value_bytes(buf, i, end)
+            v = MISSING
+        else:
+            _, i = expect_byte(buf, i, end, b'{')
+            frame = [node, [node.missing] * len(node.children), 0, None]
+            descend, v, i = record_step_bytes(buf, mv, i, end, frame)
+            if descend:
+                stack.append(frame)
+                node = v
+                continue
+
+        while stack:
+            frame = stack[-1]
+            if len(frame) == 2:
+                out = frame[1]
+                out.append(v)
+                c = buf[i] if i < end else None
+                if c == COMMA or c == CLOSE_BRACKET:
+                    i += 1
+                else:
+                    c, i = expect_byte(buf, i, end, b',]')
+                if c == CLOSE_BRACKET:
+                    stack.pop()
+                    v = out
+                    continue
+                node = frame[0]
+                node = node[len(out)] if len(out) < len(node) else node[-1]
+                if i < end and buf[i] in WS_BYTES:
+                    i = ws_bytes_re.match(buf, i, end).end()
+                break
+            frame[1][frame[2]] = v
+            frame[2] += 1
+            descend, v, i = record_step_bytes(buf, mv, i, end, frame)
+            if descend:
+                node = v
+                break
+            stack.pop()
+        else:
+            if ws_bytes_re.match(buf, i, end).end() != end:
+                raise JSVRecordDecodeError('Unexpected data after record', i)
+            return v
+
+
+def record_step_bytes(buf, mv, i, end, frame):
+    """Advance a dict frame of :func:`decode_nodes_bytes`, as :func:`record_step` does for a string."""
+    node, values, idx, extra = frame
+    children = node.children
+    n = len(children)
+    while idx < n:
+        if idx > 0:
+            if i < end and buf[i] == COMMA:
+                i += 1
+            else:
+                _, i = expect_byte(buf, i, end, b',')
+        if i < end:
+            c = buf[i]
+            if c in WS_BYTES:
+                i = ws_bytes_re.match(buf, i, end).end()
+                c = buf[i] if i < end else None
+            if c == COMMA or (c == CLOSE_BRACE and idx == n - 1):
+                idx += 1
+                continue
+        frame[2] = idx
+        return True, children[idx], i
+    frame[2] = idx
+
+    while True:
+        c = buf[i] if i < end else None
+        if c == CLOSE_BRACE or c == COMMA:
+            i += 1
+        else:
+            c, i = expect_byte(buf, i, end, b'},')
+        if c == CLOSE_BRACE:
+            break
+        i = ws_bytes_re.match(buf, i, end).end()
+        k, i = decode_value_bytes(buf, mv, i, end)
+        if not isinstance(k, str):
+            raise JSVRecordDecodeError('Expecting `"`', i)
+        _, i = expect_byte(buf, i, end, b':')
+        i = ws_bytes_re.match(buf, i, end).end()
+        keep = node.keep_extra
+        if keep is True or (keep and k in keep):
+            if extra is None:
+                extra = {}
+            extra[k], i = decode_value_bytes(buf, mv, i, end)
+        else:
+            i = scan_value_bytes(buf, i, end)
+    return False, node.make(node, values, extra), i
+
+
+def expect_byte(buf, i, end, chars):
+    i = ws_bytes_re.match(buf, i, end).end()
+    if i >= end:
+        raise JSVRecordDecodeError('End of string reached unexpectedly', i)
+    if buf[i] not in chars:
+        raise JSVRecordDecodeError('Unexpected character `{}` encountered'.format(chr(buf[i])), i)
+    return buf[i], i + 1
+
+
+def decode_value_bytes(buf, mv, i, end):
+    """Decode the json value at ``buf[i]``. Strings without escapes and numbers are converted straight from the
+    buffer, and anything else is handed to :mod:`json`."""
+    m = value_bytes_re.match(buf, i, end)
+    if m is None:
+        if i < end and buf[i] in b'[{':
+            j = scan_value_bytes(buf, i, end)
+            s = utf8_str(mv, i, j)
+        else:
+            j = i
+            s = ''
+        try:
+            return json_loads(s), j
+        except ValueError:
+            raise JSVRecordDecodeError('Error decoding raw json', i)
+    j = m.end()
+    g = m.lastindex
+    if g == 1:
+        return utf8_str(mv, i + 1, j - 1), j
+    elif g == 2:
+        s = utf8_str(mv, i, j)
+        try:
+            return json_loads(s), j
+        except ValueError:
+            raise JSVRecordDecodeError('Error decoding raw json', i)
+    elif g == 3:
+        return int(m.group(3)), j
+    elif g == 4:
+        return float(m.group(4)), j
+    return literal_values[m.group(5)], j
+
+
+def utf8_str(mv, i, j):
+    try:
+        return str(mv[i:j], 'utf-8')
+    except UnicodeDecodeError as ex:
+        raise JSVRecordDecodeError('Invalid utf-8', i + ex.start) from ex
+
+
+def scan_value_bytes(buf, i, end):
+    """Return the offset just past the json value that starts at ``buf[i]``, as :func:`scan_value` does for a
+    string."""
+    m = scalar_bytes_re.match(buf, i, end)
+    if m:
+        return m.end()
+    if i >= end or buf[i] not in b'[{':
+        raise JSVRecordDecodeError('Expecting a json value', i)
+    depth = 0
+    for m in container_bytes_re.finditer(buf, i, end):
+        c = m.group()
+        if c == b'[' or c == b'{':
+            depth += 1
+        elif c == b']' or c == b'}':
+            depth -= 1
+            if depth == 0:
+                return m.end()
+        elif c == b'"':
+            break
+    raise JSVRecordDecodeError('End of string reached unexpectedly', end)
+
+
+STREAM_CHUNK_SIZE = 1 << 16
+
+
+class RecordStream:
+    """Buffered scanner over a text stream, for decoding part of a record without reading all of it.
+
+    Only the part of the stream that has not been consumed is buffered, so memory is bounded by the largest value that
+    is decoded or skipped. Reads grow with the value being scanned, so a large value is scanned a bounded number of
+    times.
+    """
+    def __init__(self, fp, chunk_size=None):
+        self._fp = fp
+        self._chunk_size = chunk_size or STREAM_CHUNK_SIZE
+        self._eof = False
+        self.buf = ''
+        self.i = 0
+
+    def fill(self):
+        """Read more of the stream, dropping the part of the buffer already consumed. Returns false at the end of the
+        stream."""
+        if self._eof:
+            return False
+        chunk = self._fp.read(max(self._chunk_size, len(self.buf) - self.i))
+        if not chunk:
+            self._eof = True
+            return False
+        self.buf = self.buf[self.i:] + chunk
+        self.i = 0
+        return True
+
+    def char(self):
+        """Return the next character without consuming it, or ``''`` at the end of the stream."""
+        if self.i >= len(self.buf) and not self.fill():
+            return ''
+        return self.buf[self.i]
+
+    def peek(self):
+        """Skip whitespace, and return the next character without consuming it, or ``''`` at the end of the stream."""
+        while True:
+            self.i = skip_ws(self.buf, self.i)
+            if self.i < len(self.buf):
+                return self.buf[self.i]
+            if not self.fill():
+                return ''
+
+    def expect(self, chars):
+        c = self.peek()
+        if not c:
+            raise JSVRecordDecodeError('End of string reached unexpectedly', self.i)
+        if c not in chars:
+            raise JSVRecordDecodeError('Unexpected character `{}` encountered'.format(c), self.i)
+        self.i += 1
+        return c
+
+    def value_end(self):
+        """Return the end of the value at the current position in the buffer, reading until it is complete."""
+        self.peek()
+        while True:
+            try:
+                end = scan_value(self.buf, self.i)
+            except JSVRecordDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # a number at the end of the buffer may carry on in the next chunk
+            if (end < len(self.buf) and self.buf[end] not in number_chars) or not self.fill():
+                return end
+
+    def take_value(self):
+        end = self.value_end()
+        s = self.buf[self.i:end]
+        self.i = end
+        return s
+
+    def skip_value(self):
+        self.i = self.value_end()
+
+    def read_to(self, chars):
+        """Consume and return the text up to and including the first of ``chars``, or up to the end of the stream."""
+        start = self.i
+        while True:
+            ends = [j for j in (self.buf.find(c, start) for c in chars) if j >= 0]
+            if ends:
+                end = min(ends) + 1
+                s = self.buf[self.i:end]
+                self.i = end
+                return s
+            # the buffer is refilled starting from the current position
+            start = len(self.buf) - self.i
+            if not self.fill():
+                s = self.buf[self.i:]
+                self.i = len(self.buf)
+                return s
+
+    def skip_line(self):
+        """Consume the rest of the line, including the newline, without keeping it."""
+        while True:
+            j = self.buf.find('\n', self.i)
+            if j >= 0:
+                self.i = j + 1
+                return
+            self.i = len(self.buf)
+            if not self.fill():
+                return
+
+
+def value_to_json(s, i, fm, out):
+    """Transcode the value at ``s[i]`` with the key tree ``fm`` to json, appending the pieces to ``out``.
+
+    A frame of the stack is ``[fm, idx]`` for an array, or ``[items, idx, first]`` for a dict, where ``idx`` is the
+    position of the next element or templated key.
+    """
+    n = len(s)
+    stack = []
+    while True:
+        # open the value at s[i], pushing a frame if it is a container with values to transcode
+        if fm is None:
+            end = scan_json(s, i)
+            out.append(s[i:end])
+            i = end
+        elif isinstance(fm, list):
+            _, i = expect_char(s, i, '[')
+            out.append('[')
+            i = skip_ws(s, i)
+            if i < n and s[i] == ']':
+                out.append(']')
+                i += 1
+            else:
+                stack.append([fm, 0])
+                fm = fm[0]
+                continue
+        else:
+            _, i = expect_char(s, i, '{')
+            out.append('{')
+            frame = [list(fm.items()), 0, True]
+            descend, fm, i = dict_to_json_step(s, i, frame, out)
+            if descend:
+                stack.append(frame)
+                continue
+
+        # close the finished containers, until one has another value to open
+        while stack:
+            frame = stack[-1]
+            if len(frame) == 2:
+                c, i = expect_char(s, i, ',]')
+                if c == ']':
+                    out.append(']')
+                    stack.pop()
+                    continue
+                out.append(',')
+                frame[1] += 1
+                i = skip_ws(s, i)
+                tree = frame[0]
+                fm = tree[frame[1]] if frame[1] < len(tree) else tree[-1]
+                break
+            descend, fm, i = dict_to_json_step(s, i, frame, out)
+            if descend:
+                break
+            stack.pop()
+        else:
+            return i
+
+
+def dict_to_json_step(s, i, frame, out):
+    """Transcode the values of a dict up to its next templated value that is present, and return
+    ``(True, fm, i)`` for it, or the keys not in the template and the closing brace, and return ``(False, None, i)``.
+    """
+    items, idx, first = frame
+    n = len(items)
+    while idx < n:
+        if idx > 0:
+            _, i = expect_char(s, i, ',')
+        i = skip_ws(s, i)
+        k, v = items[idx]
+        idx += 1
+        if i < len(s) and (s[i] == ',' or (s[i] == '}' and idx == n)):
+            continue
+        if not first:
+            out.append(',')
+        frame[1] = idx
+        frame[2] = False
+        out.append(json_encode(k))
+        out.append(':')
+        return True, v, i
+
+    while True:
+        c, i = expect_char(s, i, '},')
+        if c == '}':
+            break
+        _, i = expect_char(s, i, '"')
+        end = scan_json(s, i - 1)
+        if not first:
+            out.append(',')
+        first = False
+        out.append(s[i - 1:end])
+        _, i = expect_char(s, end, ':')
+        out.append(':')
+        i = skip_ws(s, i)
+        end = scan_json(s, i)
+        out.append(s[i:end])
+        i = end
+    out.append('}')
+    return False, None, i
+
+
+def value_from_json(s, i, fm, out):
+    if fm is None:
+        end = scan_value(s, i)
+        out.append(s[i:end])
+        return end
+    elif isinstance(fm, list):
+        return array_from_json(s, i, fm, out)
+    else:
+        return dict_from_json(s, i, fm, out)
+
+
+def dict_from_json(s, i, fm, out):
+    if i >= len(s) or s[i] != '{':
+        raise ValueError('Expecting a dictionary')
+    entries = [''] * len(fm)
+    indexes = {k: idx for idx, k in enumerate(fm)}
+    overflow = {}
+    i = skip_ws(s, i + 1)
+    if i < len(s) and s[i] == '}':
+        i += 1
+    else:
+        while True:
+            _, i = expect_char(s, i, '"')
+            end = scan_value(s, i - 1)
+            key_token = s[i - 1:end]
+            key = key_token[1:-1] if '\\' not in key_token else json.loads(key_token)
+            _, i = expect_char(s, end, ':')
+            i = skip_ws(s, i)
+            idx = indexes.get(key)
+            if idx is None:
+                end = scan_value(s, i)
+                overflow[key] = '{0}:{1}'.format(key_token, s[i:end])
+                i = end
+            else:
+                val = []
+                i = value_from_json(s, i, fm[key], val)
+                entries[idx] = ''.join(val)
+            c, i = expect_char(s, i, ',}')
+            if c == '}':
+                break
+    for k in sorted(overflow):
+        entries.append(overflow[k])
+    out.append('{')
+    out.append(','.join(entries))
+    out.append('}')
+    return i
+
+
+def array_from_json(s, i, fm, out):
+    if i >= len(s) or s[i] != '[':
+        raise ValueError('Expecting a list or tuple')
+    out.append('[')
+    i = skip_ws(s, i + 1)
+    if i < len(s) and s[i] == ']':
+        out.append(']')
+        return i + 1
+    idx = 0
+    while True:
+        if idx > 0:
+            out.append(',')
+        i = skip_ws(s, i)
+        i = value_from_json(s, i, fm[idx] if idx < len(fm) else fm[-1], out)
+        idx += 1
+        c, i = expect_char(s, i, ',]')
+        if c == ']':
+            break
+    out.append(']')
+    return i
+
+
 string_escape_dict = {
     '"': '\\"',
     '\\': '\\\\',
@@ -265,237 +1667,215 @@ string_escape_dict = {
 }
 
 
+# matches any character that must be escaped in an ascii-only json string
+needs_escape_re = compile(r'[^ -~]|["\\]')
+
+
 def encode_string(s):
-    out_arr = []
-    for c in s:
-        if c in string_escape_dict:
-            out_arr.append(string_escape_dict[c])
-        elif ord(c) < 128:
-            out_arr.append(c)
-        else:
-            out_arr.append('\\u' + hex(ord(c))[2:].zfill(4))
-    return ''.join(out_arr)
+    """Escape ``s`` for use inside a json string, without the quotes. Strings with nothing to escape are returned as
+    they are."""
+    if needs_escape_re.search(s) is None:
+        return s
+    return encode_basestring_ascii(s)[1:-1]
 
 
-def encode_template_dict(kt):
-    out_arr = []
-    for k, v in kt.items():
-        if v:
-            if isinstance(v, list):
-                out_arr.append('"{0}":{1}'.format(encode_string(k), encode_template_list(v)))
-            else:
-                out_arr.append('"{0}":{1}'.format(encode_string(k), encode_template_dict(v)))
-        else:
-            out_arr.append('"{}"'.format(encode_string(k)))
+# matches any character that must be escaped in a json string that may contain non-ascii characters
+needs_escape_unicode_re = compile(r'[\x00-\x1f"\\]')
 
-    return '{{{}}}'.format(','.join(out_arr))
 
+def encode_string_unicode(s):
+    """Like :func:`encode_string`, but non-ascii characters are left as they are."""
+    if needs_escape_unicode_re.search(s) is None:
+        return s
+    return encode_basestring(s)[1:-1]
 
-def encode_template_list(kt):
-    out_arr = []
-    for v in kt:
-        if v:
-            if isinstance(v, list):
-                out_arr.append(encode_template_list(v))
+
+def encode_template(kt, key_enc=encode_string):
+    """Return the template string of the key tree ``kt``, a dict or a list.
+
+    Nesting is tracked on a stack of ``[is_list, items, first]`` frames.
+    """
+    is_list = isinstance(kt, list)
+    out = ['[' if is_list else '{']
+    stack = [[is_list, iter(kt) if is_list else iter(kt.items()), True]]
+    while stack:
+        frame = stack[-1]
+        is_list, items, first = frame
+        for item in items:
+            if not first:
+                out.append(',')
+            first = frame[2] = False
+            if is_list:
+                v = item
             else:
-                out_arr.append(encode_template_dict(v))
+                k, v = item
+                out.append('"{}"'.format(key_enc(k)))
+                if v:
+                    out.append(':')
+            if v:
+                child_is_list = isinstance(v, list)
+                out.append('[' if child_is_list else '{')
+                stack.append([child_is_list, iter(v) if child_is_list else iter(v.items()), True])
+                break
         else:
-            out_arr.append('')
+            out.append(']' if is_list else '}')
+            stack.pop()
+    return ''.join(out)
 
-    return '[{}]'.format(','.join(out_arr))
 
+TEMPLATE_CACHE_SIZE = 1024
 
-@unique
-class TemplateStates(Enum):
-    DONE = 0
-    EXPECT_ARRAY_OR_OBJECT_OR_ARRAY_CLOSE = 1
-    EXPECT_ARRAY_OR_OBJECT = 2
-    ARRAY_NEXT_OR_CLOSE = 3
-    OBJECT_AFTER_KEY = 4
-    OBJECT_NEXT_OR_CLOSE = 5
-    EXPECT_QUOTE = 6
+# parser states for template strings
+T_DONE, T_ITEM_OR_CLOSE, T_CONTAINER, T_ARRAY_NEXT, T_AFTER_KEY, T_OBJECT_NEXT, T_KEY = range(7)
+
+template_ws_re = compile(r'\s*')
+# a key without escapes, and a key with only the escapes the template grammar accepts
+plain_key_re = compile(r'"([^"\\]*)"')
+escaped_key_re = compile(r'"(?:[^"\\]|\\["\\bfnrt]|\\u[0-9a-fA-F]{4})*"')
+json_loads_lax = json.JSONDecoder(strict=False).decode
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def cached_template(t_str):
+    """Return a :class:`JSVTemplate` for the template string ``t_str``, shared with earlier calls for the same string.
+
+    Templates are not changed once they are made, so streams that define the same template many times parse it only
+    once, and the decoders compiled for it are reused.
+    """
+    return JSVTemplate(t_str)
+
+
+def into_decoder(tmpl, into, intern=None):
+    """Return a function that decodes a record of ``tmpl`` as ``tmpl.decode(s, into, intern)`` does, with nodes that
+    belong to the function rather than being cached on ``tmpl``, which :func:`cached_template` may share."""
+    if tmpl._key_tree is None:
+        return partial(tmpl.decode, into=into, intern=intern)
+    return partial(decode_nodes, node=tmpl._compile_class_nodes(into, intern))
 
 
 def parse_template_string(s):
+    """Parse a template string into a key tree.
+
+    The string is tokenized with regular expressions: whitespace is skipped and keys are matched in a single step, and
+    only the structural characters are dispatched one at a time. Anything after the closing bracket is ignored.
+    """
     if len(s.strip()) <= 0:
         return None
-    state = TemplateStates.EXPECT_ARRAY_OR_OBJECT
-    char_list = list(reversed(s))
+    n = len(s)
+    state = T_CONTAINER
     val = None
     stack = []
     has_keys = []
-
-    def ex_loc(cl):
-        return len(s) - len(cl) - 1
-
-    while state is not TemplateStates.DONE:
-        try:
-            current_char = char_list.pop()
-        except IndexError:
-            raise JSVTemplateDecodeError('End of string reached unexpectedly', ex_loc(char_list))
-
-        # --------------------------------------------
-        # State: EXPECT_ARRAY_OR_OBJECT_OR_ARRAY_CLOSE
-        # --------------------------------------------
-        if state is TemplateStates.EXPECT_ARRAY_OR_OBJECT_OR_ARRAY_CLOSE:
-            if current_char.isspace():
-                pass
-            elif current_char == '{':
-                stack.append(OrderedDict())
-                has_keys.append(False)
-                state = TemplateStates.EXPECT_QUOTE
-            elif current_char == '[':
-                stack.append([])
-                has_keys.append(False)
-            elif current_char == ',':
-                stack[-1].append(None)
-            elif current_char == ']':
-                stack[-1].append(None)
-                if has_keys.pop():
-                    val = stack.pop()
-                    prune_array_end(val)
+    i = 0
+
+    def close(v):
+        # attach a finished container to its parent, and return the next state
+        if not stack:
+            return T_DONE
+        if isinstance(stack[-1], list):
+            stack[-1].append(v)
+            return T_ARRAY_NEXT
+        key = stack.pop()
+        stack[-1][key] = v
+        return T_OBJECT_NEXT
+
+    while state != T_DONE:
+        i = template_ws_re.match(s, i).end()
+        if i >= n:
+            raise JSVTemplateDecodeError('End of string reached unexpectedly', n - 1)
+        c = s[i]
+        i += 1
+
+        if state == T_KEY:
+            if c == '"':
+                m = plain_key_re.match(s, i - 1)
+                if m is not None:
+                    stack.append(m.group(1))
+                    i = m.end()
                 else:
-                    stack.pop()
-                    val = None
-                if stack:
-                    if isinstance(stack[-1], list):
-                        stack[-1].append(val)
-                        state = TemplateStates.ARRAY_NEXT_OR_CLOSE
+                    m = escaped_key_re.match(s, i - 1)
+                    if m is not None:
+                        stack.append(json_loads_lax(m.group()))
+                        i = m.end()
                     else:
-                        key = stack.pop()
-                        stack[-1].update({key: val})
-                        state = TemplateStates.OBJECT_NEXT_OR_CLOSE
-                else:
-                    state = TemplateStates.DONE
-            else:
-                raise JSVTemplateDecodeError(
-                    'Expecting `{{`, `[` or `]`, got `{}`'.format(current_char), ex_loc(char_list))
-
-        # -----------------------------
-        # State: EXPECT_ARRAY_OR_OBJECT
-        # -----------------------------
-        elif state is TemplateStates.EXPECT_ARRAY_OR_OBJECT:
-            if current_char.isspace():
-                pass
-            elif current_char == '{':
-                stack.append(OrderedDict())
-                has_keys.append(False)
-                state = TemplateStates.EXPECT_QUOTE
-            elif current_char == '[':
-                stack.append([])
-                has_keys.append(False)
-                state = TemplateStates.EXPECT_ARRAY_OR_OBJECT_OR_ARRAY_CLOSE
-            else:
-                raise JSVTemplateDecodeError('Expecting `{{` or `[`, got `{}`'.format(current_char), ex_loc(char_list))
-
-        # --------------------------
-        # State: ARRAY_NEXT_OR_CLOSE
-        # --------------------------
-        elif state is TemplateStates.ARRAY_NEXT_OR_CLOSE:
-            if current_char.isspace():
-                pass
-            elif current_char == ',':
-                state = TemplateStates.EXPECT_ARRAY_OR_OBJECT_OR_ARRAY_CLOSE
-            elif current_char == ']':
-                if has_keys.pop():
-                    val = stack.pop()
-                    prune_array_end(val)
-                else:
-                    stack.pop()
-                    val = None
-                if stack:
-                    if isinstance(stack[-1], list):
-                        stack[-1].append(val)
-                        state = TemplateStates.ARRAY_NEXT_OR_CLOSE
-                    else:
-                        key = stack.pop()
-                        stack[-1].update({key: val})
-                        state = TemplateStates.OBJECT_NEXT_OR_CLOSE
-                else:
-                    state = TemplateStates.DONE
+                        # malformed key: the char-level reader reports where
+                        char_list = list(reversed(s[i:]))
+                        stack.append(get_json_string(char_list, lambda cl: n - len(cl) - 1, 'template'))
+                        i = n - len(char_list)
+                state = T_AFTER_KEY
+                if not has_keys[-1]:
+                    has_keys = [True] * len(has_keys)
+            elif c == '}':
+                stack.pop()
+                has_keys.pop()
+                val = None
+                state = close(val)
             else:
-                raise JSVTemplateDecodeError('Expecting `,` or `]`, got `{}`'.format(current_char), ex_loc(char_list))
-
-        # -----------------------
-        # State: OBJECT_AFTER_KEY
-        # -----------------------
-        elif state is TemplateStates.OBJECT_AFTER_KEY:
-            if current_char.isspace():
-                pass
-            elif current_char == ',':
+                raise JSVTemplateDecodeError('Expecting `"`, got `{}`'.format(c), i - 1)
+
+        elif state == T_AFTER_KEY:
+            if c == ',':
                 key = stack.pop()
-                stack[-1].update({key: None})
-                state = TemplateStates.EXPECT_QUOTE
-            elif current_char == ':':
-                state = TemplateStates.EXPECT_ARRAY_OR_OBJECT
-            elif current_char == '}':
+                stack[-1][key] = None
+                state = T_KEY
+            elif c == ':':
+                state = T_CONTAINER
+            elif c == '}':
                 key = stack.pop()
                 val = stack.pop()
                 has_keys.pop()
-                val.update({key: None})
-                if stack:
-                    if isinstance(stack[-1], list):
-                        stack[-1].append(val)
-                        state = TemplateStates.ARRAY_NEXT_OR_CLOSE
-                    else:
-                        key = stack.pop()
-                        stack[-1].update({key: val})
-                        state = TemplateStates.OBJECT_NEXT_OR_CLOSE
-                else:
-                    state = TemplateStates.DONE
+                val[key] = None
+                state = close(val)
             else:
-                raise JSVTemplateDecodeError(
-                    'Expecting `,`, `:`, or `}}`, got `{}`'.format(current_char), ex_loc(char_list))
+                raise JSVTemplateDecodeError('Expecting `,`, `:`, or `}}`, got `{}`'.format(c), i - 1)
 
-        # ---------------------------
-        # State: OBJECT_NEXT_OR_CLOSE
-        # ---------------------------
-        elif state is TemplateStates.OBJECT_NEXT_OR_CLOSE:
-            if current_char.isspace():
-                pass
-            elif current_char == ',':
-                state = TemplateStates.EXPECT_QUOTE
-            elif current_char == '}':
+        elif state == T_OBJECT_NEXT:
+            if c == ',':
+                state = T_KEY
+            elif c == '}':
                 val = stack.pop()
                 val = val if has_keys.pop() else None
-                if stack:
-                    if isinstance(stack[-1], list):
-                        stack[-1].append(val)
-                        state = TemplateStates.ARRAY_NEXT_OR_CLOSE
-                    else:
-                        key = stack.pop()
-                        stack[-1].update({key: val})
-                else:
-                    state = TemplateStates.DONE
+                state = close(val)
             else:
-                raise JSVTemplateDecodeError('Expecting `,` or `}}`, got `{}`'.format(current_char), ex_loc(char_list))
-
-        # -------------------
-        # State: EXPECT_QUOTE
-        # -------------------
-        elif state is TemplateStates.EXPECT_QUOTE:
-            if current_char.isspace():
-                pass
-            elif current_char == '"':
-                stack.append(get_json_string(char_list, ex_loc, 'template'))
-                state = TemplateStates.OBJECT_AFTER_KEY
-                has_keys = [True] * len(has_keys)
-            elif current_char == '}':
-                val = None
-                stack.pop()
-                has_keys.pop()
-                if stack:
-                    if isinstance(stack[-1], list):
-                        stack[-1].append(val)
-                        state = TemplateStates.ARRAY_NEXT_OR_CLOSE
-                    else:
-                        key = stack.pop()
-                        stack[-1].update({key: val})
-                        state = TemplateStates.OBJECT_NEXT_OR_CLOSE
+                raise JSVTemplateDecodeError('Expecting `,` or `}}`, got `{}`'.format(c), i - 1)
+
+        elif state == T_ARRAY_NEXT:
+            if c == ',':
+                state = T_ITEM_OR_CLOSE
+            elif c == ']':
+                val = stack.pop()
+                if has_keys.pop():
+                    prune_array_end(val)
                 else:
-                    state = TemplateStates.DONE
+                    val = None
+                state = close(val)
             else:
-                raise JSVTemplateDecodeError('Expecting `"`, got `{}`'.format(current_char), ex_loc(char_list))
+                raise JSVTemplateDecodeError('Expecting `,` or `]`, got `{}`'.format(c), i - 1)
+
+        elif c == '{':
+            stack.append(OrderedDict())
+            has_keys.append(False)
+            state = T_KEY
+        elif c == '[':
+            stack.append([])
+            has_keys.append(False)
+            state = T_ITEM_OR_CLOSE
+        elif state == T_CONTAINER:
+            raise JSVTemplateDecodeError('Expecting `{{` or `[`, got `{}`'.format(c), i - 1)
+
+        # state is T_ITEM_OR_CLOSE
+        elif c == ',':
+            stack[-1].append(None)
+        elif c == ']':
+            val = stack.pop()
+            val.append(None)
+            if has_keys.pop():
+                prune_array_end(val)
+            else:
+                val = None
+            state = close(val)
+        else:
+            raise JSVTemplateDecodeError('Expecting `{{`, `[` or `]`, got `{}`'.format(c), i - 1)
 
     return val
 
@@ -554,6 +1934,7 @@ class StringStates(Enum):
 def get_json_string(char_list, ex_loc, source='record'):
     state = StringStates.STRING_NEXT_OR_CLOSE
     string_array = []
+    has_surrogates = False
 
     while True:
         try:
@@ -569,6 +1950,9 @@ def get_json_string(char_list, ex_loc, source='record'):
         # ---------------------------
         if state is StringStates.STRING_NEXT_OR_CLOSE:
             if current_char == '"':
+                if has_surrogates:
+                    # combine escaped surrogate pairs into single characters, as json does
+                    return ''.join(string_array).encode('utf-16', 'surrogatepass').decode('utf-16', 'surrogatepass')
                 return ''.join(string_array)
             elif current_char == '\\':
                 state = StringStates.STRING_ESCAPE
@@ -616,8 +2000,10 @@ def get_json_string(char_list, ex_loc, source='record'):
             if hex_re.search(current_char):
                 hex_array.append(current_char)
                 if len(hex_array) >= 4:
-                    print(''.join(hex_array))
-                    string_array.append(chr(int(''.join(hex_array), 16)))
+                    code = int(''.join(hex_array), 16)
+                    if 0xd800 <= code <= 0xdfff:
+                        has_surrogates = True
+                    string_array.append(chr(code))
                     state = StringStates.STRING_NEXT_OR_CLOSE
             else:
                 if source == 'record':
@@ -650,9 +2036,9 @@ def obj_to_template_str(obj):
             obj_str = None
 
         if obj_str is None:
-            out_arr.append('"{}"'.format(k))
+            out_arr.append('"{}"'.format(encode_string(k)))
         else:
-            out_arr.append('"{0}":{1}'.format(k, obj_str))
+            out_arr.append('"{0}":{1}'.format(encode_string(k), obj_str))
 
     return '{{{}}}'.format(','.join(out_arr))
 
@@ -678,6 +2064,23 @@ def arr_to_template_str(arr):
     return '[{}]'.format(','.join(out_arr))
 
 
+def sorted_template_str(tmpl):
+    """Return the template string of ``tmpl`` with the keys of each dict in sorted order, as :func:`get_template_str`
+    derives them from an object, so that templates whose keys differ only in order have the same sorted string."""
+    if tmpl._key_tree is None:
+        return '{}'
+    # parsed again, as sorting can make trailing array elements equal, and a parsed template holds those once
+    return str(cached_template(encode_template(sorted_key_tree(tmpl._key_tree))))
+
+
+def sorted_key_tree(kt):
+    if kt is None:
+        return None
+    elif isinstance(kt, list):
+        return [sorted_key_tree(c) for c in kt]
+    return OrderedDict((k, sorted_key_tree(v)) for k, v in sorted(kt.items()))
+
+
 def consume_next(char_list, char_set, ex_loc):
     while True:
         try:
@@ -723,4 +2126,28 @@ def is_last(v):
 
 
 hex_re = compile('[0-9a-fA-F]')
+ws_re = compile(r'[ \t\n\r]*')
+string_pattern = r'"[^"\\]*(?:\\.[^"\\]*)*"'
+number_pattern = r'-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?'
+number_chars = '0123456789.eE+-'
+scalar_re = compile('|'.join([string_pattern, number_pattern, 'true', 'false', 'null', 'NaN', '-?Infinity']))
+container_re = compile(string_pattern + r'|[\[\]{}"]')
+# a string without escapes or control characters, or a number or literal: json values that need no further checks
+plain_scalar_re = compile('|'.join([r'"[^"\\\x00-\x1f]*"', number_pattern, 'true', 'false', 'null', 'NaN',
+                                    '-?Infinity']))
 json_encode = json.JSONEncoder(separators=(',', ':')).encode
+json_loads = json.loads
+json_encode_unicode = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False).encode
+json_decode_raw = json.JSONDecoder().raw_decode
+ws_bytes_re = compile(rb'[ \t\n\r]*')
+scalar_bytes_re = compile(scalar_re.pattern.encode())
+container_bytes_re = compile(container_re.pattern.encode())
+# a json value with a group for each way of decoding it: 1 a string without escapes or control characters, 2 any other
+# string, which json then validates as it does for decode, 3 an integer, 4 a float and 5 a literal
+value_bytes_re = compile('|'.join([r'"([^"\\\x00-\x1f]*)"', '({})'.format(string_pattern),
+                                   r'(-?(?:0|[1-9][0-9]*))(?![.eE0-9])', '({})'.format(number_pattern),
+                                   '(true|false|null|NaN|-?Infinity)']).encode())
+literal_values = {b'true': True, b'false': False, b'null': None, b'NaN': float('nan'), b'Infinity': float('inf'),
+                  b'-Infinity': float('-inf')}
+COMMA, CLOSE_BRACKET, CLOSE_BRACE = b',]}'
+WS_BYTES = b' \t\n\r'
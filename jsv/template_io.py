@@ -1,15 +1,29 @@
 from os import fsdecode
+from queue import Full
+from threading import RLock
 from io import TextIOBase
+from tempfile import SpooledTemporaryFile
+from time import perf_counter, monotonic
 import re
-from jsv.template import JSVTemplate
+from jsv.template import JSVTemplate, RecordStream, STREAM_CHUNK_SIZE, cached_template, into_decoder
+from jsv.template import JSVRecordDecodeError, JSVTemplateDecodeError
+from jsv.stats import JSVStats
+from jsv.prefetch import Prefetcher, DEFAULT_CHUNK_SIZE
+from jsv.hooks import encode_hooks, decode_hooks, flush_hooks, sample, fire
+from jsv.intern import as_interner
+from jsv.memo import as_memo_encoder
+from jsv.background import BackgroundWorker, DEFAULT_QUEUE_SIZE
 
 
 DEFAULT_TEMPLATE_ID = '_'
+_no_kwargs = {}
 
 
 def get_template(t):
     if isinstance(t, JSVTemplate):
         return t
+    elif isinstance(t, str):
+        return cached_template(t)
     else:
         return JSVTemplate(t)
 
@@ -18,7 +32,7 @@ class JSVTemplateKeys:
     def __init__(self, id_dict):
         self._template_dict = {}
         for k, v in id_dict.items():
-            self._add(v, k)
+            self._replace(k, None, get_template(v))
 
     def __getitem__(self, tmpl):
         t = get_template(tmpl)
@@ -35,22 +49,17 @@ class JSVTemplateKeys:
     def __contains__(self, tmpl):
         return get_template(tmpl) in self._template_dict
 
-    def _add(self, tmpl, tid):
-        td = self._template_dict
-
-        t = get_template(tmpl)
-        if t in td:
-            td[t].add(tid)
-        else:
-            td[t] = {tid}
-
-    def _remove(self, tmpl, tid):
-        t = get_template(tmpl)
-        td = self._template_dict
-        if len(td[t]) > 1:
-            td[t].remove(tid)
-        else:
-            del td[t]
+    def _replace(self, tid, old, new):
+        # copy on write: the table is swapped in whole, so a lookup never sees it half updated and needs no lock
+        td = dict(self._template_dict)
+        if old is not None:
+            if len(td[old]) > 1:
+                td[old] = td[old] - {tid}
+            else:
+                del td[old]
+        if new is not None:
+            td[new] = td[new] | {tid} if new in td else {tid}
+        self._template_dict = td
 
 
 class JSVCollection:
@@ -62,27 +71,36 @@ class JSVCollection:
     Args:
         template_dict (dict): A dictionary whose keys are template ids and whose values are :class:`.JSVTemplate`
             objects, or are values suitable for the :class:`.JSVTemplate` constructor.
+        stats (bool): If true, keep runtime counters, available through :attr:`stats`.
+        thread_safe (bool): If true, templates may be added and removed from several threads at once. Lookups never
+            wait for a lock, whether or not this is set, as the template tables are replaced rather than changed in
+            place.
 
     """
-    def __init__(self, template_dict=None):
+    def __init__(self, template_dict=None, stats=False, thread_safe=False):
         self._id_dict = {}
+        self._lock = RLock() if thread_safe else None
+        self._stats = JSVStats() if stats else None
+        self._memo = None
+        self._ensure_ascii = True
         if template_dict:
             if isinstance(template_dict, dict):
                 for k, v in template_dict.items():
-                    if isinstance(v, JSVTemplate):
-                        t = v
-                    else:
-                        t = JSVTemplate(v)
-                    self._id_dict[k] = t
+                    self._id_dict[k] = get_template(v)
             else:
                 raise TypeError('parameter `template_dict` must be a dictionary')
-        if DEFAULT_TEMPLATE_ID not in self._id_dict:
+        # the default template is only redefined by assignment if it was given, rather than implied
+        self._implicit_default = DEFAULT_TEMPLATE_ID not in self._id_dict
+        if self._implicit_default:
             self._id_dict[DEFAULT_TEMPLATE_ID] = JSVTemplate()
         self._template_keys = JSVTemplateKeys(self._id_dict)
+        # decoders into classes by template id, kept here so that the classes go with the collection
+        self._into_decoders = {}
 
     def __getitem__(self, tid):
-        if tid in self._id_dict:
-            return self._id_dict[tid]
+        d = self._id_dict
+        if tid in d:
+            return d[tid]
         else:
             raise KeyError(tid)
 
@@ -90,20 +108,39 @@ class JSVCollection:
         if not validate_id(tid):
             raise ValueError('Template id `{0}` is not valid. It must match `{1}`'.format(tid, id_regex_str))
         t = get_template(tmpl)
-
-        if tid in self._id_dict:
-            self._template_keys._remove(self._id_dict[tid], tid)
-        self._id_dict[tid] = t
-        self._template_keys._add(t, tid)
+        if self._lock is None:
+            self._set_template(tid, t)
+        else:
+            with self._lock:
+                self._set_template(tid, t)
+
+    def _set_template(self, tid, t):
+        # copy on write, as in JSVTemplateKeys
+        d = dict(self._id_dict)
+        old = d.get(tid)
+        if tid == DEFAULT_TEMPLATE_ID and self._implicit_default:
+            self._implicit_default = False
+        elif old is not None and old != t and self._stats is not None:
+            self._stats.template(tid).redefinitions += 1
+        d[tid] = t
+        self._template_keys._replace(tid, old, t)
+        self._id_dict = d
 
     def __delitem__(self, tid):
         if tid == DEFAULT_TEMPLATE_ID:
             raise ValueError('Cannot delete the default template')
-        if tid in self._id_dict:
-            self._template_keys._remove(self._id_dict[tid], tid)
-            del self._id_dict[tid]
+        if self._lock is None:
+            self._del_template(tid)
         else:
+            with self._lock:
+                self._del_template(tid)
+
+    def _del_template(self, tid):
+        if tid not in self._id_dict:
             raise KeyError(tid)
+        d = dict(self._id_dict)
+        self._template_keys._replace(tid, d.pop(tid), None)
+        self._id_dict = d
 
     def __iter__(self):
         return iter(self._id_dict)
@@ -153,6 +190,11 @@ class JSVCollection:
         """
         return self._template_keys
 
+    @property
+    def stats(self):
+        """The :class:`.JSVStats` counters for this object, or ``None`` if it was created with ``stats=False``."""
+        return self._stats
+
     def get_template_line(self, tid=DEFAULT_TEMPLATE_ID):
         """
         Return a string defining a template in a ``.jsv`` file. For example:
@@ -171,7 +213,7 @@ class JSVCollection:
         if tid not in self._id_dict:
             raise KeyError(tid)
 
-        return '#{0} {1}'.format(tid, str(self._id_dict[tid]))
+        return '#{0} {1}'.format(tid, self._id_dict[tid].to_string(self._ensure_ascii))
 
     def get_record_line(self, obj, tid=DEFAULT_TEMPLATE_ID):
         """
@@ -186,16 +228,67 @@ class JSVCollection:
             obj (json-compatible object): The object to be encoded.
             tid (str): The id of the template.
         """
-        if not isinstance(tid, str):
-            raise TypeError('argument `key` must be a string')
+        return self._encode_line(obj, tid, False)
 
-        if tid not in self._id_dict:
-            raise KeyError(tid)
+    def get_row_line(self, row, tid=DEFAULT_TEMPLATE_ID):
+        """
+        Returns a string defining a record in a ``.jsv`` file, from a row of values in template order. For example:
 
-        if tid == DEFAULT_TEMPLATE_ID:
-            return self._id_dict[tid].encode(obj)
+            >>> coll = jsv.JSVCollection()
+            >>> coll['template_1'] = '{"key_1","key_2"}'
+            >>> coll.get_row_line(('value_1', 2), 'template_1')
+            '@template_1 {"value_1",2}'
+
+        See :meth:`.JSVTemplate.encode_row`.
+
+        Args:
+            row (list or tuple): The values to be encoded.
+            tid (str): The id of the template.
+        """
+        return self._encode_line(row, tid, True)
+
+    def _encode_line(self, obj, tid, row, tmpl=None, timing=None):
+        # with `timing`, the counters are appended to it, for the caller to record with _record_encode
+        if tmpl is None:
+            if not isinstance(tid, str):
+                raise TypeError('argument `key` must be a string')
+            if tid not in self._id_dict:
+                raise KeyError(tid)
+            tmpl = self._id_dict[tid]
+        memo = self._memo
+        ascii_ = self._ensure_ascii
+        st = self._stats
+        hooks = sample(encode_hooks) if encode_hooks else None
+        if st is None and not hooks:
+            s = tmpl.encode_row(obj, ascii_) if row else tmpl.encode(obj, None, memo, ascii_)
+            if tid == DEFAULT_TEMPLATE_ID:
+                return s
+            else:
+                return '@{0} {1}'.format(tid, s)
+
+        overflow = None if st is None or row else []
+        start = perf_counter()
+        s = tmpl.encode_row(obj, ascii_) if row else tmpl.encode(obj, overflow, memo, ascii_)
+        elapsed = perf_counter() - start
+        if tid != DEFAULT_TEMPLATE_ID:
+            s = '@{0} {1}'.format(tid, s)
+        if timing is None:
+            self._record_encode(tid, s, elapsed, overflow, hooks)
         else:
-            return '@{0} {1}'.format(tid, self._id_dict[tid].encode(obj))
+            timing.append((elapsed, overflow, hooks))
+        return s
+
+    def _record_encode(self, tid, s, elapsed, overflow, hooks):
+        st = self._stats
+        if st is not None:
+            ts = st.template(tid)
+            ts.encode_time += elapsed
+            ts.records += 1
+            ts.chars += len(s)
+            if overflow:
+                ts.overflow_keys += len(overflow)
+        if hooks:
+            fire(hooks, tid, len(s), elapsed)
 
     def read_line(self, line):
         """Used to read a single line from a ``.jsv`` file. For example:
@@ -213,40 +306,91 @@ class JSVCollection:
         Returns:
             tuple: (tid, template_or_record)
         """
-        char_list = list(reversed(line))
-        if char_list[-1] == '@':
-            char_list.pop()
-            tid = get_tid(char_list)
-            obj = self[tid].decode(char_list)
-            return tid, obj
-        elif char_list[-1] == '#':
-            char_list.pop()
-            tid = get_tid(char_list)
-            tmpl = JSVTemplate(''.join(reversed(char_list)))
+        return self._read_line(line, 'decode')
+
+    def read_row(self, line):
+        """Like :meth:`read_line`, but records are decoded into rows with :meth:`.JSVTemplate.decode_row`. For example:
+
+            >>> coll = jsv.JSVCollection({'template_1': '{"key_1","key_2"}'})
+            >>> coll.read_row('@template_1 {"value_1",2}')
+            ('template_1', ('value_1', 2))
+
+        Returns:
+            tuple: (tid, template_or_row)
+        """
+        return self._read_line(line, 'decode_row')
+
+    def _read_line(self, line, method, into=None, intern=None):
+        first = line[:1]
+        if first == '#':
+            tid, body = split_tid(line)
+            tmpl = cached_template(body.rstrip('\n'))
             self[tid] = tmpl
             return tid, tmpl
-        else:
-            return DEFAULT_TEMPLATE_ID, self._id_dict[DEFAULT_TEMPLATE_ID].decode(char_list)
-
 
-def get_tid(char_list):
-    out_arr = []
-    curr_char = char_list.pop()
-    while not curr_char == ' ':
-        if curr_char.isalpha() or curr_char.isdigit() or curr_char == '_':
-            out_arr.append(curr_char)
+        if first == '@':
+            tid, body = split_tid(line)
+            tmpl = self[tid]
         else:
-            raise ValueError('Template id must match regex `{}`'.format(id_regex_str))
-        curr_char = char_list.pop()
-    out = ''.join(out_arr)
-    if out == '':
-        raise ValueError('Template id must not be the empty string')
-
-    return out
+            # untemplated lines are passed whole, and are plain json if the default template is `{}`
+            tid = DEFAULT_TEMPLATE_ID
+            tmpl = self._id_dict[DEFAULT_TEMPLATE_ID]
+            body = line
+
+        cls = into.get(tid) if into else None
+        if cls is None:
+            decode = getattr(tmpl, method)
+            kwargs = {'intern': intern} if intern is not None else _no_kwargs
+        else:
+            entry = self._into_decoders.get(tid)
+            if entry is None or entry[0] is not tmpl or entry[1] is not cls or entry[2] is not intern:
+                entry = self._into_decoders[tid] = (tmpl, cls, intern, into_decoder(tmpl, cls, intern))
+            decode = entry[3]
+            kwargs = _no_kwargs
+        st = self._stats
+        hooks = sample(decode_hooks) if decode_hooks else None
+        if st is None and not hooks:
+            return tid, decode(body, **kwargs)
+
+        start = perf_counter()
+        obj = decode(body, **kwargs)
+        elapsed = perf_counter() - start
+        self._record_decode(tid, len(line) - 1 if line.endswith('\n') else len(line), elapsed, hooks)
+        return tid, obj
+
+    def _record_decode(self, tid, n, elapsed, hooks):
+        st = self._stats
+        if st is not None:
+            ts = st.template(tid)
+            ts.decode_time += elapsed
+            ts.records += 1
+            ts.chars += n
+        if hooks:
+            fire(hooks, tid, n, elapsed)
+
+
+def split_tid(line):
+    """Split a template or record line into the template id following the leading ``#`` or ``@``, and the rest of the
+    line after the space."""
+    end = line.find(' ', 1)
+    if end < 0:
+        raise ValueError('Expecting a space after the template id')
+    tid = line[1:end]
+    if tid_re.fullmatch(tid) is None:
+        if tid == '':
+            raise ValueError('Template id must not be the empty string')
+        raise ValueError('Template id must match regex `{}`'.format(id_regex_str))
+    return tid, line[end + 1:]
+
+
+# the characters accepted in template ids when reading lines, which are letters, digits and `_`
+tid_re = re.compile(r'\w+')
 
 
 class FileManager:
-    def __init__(self, rec_file, rec_mode, tmpl_file=None, tmpl_mode=None):
+    def __init__(self, rec_file, rec_mode, tmpl_file=None, tmpl_mode=None, buffering=-1, encoding=None):
+        self._buffering = buffering
+        self._encoding = encoding
 
         if isinstance(rec_file, TextIOBase):
             self._manage_rec_fp = False
@@ -283,11 +427,11 @@ class FileManager:
 
     def enter(self):
         if self._manage_rec_fp:
-            self._rec_fp = open(self._rec_path, self._rec_mode)
+            self._rec_fp = open(self._rec_path, self._rec_mode, self._buffering, self._encoding)
             if not self._has_tmpl_file:
                 self._tmpl_fp = self._rec_fp
         if self._manage_tmpl_fp:
-            self._tmpl_fp = open(self._tmpl_path, self._tmpl_mode)
+            self._tmpl_fp = open(self._tmpl_path, self._tmpl_mode, self._buffering, self._encoding)
 
     def exit(self):
         if self._manage_rec_fp:
@@ -325,7 +469,6 @@ def populate_from_tmpl_file(fp, coll):
         tid, tmpl = coll.read_line(line)
         if not isinstance(tmpl, JSVTemplate):
             raise RuntimeError('Expecting only template definitions in a template file')
-        coll[tid] = tmpl
 
 
 class JSVWriter(JSVCollection):
@@ -366,28 +509,99 @@ class JSVWriter(JSVCollection):
             should be written. if present, templates and records will be written to different files. By convention,
             records should use the file extension ``.jsvr`` and templates should use file extension ``.jsvt``.
         template_mode (str): file mode for the template file. Only used if ``template_file`` is a string.
+        stats (bool): If true, keep runtime counters, available through :attr:`stats`.
+        buffer_size (int): If given, records are collected in memory and written in a single call once their total
+            length reaches ``buffer_size`` characters. This is also used as the buffer size when opening files from a
+            path. Templates are never held back: in a combined file they keep their place among the records, and a
+            separate template file is flushed as soon as a template is written.
+        flush_every_records (int): If given, call :meth:`flush` after every ``flush_every_records`` records.
+        flush_interval (float): If given, call :meth:`flush` when a record is written and at least ``flush_interval``
+            seconds have passed since the last flush.
+        memoize (bool, iterable of str or :class:`.MemoEncoder`): If given, encoded string values are kept in bounded
+            LRU caches, so that repeated strings are escaped only once. ``True`` caches all string values, an iterable
+            caches the values of the named keys only, and a :class:`.MemoEncoder` can be shared between writers. Rows
+            written with :meth:`write_row` are not memoized.
+        ensure_ascii (bool): If false, non-ascii characters in templates and records are written as they are, rather
+            than as ``\\uXXXX`` escapes. :class:`JSVReader` reads either form.
+        encoding (str): Encoding used when opening files from a path.
+        thread_safe (bool): If true, the write methods, :meth:`flush` and template assignment may be called from
+            several threads at once. Each line is written whole, and a template is always written before the records
+            that use it. See :class:`JSVCollection`.
+        background (bool): If true, the write methods put records on a queue, and a background thread encodes and
+            writes them in order, so that callers do not wait for encoding or for the disk. This implies
+            ``thread_safe``. Objects must not be changed after they are passed to a write method. An error raised
+            while encoding or writing a queued record is raised by the next call to a write method, :meth:`flush` or
+            :meth:`close`, which must be called, or the context manager exited, for the queued records to be written.
+        queue_size (int): With ``background``, the maximum number of records waiting to be written.
+        backpressure (str): With ``background``, what a write method does when the queue is full: ``'block'`` waits
+            for room, ``'drop'`` discards the record and counts it in :attr:`dropped`, and ``'raise'`` raises
+            :class:`queue.Full`. Templates are never dropped.
 
     """
-    def __init__(self, record_file, record_mode='at', template_dict=None, template_file=None, template_mode='at'):
-        super().__init__(template_dict)
-        self.files = FileManager(record_file, record_mode, template_file, template_mode)
+    def __init__(self, record_file, record_mode='at', template_dict=None, template_file=None, template_mode='at',
+                 stats=False, buffer_size=None, flush_every_records=None, flush_interval=None, memoize=None,
+                 ensure_ascii=True, encoding='utf-8', thread_safe=False, background=False,
+                 queue_size=DEFAULT_QUEUE_SIZE, backpressure='block'):
+        super().__init__(template_dict, stats, thread_safe or background)
+        if backpressure not in _backpressure_modes:
+            raise ValueError('argument `backpressure` must be one of {}'.format(', '.join(_backpressure_modes)))
+        self._ensure_ascii = ensure_ascii
+        self._memo = as_memo_encoder(memoize, ensure_ascii)
+        if buffer_size is not None and (not isinstance(buffer_size, int) or buffer_size < 1):
+            raise ValueError('argument `buffer_size` must be a positive integer')
+        if flush_every_records is not None and (not isinstance(flush_every_records, int) or flush_every_records < 1):
+            raise ValueError('argument `flush_every_records` must be a positive integer')
+        if flush_interval is not None and flush_interval <= 0:
+            raise ValueError('argument `flush_interval` must be positive')
+        buffering = buffer_size if buffer_size is not None and buffer_size > 1 else -1
+        self.files = FileManager(record_file, record_mode, template_file, template_mode, buffering, encoding)
+        self._buffer_size = buffer_size
+        self._buf = []
+        self._buf_len = 0
+        self._unflushed = 0
+        self._flush_every_records = flush_every_records
+        self._flush_interval = flush_interval
+        self._has_flush_policy = flush_every_records is not None or flush_interval is not None
+        self._records_since_flush = 0
+        self._last_flush = monotonic()
+        self._backpressure = backpressure
+        self._closed = False
+        self.dropped = 0
+        """Number of records discarded because the queue was full, with ``backpressure='drop'``."""
+        if background:
+            self._worker = BackgroundWorker(self._handle, queue_size, 'jsv-writer')
+        else:
+            self._worker = None
         if ((self.files.has_tmpl_file and not self.files.manage_tmpl_fp) or
                 (not self.files.has_tmpl_file and not self.files.manage_rec_fp)):
             for line in self.template_lines():
-                print(line, file=self.files.tmpl_fp)
+                self._write_template_line(line, self.files.tmpl_fp)
 
     def __enter__(self):
+        if self._worker is None:
+            # without a background thread, a closed writer can be entered again
+            self._closed = False
+        elif self._closed:
+            raise ValueError('Cannot reopen a closed background writer')
         self.files.enter()
         if ((self.files.has_tmpl_file and self.files.manage_tmpl_fp) or
                 (not self.files.has_tmpl_file and self.files.manage_rec_fp)):
             for line in self.template_lines():
-                print(line, file=self.files.tmpl_fp)
+                self._write_template_line(line, self.files.tmpl_fp)
         return self
 
     def __exit__(self, t, v, tr):
-        self.files.exit()
+        self.close()
 
     def __setitem__(self, key, value):
+        if self._lock is None:
+            self._add_template(key, value)
+        else:
+            # the template line is written, or queued, before any record can see the new template
+            with self._lock:
+                self._add_template(key, value)
+
+    def _add_template(self, key, value):
         super().__setitem__(key, value)
         try:
             if self.files.has_tmpl_file:
@@ -397,7 +611,109 @@ class JSVWriter(JSVCollection):
         except RuntimeError:
             fp = None
         if fp:
-            print(self.get_template_line(key), file=fp)
+            if self._worker is None:
+                self._write_template_line(self.get_template_line(key), fp)
+            else:
+                self._worker.put((_TEMPLATE, key, None, self.get_template_line(key)))
+
+    def _write_template_line(self, line, fp):
+        self._write_line(line, fp, not self.files.has_tmpl_file)
+        if self.files.has_tmpl_file:
+            # records are written after this returns, so a reader of the template file always sees the template first
+            start = perf_counter()
+            fp.flush()
+            if self._stats is not None:
+                self._stats.io_time += perf_counter() - start
+
+    def _write_line(self, line, fp, buffered=True):
+        line += '\n'
+        self._unflushed += len(line)
+        st = self._stats
+        start = None if st is None else perf_counter()
+        if self._buffer_size is None or not buffered:
+            fp.write(line)
+        else:
+            self._buf.append(line)
+            self._buf_len += len(line)
+            if self._buf_len >= self._buffer_size:
+                self._drain(fp)
+        if st is not None:
+            st.io_time += perf_counter() - start
+
+    def _drain(self, fp):
+        if self._buf:
+            fp.write(''.join(self._buf))
+            self._buf = []
+            self._buf_len = 0
+
+    def flush(self):
+        """Write any buffered lines, and flush the template and record files.
+
+        This is called on exiting the context manager, and whenever the ``flush_every_records`` or ``flush_interval``
+        policy requires it. If the writer is used without the context manager and ``buffer_size`` is set, it must be
+        called after the last record is written. With ``background``, it waits until the records queued before it are
+        written. It does nothing once the writer is closed.
+        """
+        if self._closed:
+            return
+        if self._worker is not None:
+            self._worker.call(self._flush)
+        elif self._lock is not None:
+            with self._lock:
+                self._flush()
+        else:
+            self._flush()
+
+    def close(self):
+        """Write any queued and buffered records, stop the background thread if there is one, flush the files, and
+        close the files opened by the writer from a path.
+
+        This is called on exiting the context manager, and does nothing if the writer is already closed. With
+        ``background``, records can no longer be written afterwards, and a write method raises :class:`ValueError`.
+        """
+        if self._lock is None:
+            self._close()
+        else:
+            # taken by _enqueue too, so no record can be queued once the background thread is told to stop
+            with self._lock:
+                self._close()
+
+    def _close(self):
+        if self._closed:
+            return
+        try:
+            if self._worker is not None:
+                self._worker.close()
+        finally:
+            try:
+                self._flush()
+            finally:
+                self._closed = True
+                self.files.exit()
+
+    def _flush(self):
+        if self._closed:
+            return
+        try:
+            rec_fp = self.files.rec_fp
+            tmpl_fp = self.files.tmpl_fp
+        except RuntimeError:
+            return
+        hooks = sample(flush_hooks) if flush_hooks else None
+        st = self._stats
+        start = perf_counter()
+        self._drain(rec_fp)
+        if tmpl_fp is not rec_fp:
+            tmpl_fp.flush()
+        rec_fp.flush()
+        elapsed = perf_counter() - start
+        if st is not None:
+            st.io_time += elapsed
+        if hooks:
+            fire(hooks, None, self._unflushed, elapsed)
+        self._unflushed = 0
+        self._records_since_flush = 0
+        self._last_flush = monotonic()
 
     def write(self, obj, tid='_'):
         """Writes an object to a file or stream in JSV format
@@ -409,8 +725,212 @@ class JSVWriter(JSVCollection):
         if isinstance(obj, JSVTemplate):
             raise ValueError('Cannot use `write` method to write a template. Template is written when added to'
                              'JSVCollection object')
+        if self._lock is not None:
+            self._submit(_RECORD, tid, obj)
+            return
         s = self.get_record_line(obj, tid)
-        print(s, file=self.files.rec_fp)
+        self._write_line(s, self.files.rec_fp)
+        if self._has_flush_policy:
+            self._apply_flush_policy()
+
+    def write_streaming(self, obj, tid='_'):
+        """Writes an object whose arrays may be iterators, encoding and writing their elements as they are produced.
+
+        The record is encoded into a temporary file, which is held in memory up to ``buffer_size`` characters, and
+        copied to the record file in pieces of that size once the whole record is encoded. Neither the arrays nor the
+        encoded line need to be held in memory. See :meth:`.JSVTemplate.iter_encode`.
+
+            >>> with jsv.JSVWriter('out.jsv', 'wt', {'s': '{"id","events":[{"type","time"}]}'}) as w:
+            ...     w.write_streaming({'id': 1, 'events': read_events()}, 's')
+
+        If an error is raised while the record is being encoded, nothing is written. With ``thread_safe``, other threads
+        can write while the arrays are consumed.
+
+        Args:
+            obj (json-compatible object): Object to be written, in which arrays may be iterators.
+            tid (str): Id of the template used to encode ``obj``.
+        """
+        if isinstance(obj, JSVTemplate):
+            raise ValueError('Cannot use `write_streaming` method to write a template. Template is written when added '
+                             'to JSVCollection object')
+        if not isinstance(tid, str):
+            raise TypeError('argument `key` must be a string')
+        if self._worker is not None:
+            self._enqueue(_STREAMING, tid, obj)
+            return
+        tmpl = self[tid]
+        # the caller's iterators are consumed without the lock, so other threads are not held up by them
+        encoded = self._encode_streaming(obj, tid, tmpl)
+        if self._lock is None:
+            self._write_streaming(encoded, tid, tmpl)
+            if self._has_flush_policy:
+                self._apply_flush_policy()
+        else:
+            with self._lock:
+                self._write_streaming(encoded, tid, tmpl)
+                if self._has_flush_policy:
+                    self._apply_flush_policy()
+
+    def _encode_streaming(self, obj, tid, tmpl):
+        chunk_size = self._buffer_size or STREAM_CHUNK_SIZE
+        hooks = sample(encode_hooks) if encode_hooks else None
+        overflow = [] if self._stats is not None else None
+        spool = SpooledTemporaryFile(chunk_size, 'w+t', encoding='utf-8', newline='')
+        start = perf_counter()
+        try:
+            pieces = [] if tid == DEFAULT_TEMPLATE_ID else ['@{} '.format(tid)]
+            buffered = len(pieces[0]) if pieces else 0
+            n = 0
+            for piece in tmpl.iter_encode(obj, overflow, self._memo, self._ensure_ascii):
+                pieces.append(piece)
+                buffered += len(piece)
+                if buffered >= chunk_size:
+                    spool.write(''.join(pieces))
+                    n += buffered
+                    pieces = []
+                    buffered = 0
+            pieces.append('\n')
+            spool.write(''.join(pieces))
+            n += buffered
+        except BaseException:
+            spool.close()
+            raise
+        return spool, n, perf_counter() - start, overflow, hooks
+
+    def _write_streaming(self, encoded, tid, tmpl):
+        spool, n, elapsed, overflow, hooks = encoded
+        fp = self.files.rec_fp
+        redefined = self._worker is None and self._id_dict.get(tid) is not tmpl
+        if redefined:
+            # the template was changed while the record was encoded, so its old definition is written around it
+            self._write_template_line('#{0} {1}'.format(tid, tmpl.to_string(self._ensure_ascii)), self.files.tmpl_fp)
+        self._drain(fp)
+        chunk_size = self._buffer_size or STREAM_CHUNK_SIZE
+        start = perf_counter()
+        with spool:
+            spool.seek(0)
+            chunk = spool.read(chunk_size)
+            while chunk:
+                fp.write(chunk)
+                chunk = spool.read(chunk_size)
+        io_time = perf_counter() - start
+        if redefined:
+            self._write_template_line(self.get_template_line(tid), self.files.tmpl_fp)
+
+        self._unflushed += n + 1
+        st = self._stats
+        if st is not None:
+            st.io_time += io_time
+            ts = st.template(tid)
+            ts.encode_time += elapsed
+            ts.records += 1
+            ts.chars += n
+            ts.overflow_keys += len(overflow)
+        if hooks:
+            fire(hooks, tid, n, elapsed)
+
+    def write_row(self, row, tid='_'):
+        """Writes a row of values, given in template order, to a file or stream in JSV format.
+
+        See :meth:`.JSVTemplate.encode_row`.
+
+        Args:
+            row (list or tuple): Values to be written.
+            tid (str): Id of the template used to encode ``row``.
+        """
+        if self._lock is not None:
+            self._submit(_ROW, tid, row)
+            return
+        s = self.get_row_line(row, tid)
+        self._write_line(s, self.files.rec_fp)
+        if self._has_flush_policy:
+            self._apply_flush_policy()
+
+    def write_line(self, line):
+        """Writes a record line that is already in JSV format, such as one returned by :meth:`get_record_line`.
+
+        The line is not checked. Its template must already have been added to the writer.
+
+        Args:
+            line (str): The record line, without a line terminator.
+        """
+        if self._lock is not None:
+            self._submit(_LINE, None, line)
+            return
+        self._write_line(line, self.files.rec_fp)
+        if self._has_flush_policy:
+            self._apply_flush_policy()
+
+    def _apply_flush_policy(self):
+        self._records_since_flush += 1
+        if self._flush_every_records is not None and self._records_since_flush >= self._flush_every_records:
+            self._flush()
+        elif self._flush_interval is not None and monotonic() - self._last_flush >= self._flush_interval:
+            self._flush()
+
+    def _submit(self, kind, tid, value):
+        if self._worker is not None:
+            self._enqueue(kind, tid, value)
+            return
+        if kind == _LINE:
+            with self._lock:
+                self._handle((kind, tid, None, value))
+            return
+        # encoded before taking the lock, so that threads encode in parallel; only the counters and the write need it
+        if not isinstance(tid, str):
+            raise TypeError('argument `key` must be a string')
+        tmpl = self[tid]
+        timing = []
+        s = self._encode_line(value, tid, kind == _ROW, tmpl, timing)
+        with self._lock:
+            if self._id_dict.get(tid) is not tmpl:
+                # redefined meanwhile, and the new template line is already written, so encode with the new template
+                timing = []
+                s = self._encode_line(value, tid, kind == _ROW, self[tid], timing)
+            if timing:
+                self._record_encode(tid, s, *timing[0])
+            self._write_line(s, self.files.rec_fp)
+            if self._has_flush_policy:
+                self._apply_flush_policy()
+
+    def _enqueue(self, kind, tid, value):
+        self._worker.check()
+        with self._lock:
+            if self._closed:
+                raise ValueError('Cannot write to a closed writer')
+            # the template is looked up now, so a later redefinition does not apply to records already queued
+            item = (kind, tid, None if tid is None else self[tid], value)
+            if self._backpressure == 'block':
+                self._worker.put(item)
+                return
+            try:
+                self._worker.put(item, False)
+            except Full:
+                if self._backpressure == 'raise':
+                    raise
+                self.dropped += 1
+
+    def _handle(self, item):
+        kind, tid, tmpl, value = item
+        if kind == _TEMPLATE:
+            self._write_template_line(value, self.files.tmpl_fp)
+            return
+        if kind == _STREAMING:
+            self._write_streaming(self._encode_streaming(value, tid, tmpl), tid, tmpl)
+        elif kind == _LINE:
+            self._write_line(value, self.files.rec_fp)
+        else:
+            self._write_line(self._encode_line(value, tid, kind == _ROW, tmpl), self.files.rec_fp)
+        if self._has_flush_policy:
+            self._apply_flush_policy()
+
+
+_backpressure_modes = ('block', 'drop', 'raise')
+# kinds of items written by JSVWriter._handle, from the background thread or under the lock
+_TEMPLATE, _RECORD, _ROW, _LINE, _STREAMING = range(5)
+
+
+_record_methods = {'dict': 'decode', 'slots': 'decode_record'}
 
 
 class JSVReader(JSVCollection):
@@ -451,10 +971,38 @@ class JSVReader(JSVCollection):
         template_file (filepath or :class:`io.TextIOBase`): Either a file path, or a file pointer to which templates
             should be written. If present, templates and records will be written to different files. By convention,
             records should use the file extension ``.jsvr`` and templates should use file extension ``.jsvt``.
+        stats (bool): If true, keep runtime counters, available through :attr:`stats`.
+        prefetch (int): If given, the record file is read on a background thread, which keeps up to ``prefetch``
+            chunks of ``chunk_size`` characters ready while records are decoded. Lines read ahead are discarded if
+            iteration stops early.
+        chunk_size (int): Number of characters per read when ``prefetch`` is used.
+        record_type (str): ``'dict'`` to decode records into dicts, or ``'slots'`` to decode them into instances of the
+            generated classes from :meth:`.JSVTemplate.record_class`, which take much less memory. Records of the
+            default template ``{}`` are still decoded into dicts.
+        into (dict): A dict of template id to a dataclass or namedtuple. Records of those templates are decoded
+            directly into instances of the class, as in :meth:`.JSVTemplate.decode`.
+        intern (bool, iterable of str or :class:`.Interner`): If given, repeated strings in records share a single
+            object, which saves memory when many records are kept. ``True`` interns all string values, an iterable
+            interns the values of the named keys only, and an :class:`.Interner` can be shared between readers. Rows
+            are not interned.
+        encoding (str): Encoding used when opening files from a path.
     """
-    def __init__(self, record_file, template_file=None):
-        super().__init__()
-        self._fm = FileManager(record_file, 'rt', template_file, 'rt')
+    def __init__(self, record_file, template_file=None, stats=False, prefetch=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 record_type='dict', into=None, intern=None, encoding='utf-8'):
+        super().__init__(stats=stats)
+        if record_type not in _record_methods:
+            raise ValueError('argument `record_type` must be one of {}'.format(', '.join(sorted(_record_methods))))
+        self._record_method = _record_methods[record_type]
+        if into is not None and not isinstance(into, dict):
+            raise TypeError('argument `into` must be a dict of template id to class')
+        self._into = into
+        self._intern = as_interner(intern)
+        if prefetch is not None and (not isinstance(prefetch, int) or prefetch < 1):
+            raise ValueError('argument `prefetch` must be a positive integer')
+        self._prefetch = prefetch
+        self._chunk_size = chunk_size
+        self._prefetcher = None
+        self._fm = FileManager(record_file, 'rt', template_file, 'rt', encoding=encoding)
         if self._fm.has_tmpl_file and not self._fm.manage_tmpl_fp:
             populate_from_tmpl_file(self._fm.tmpl_fp, self)
 
@@ -465,6 +1013,7 @@ class JSVReader(JSVCollection):
         return self
 
     def __exit__(self, t, v, tr):
+        self._close_prefetcher()
         self._fm.exit()
 
     def __iter__(self):
@@ -472,28 +1021,281 @@ class JSVReader(JSVCollection):
         by the iterator.
 
         Returns:
-            (object) where ``object`` is a json-compatible object representing a record.
+            (object) where ``object`` is a json-compatible object representing a record, or a record class instance if
+            ``record_type`` is ``'slots'``, or an instance of the class given for its template in ``into``.
         """
-        for line in self._fm.rec_fp:
-            tid, obj = self.read_line(line)
-            if isinstance(obj, JSVTemplate):
-                self[tid] = obj
-            else:
-                yield obj
+        try:
+            for line in self._lines():
+                tid, obj = self._read_line(line, self._record_method, self._into, self._intern)
+                if not isinstance(obj, JSVTemplate):
+                    yield obj
+        finally:
+            self._close_prefetcher()
 
     def items(self):
         """Iterator over both the values and the template ids for each record. Templates are consumed to decode records,
         but are not returned by the iterator.
 
         Returns:
-             (tid, object) where ``tid`` is the id of the template used, and ``object`` is a json-compatible object.
+             (tid, object) where ``tid`` is the id of the template used, and ``object`` is a json-compatible object,
+             a record class instance if ``record_type`` is ``'slots'``, or an instance of the class given for ``tid``
+             in ``into``.
+        """
+        try:
+            for line in self._lines():
+                tid, obj = self._read_line(line, self._record_method, self._into, self._intern)
+                if not isinstance(obj, JSVTemplate):
+                    yield tid, obj
+        finally:
+            self._close_prefetcher()
+
+    def rows(self):
+        """Iterator over the records as rows of values in template order, with the template id of each. Templates are
+        consumed to decode records, but are not returned by the iterator.
+
+        See :meth:`.JSVTemplate.decode_row`.
+
+        Returns:
+             (tid, row) where ``tid`` is the id of the template used, and ``row`` is a tuple.
+        """
+        try:
+            for line in self._lines():
+                tid, row = self.read_row(line)
+                if not isinstance(row, JSVTemplate):
+                    yield tid, row
+        finally:
+            self._close_prefetcher()
+
+    def iter_path(self, path):
+        """Iterator over the elements of the array at ``path`` in each record, decoded one at a time.
+
+        The record file is read in chunks of ``chunk_size`` characters, and only the array is decoded, so memory use is
+        bounded by the largest element even when a single record is very large. Records whose template has no array at
+        ``path`` are skipped. See :meth:`.JSVTemplate.iter_array`.
+
+            >>> with jsv.JSVReader('sessions.jsv') as r:
+            ...     for event in r.iter_path('events'):
+            ...         print(event)
+
+        Args:
+            path (str, int or list): Key of the array in the template, or a list of keys and array positions leading to
+                it.
+
+        Returns:
+            (object) where ``object`` is an element of the array, decoded as with :meth:`.JSVTemplate.decode`.
         """
-        for line in self._fm.rec_fp:
-            tid, obj = self.read_line(line)
-            if isinstance(obj, JSVTemplate):
-                self[tid] = obj
+        stream = RecordStream(self._fm.rec_fp, self._chunk_size)
+        while True:
+            c = stream.char()
+            if not c:
+                return
+            if c == '\n':
+                stream.i += 1
+                continue
+            if c == '#':
+                tid, body = split_tid(stream.read_to('\n'))
+                self[tid] = cached_template(body.rstrip('\n'))
+                continue
+
+            if c == '@':
+                tid, _ = split_tid(stream.read_to(' \n'))
             else:
-                yield tid, obj
+                tid = DEFAULT_TEMPLATE_ID
+            try:
+                elements = self[tid].iter_array(stream, path)
+            except ValueError:  # no array at `path` in this template
+                elements = ()
+            yield from elements
+            stream.skip_line()
+
+    def _lines(self):
+        if self._prefetch is not None:
+            self._close_prefetcher()
+            self._prefetcher = Prefetcher(self._fm.rec_fp, self._prefetch, self._chunk_size, self._stats)
+            return self._prefetcher.lines()
+        if self._stats is None:
+            return self._fm.rec_fp
+        return self._timed_lines()
+
+    def _close_prefetcher(self):
+        if self._prefetcher is not None:
+            self._prefetcher.close()
+            self._prefetcher = None
+
+    def _timed_lines(self):
+        st = self._stats
+        it = iter(self._fm.rec_fp)
+        while True:
+            start = perf_counter()
+            try:
+                line = next(it)
+            except StopIteration:
+                st.io_time += perf_counter() - start
+                return
+            st.io_time += perf_counter() - start
+            yield line
+
+
+def iter_buffer(buf, coll=None, tids=None, keys=None):
+    """Iterator over the records in a bytes-like buffer of utf-8 ``.jsv`` lines, such as a :class:`mmap.mmap` of a
+    file.
+
+    Lines are found and scanned in place, and records are decoded with :meth:`.JSVTemplate.decode_bytes`, so the file
+    is never copied into strings. Records of templates not in ``tids`` are skipped without being decoded, or creating
+    any python object, and with ``keys``, so are the values of the other keys of the records that are decoded.
+
+        >>> with open('in.jsv', 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        ...     for tid, obj in jsv.iter_buffer(m, tids=['trns'], keys=['account_number', 'amount']):
+        ...         print(obj)
+
+    Decoding is counted in the :attr:`~JSVCollection.stats` of ``coll`` and reported to decode hooks, as by
+    :class:`JSVReader`, with sizes in bytes.
+
+    Args:
+        buf (bytes, bytearray or :class:`mmap.mmap`): Buffer holding the lines.
+        coll (:class:`JSVCollection`): Collection holding any templates that are not defined in ``buf``, such as those
+            read from a separate template file. It is updated with the templates found in ``buf``.
+        tids (iterable of str): If given, only records of these templates are decoded.
+        keys (iterable of str): If given, only these top-level keys of the records are decoded. See
+            :meth:`.JSVTemplate.decode_bytes`.
+
+    Returns:
+        (tid, object) where ``tid`` is the id of the template used, and ``object`` is a json-compatible object.
+    """
+    if coll is None:
+        coll = JSVCollection()
+    if keys is not None:
+        keys = frozenset(keys)
+    # the line prefix of each wanted template id, so that records are matched in place
+    wanted = None if tids is None else {'@{} '.format(tid).encode('utf-8'): tid for tid in tids}
+    want_default = wanted is None or DEFAULT_TEMPLATE_ID in wanted.values()
+    pos = 0
+    n = len(buf)
+    while pos < n:
+        end = buf.find(b'\n', pos)
+        if end < 0:
+            end = n
+        first = buf[pos]
+        if first == HASH:
+            try:
+                line = str(buf[pos:end], 'utf-8')
+            except UnicodeDecodeError as ex:
+                raise JSVTemplateDecodeError('Invalid utf-8', pos + ex.start) from ex
+            coll.read_line(line)
+        elif first == AT:
+            space = buf.find(b' ', pos, end)
+            if space < 0:
+                raise ValueError('Expecting a space after the template id')
+            if wanted is None:
+                try:
+                    tid, _ = split_tid(str(buf[pos:space + 1], 'utf-8'))
+                except UnicodeDecodeError as ex:
+                    raise JSVRecordDecodeError('Invalid utf-8', pos + ex.start) from ex
+            else:
+                tid = None
+                for prefix, t in wanted.items():
+                    if space + 1 - pos == len(prefix) and buf.find(prefix, pos, space + 1) == pos:
+                        tid = t
+                        break
+            if tid is not None:
+                yield tid, _decode_buffer_record(coll, tid, buf, space + 1, end, keys)
+        elif end > pos and want_default:
+            yield DEFAULT_TEMPLATE_ID, _decode_buffer_record(coll, DEFAULT_TEMPLATE_ID, buf, pos, end, keys)
+        pos = end + 1
+
+
+def _decode_buffer_record(coll, tid, buf, start, end, keys):
+    tmpl = coll[tid]
+    hooks = sample(decode_hooks) if decode_hooks else None
+    if coll._stats is None and not hooks:
+        return tmpl.decode_bytes(buf, start, end, keys)
+    t0 = perf_counter()
+    obj = tmpl.decode_bytes(buf, start, end, keys)
+    coll._record_decode(tid, end - start, perf_counter() - t0, hooks)
+    return obj
+
+
+HASH, AT = b'#@'
+
+
+def transcode_to_json(fp_in, fp_out, coll=None):
+    """Convert a ``.jsv`` stream to json lines, without decoding records into python objects.
+
+    Each record is converted with :meth:`.JSVTemplate.to_json`. Template lines are consumed, and not written.
+
+    Args:
+        fp_in (:class:`io.TextIOBase`): Stream to read jsv lines from.
+        fp_out (:class:`io.TextIOBase`): Stream to write json lines to.
+        coll (:class:`JSVCollection`): Collection holding any templates that are not defined in ``fp_in``, such as
+            those read from a separate template file. It is updated with the templates found in ``fp_in``.
+
+    Returns:
+        int: The number of records written.
+    """
+    if coll is None:
+        coll = JSVCollection()
+    n = 0
+    for line in fp_in:
+        out = line_to_json(coll, line)
+        if out is not None:
+            fp_out.write(out)
+            fp_out.write('\n')
+            n += 1
+    return n
+
+
+def transcode_from_json(fp_in, fp_out, coll=None, tid=DEFAULT_TEMPLATE_ID):
+    """Convert json lines to a ``.jsv`` stream, without decoding them into python objects.
+
+    Each line is converted with :meth:`.JSVTemplate.from_json_text`, using the template ``tid``. The template line for
+    ``tid`` is written first. Blank lines are skipped.
+
+    Args:
+        fp_in (:class:`io.TextIOBase`): Stream to read json lines from.
+        fp_out (:class:`io.TextIOBase` or :class:`JSVWriter`): Stream to write jsv lines to. If this is a
+            :class:`JSVWriter`, records are written with :meth:`JSVWriter.write_line`, and the writer is responsible
+            for template lines.
+        coll (:class:`JSVCollection`): Collection holding the template. Defaults to ``fp_out`` if it is a
+            :class:`JSVWriter`, or to an empty collection.
+        tid (str): Id of the template used to encode each line.
+
+    Returns:
+        int: The number of records written.
+    """
+    is_writer = isinstance(fp_out, JSVWriter)
+    if coll is None:
+        coll = fp_out if is_writer else JSVCollection()
+    tmpl = coll[tid]
+    prefix = '' if tid == DEFAULT_TEMPLATE_ID else '@{} '.format(tid)
+    if not is_writer:
+        fp_out.write(coll.get_template_line(tid))
+        fp_out.write('\n')
+    n = 0
+    for line in fp_in:
+        if not line.strip():
+            continue
+        s = prefix + tmpl.from_json_text(line)
+        if is_writer:
+            fp_out.write_line(s)
+        else:
+            fp_out.write(s)
+            fp_out.write('\n')
+        n += 1
+    return n
+
+
+def line_to_json(coll, line):
+    """Convert one line of a ``.jsv`` stream to json. Template lines are added to ``coll``, and blank lines are
+    skipped; for both, ``None`` is returned."""
+    first = line[:1]
+    if first == '@':
+        tid, _, body = line[1:].partition(' ')
+        return coll[tid].to_json(body)
+    elif first == '#':
+        coll.read_line(line)
+    elif line.strip():
+        return coll[DEFAULT_TEMPLATE_ID].to_json(line)
+    return None
 
 
 id_regex_str = '[a-zA-Z_0-9]+'
@@ -17,6 +17,9 @@ setup(
     packages=find_packages(),
     package_dir={'jsv': 'jsv'},
     include_package_data=False,
+    entry_points={
+        'console_scripts': ['jsv=jsv.cli:main']
+    },
     zip_safe=True,
     python_requires=">=3.4",
     tests_require=[
@@ -0,0 +1,33 @@
+from jsv import JSVCollection
+from jsv.bench import run, compare, CASES
+from jsv.bench.datasets import DATASETS
+import pytest
+
+
+@pytest.mark.parametrize('name', sorted(DATASETS))
+def test_datasets_round_trip(name):
+    template_dict, records = DATASETS[name](20, 1)
+    assert len(records) == 20
+    assert records == DATASETS[name](20, 1)[1]
+    coll = JSVCollection(template_dict)
+    for tid, obj in records:
+        assert coll[tid].decode(coll[tid].encode(obj)) == obj
+
+
+def test_run():
+    res = run(['flat', 'mixed'], records=10, repeat=1, memory=False)
+    assert {r['dataset'] for r in res['results']} == {'flat', 'mixed'}
+    assert {r['case'] for r in res['results']} == set(CASES)
+    assert {r['format'] for r in res['results']} == {'jsv', 'jsonl'}
+    for r in res['results']:
+        assert r['records'] == 10
+        assert r['records_per_sec'] > 0
+        assert r['peak_memory_bytes'] is None
+    assert res['sizes']['flat']['jsv_bytes'] < res['sizes']['flat']['jsonl_bytes']
+
+    ratios = compare(res, res)
+    assert len(ratios) == len(res['results'])
+    assert all(r[3] == 1.0 for r in ratios)
+
+    with pytest.raises(ValueError):
+        run(['not_a_dataset'])
@@ -0,0 +1,157 @@
+from jsv.cli import main
+import json
+import pytest
+
+
+records = [
+    {'account_number': 1, 'amount': 1.5, 'status': 'open'},
+    {'account_number': 2, 'amount': 2.5, 'status': 'closed'},
+    {'account_number': 3, 'new_address': {'city': 'Oakland', 'zip': '94607'}},
+    {'account_number': 4, 'amount': 4.5, 'status': 'open', 'memo': 'extra'},
+    {'events': [{'kind': 'a'}, {'kind': 'b'}]}
+]
+
+
+@pytest.fixture
+def jsonl(tmp_path):
+    path = tmp_path / 'in.jsonl'
+    path.write_text(''.join(json.dumps(r) + '\n' for r in records) + '\n')
+    return path
+
+
+def read_jsonl(path):
+    with open(str(path)) as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+@pytest.mark.parametrize('auto', [True, False])
+def test_round_trip(tmp_path, jsonl, workers, auto):
+    jsv_path = tmp_path / 'out.jsv'
+    out_path = tmp_path / 'out.jsonl'
+    args = ['encode', str(jsonl), '-o', str(jsv_path), '-w', str(workers), '--batch-size', '2', '-q']
+    assert main(args + (['--auto-template'] if auto else [])) == 0
+    lines = jsv_path.read_text().splitlines()
+    if auto:
+        assert lines[:2] == ['#_ {}', '#t0 {"account_number","amount","status"}']
+        assert lines[2] == '@t0 {1,1.5,"open"}'
+    assert main(['decode', str(jsv_path), '-o', str(out_path), '-w', str(workers), '--batch-size', '2', '-q']) == 0
+    assert read_jsonl(out_path) == records
+
+
+def test_template_file(tmp_path, jsonl):
+    rec_path = tmp_path / 'out.jsvr'
+    tmpl_path = tmp_path / 'out.jsvt'
+    out_path = tmp_path / 'out.jsonl'
+    assert main(['encode', str(jsonl), '-o', str(rec_path), '--template-file', str(tmpl_path), '--auto-template',
+                 '-q']) == 0
+    assert all(line.startswith('#') for line in tmpl_path.read_text().splitlines())
+    assert not any(line.startswith('#') for line in rec_path.read_text().splitlines())
+    assert main(['decode', str(rec_path), '--template-file', str(tmpl_path), '-o', str(out_path), '-q']) == 0
+    assert read_jsonl(out_path) == records
+
+
+def test_explicit_template_and_max_templates(tmp_path, jsonl):
+    jsv_path = tmp_path / 'out.jsv'
+    out_path = tmp_path / 'out.jsonl'
+    assert main(['encode', str(jsonl), '-o', str(jsv_path), '-t', '_={"account_number"}', '-q']) == 0
+    assert jsv_path.read_text().splitlines()[1] == '{1,"amount":1.5,"status":"open"}'
+
+    for max_templates in (1, 2):
+        assert main(['encode', str(jsonl), '-o', str(jsv_path), '--auto-template', '--max-templates',
+                     str(max_templates), '-q']) == 0
+        assert sum(line.startswith('#') for line in jsv_path.read_text().splitlines()) == max_templates
+        assert main(['decode', str(jsv_path), '-o', str(out_path), '-q']) == 0
+        assert read_jsonl(out_path) == records
+
+    assert main(['encode', str(jsonl), '-o', str(jsv_path), '--auto-template', '-q',
+                 '-t', 'ev={"events":[{"kind"},{"kind"}]}', '-t', 'acct={"account_number","amount","status"}']) == 0
+    lines = jsv_path.read_text().splitlines()
+    assert lines[3:5] == ['@acct {1,1.5,"open"}', '@acct {2,2.5,"closed"}']
+    assert lines[-1] == '@ev {[{"a"},{"b"}]}'
+    assert main(['decode', str(jsv_path), '-o', str(out_path), '-q']) == 0
+    assert read_jsonl(out_path) == records
+
+    # keys of given templates are matched in any order, and records are written in the given order
+    assert main(['encode', str(jsonl), '-o', str(jsv_path), '--auto-template', '-q', '-w', '2',
+                 '-t', 'acct={"status","amount","account_number"}', '-t', 'ev={"events":[{"kind"}]}']) == 0
+    lines = jsv_path.read_text().splitlines()
+    assert lines[:3] == ['#acct {"status","amount","account_number"}', '#ev {"events":[{"kind"}]}', '#_ {}']
+    assert lines[3:5] == ['@acct {"open",1.5,1}', '@acct {"closed",2.5,2}']
+    assert lines[-1] == '@ev {[{"a"},{"b"}]}'
+    assert main(['decode', str(jsv_path), '-o', str(out_path), '-q']) == 0
+    assert read_jsonl(out_path) == records
+
+
+def test_auto_template_empty_and_scalar_records(tmp_path):
+    rows = [{}, 5, 'x', [], {'a': 1}, None]
+    in_path = tmp_path / 'in.jsonl'
+    in_path.write_text(''.join(json.dumps(r) + '\n' for r in rows))
+    jsv_path = tmp_path / 'out.jsv'
+    out_path = tmp_path / 'out.jsonl'
+    assert main(['encode', str(in_path), '-o', str(jsv_path), '--auto-template', '-q']) == 0
+    assert jsv_path.read_text().splitlines() == ['#_ {}', '{}', '5', '"x"', '[]', '#t0 {"a"}', '@t0 {1}', 'null']
+    assert main(['decode', str(jsv_path), '-o', str(out_path), '-q']) == 0
+    assert read_jsonl(out_path) == rows
+
+
+def test_raw_unicode(tmp_path):
+    rows = [{'名前': '東京', 'city': 'Zürich'}, {'名前': '😀'}]
+    in_path = tmp_path / 'in.jsonl'
+    in_path.write_text(''.join(json.dumps(r) + '\n' for r in rows), encoding='utf-8')
+    jsv_path = tmp_path / 'out.jsv'
+    out_path = tmp_path / 'out.jsonl'
+    assert main(['encode', str(in_path), '-o', str(jsv_path), '--auto-template', '--raw-unicode', '-q']) == 0
+    lines = jsv_path.read_text(encoding='utf-8').splitlines()
+    assert lines[1:3] == ['#t0 {"city","名前"}', '@t0 {"Zürich","東京"}']
+    assert main(['decode', str(jsv_path), '-o', str(out_path), '-q']) == 0
+    with open(str(out_path), encoding='utf-8') as f:
+        assert [json.loads(line) for line in f] == rows
+
+
+def test_errors(jsonl, capsys):
+    assert main(['encode', str(jsonl), '-t', 'bad id={"a"}', '-q']) == 1
+    assert 'ID=TEMPLATE' in capsys.readouterr().err
+    assert main(['encode', str(jsonl), '-t', 'x={"a"}', '-q']) == 1
+    assert '--auto-template' in capsys.readouterr().err
+    assert main(['encode', str(jsonl), '-w', '0']) == 2
+
+
+def test_split(tmp_path, jsonl, capsys):
+    jsv_path = tmp_path / 'out.jsv'
+    assert main(['encode', str(jsonl), '-o', str(jsv_path), '--auto-template', '-q']) == 0
+    with pytest.raises(SystemExit):
+        main(['split', str(jsv_path), '--max-bytes', '0K', '-q'])
+    capsys.readouterr()
+    assert main(['split', str(jsv_path), '--max-bytes', '1K', '-o', str(tmp_path / 'one.{}.jsv'), '-q']) == 0
+    assert capsys.readouterr().out == str(tmp_path / 'one.0.jsv') + '\n'
+    assert main(['split', str(jsv_path), '--max-bytes', '60']) == 0
+    out = capsys.readouterr()
+    paths = out.out.split()
+    assert paths[0] == str(tmp_path / 'out.00000.jsv') and len(paths) > 2
+    assert out.err.startswith('5 records')
+    decoded = []
+    for i, path in enumerate(paths):
+        assert main(['decode', path, '-o', str(tmp_path / '{}.jsonl'.format(i)), '-q']) == 0
+        decoded += read_jsonl(tmp_path / '{}.jsonl'.format(i))
+    assert decoded == records
+
+
+def test_merge(tmp_path, jsonl, capsys):
+    a, b, out = tmp_path / 'a.jsv', tmp_path / 'b.jsv', tmp_path / 'out.jsv'
+    assert main(['encode', str(jsonl), '-o', str(a), '--auto-template', '-q']) == 0
+    assert main(['encode', str(jsonl), '-o', str(b), '-t', '_={"account_number"}', '-q']) == 0
+    assert main(['merge', str(a), str(b), '-o', str(out)]) == 0
+    assert capsys.readouterr().err.startswith('10 records')
+    assert main(['decode', str(out), '-o', str(tmp_path / 'out.jsonl'), '-q']) == 0
+    assert read_jsonl(tmp_path / 'out.jsonl') == records + records
+
+
+def test_decode_deeply_nested(tmp_path):
+    depth = 600
+    jsv_path = tmp_path / 'deep.jsv'
+    out_path = tmp_path / 'deep.jsonl'
+    jsv_path.write_text('#_ ' + '{"a":' * depth + '{"b"}' + '}' * depth + '\n' + '{' * (depth + 1) + '1' +
+                        '}' * (depth + 1) + '\n')
+    assert main(['decode', str(jsv_path), '-o', str(out_path), '-q']) == 0
+    assert out_path.read_text() == '{"a":' * depth + '{"b":1}' + '}' * depth + '\n'
@@ -0,0 +1,71 @@
+from jsv import JSVCollection, JSVReader, JSVWriter, hooks, iter_buffer
+from io import StringIO
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def clear_hooks():
+    hooks.clear()
+    yield
+    hooks.clear()
+
+
+def test_encode_decode_hooks():
+    encoded = []
+    decoded = []
+    hooks.on_encode(lambda tid, n, d: encoded.append((tid, n, d)))
+
+    @hooks.on_decode
+    def trace(tid, n, d):
+        decoded.append((tid, n, d))
+
+    coll = JSVCollection({'a': '{"key_1"}'})
+    line = coll.get_record_line({'key_1': 1}, 'a')
+    assert line == '@a {1}'
+    assert len(encoded) == 1
+    assert encoded[0][:2] == ('a', len(line))
+    assert encoded[0][2] >= 0
+
+    assert coll.read_line(line + '\n') == ('a', {'key_1': 1})
+    assert coll.read_line('#b {"key_2"}')[0] == 'b'
+    assert decoded[0][:2] == ('a', len(line))
+    assert len(decoded) == 1
+
+    hooks.remove(trace)
+    coll.read_line(line)
+    assert len(decoded) == 1
+    with pytest.raises(ValueError):
+        hooks.remove(trace)
+
+
+def test_iter_buffer_decode_hooks():
+    decoded = []
+    hooks.on_decode(lambda tid, n, d: decoded.append((tid, n)))
+    assert len(list(iter_buffer(b'#a {"key_1"}\n@a {1}\n@b {2}\n{"x":3}', JSVCollection({'b': '{"key_1"}'}),
+                                tids=['a', '_']))) == 2
+    assert decoded == [('a', 3), ('_', 7)]
+
+
+def test_sampling():
+    calls = []
+    hooks.on_decode(lambda tid, n, d: calls.append(tid), every=3)
+    fp = StringIO('\n'.join('{{"n":{}}}'.format(i) for i in range(10)))
+    with JSVReader(fp) as r:
+        assert len(list(r)) == 10
+    assert calls == ['_'] * 3
+
+    with pytest.raises(ValueError):
+        hooks.on_encode(lambda tid, n, d: None, every=0)
+    with pytest.raises(TypeError):
+        hooks.on_encode('not callable')
+
+
+def test_flush_hook():
+    flushes = []
+    hooks.on_flush(lambda tid, n, d: flushes.append((tid, n)))
+    fp = StringIO()
+    with JSVWriter(fp, template_dict={'_': '{"key_1"}'}) as w:
+        w.write({'key_1': 1})
+        w.flush()
+        w.write({'key_1': 22})
+    assert flushes == [(None, len('#_ {"key_1"}\n{1}\n')), (None, len('{22}\n'))]
@@ -0,0 +1,91 @@
+from jsv import Interner, JSVTemplate, JSVReader
+from io import StringIO
+from jsv.template import cached_template
+import gc
+import weakref
+import pytest
+
+
+def fresh(s):
+    # build an equal string that is a different object
+    return ''.join(list(s))
+
+
+def test_interner_global():
+    interner = Interner(maxsize=2)
+    a, b = fresh('value'), fresh('value')
+    assert a is not b
+    assert interner.cache_for('any')(a) is interner.cache_for('other')(b)
+    obj = interner.intern_dict({fresh('key'): fresh('value'), 'n': 1})
+    assert obj == {'key': 'value', 'n': 1}
+    assert obj['key'] is a
+    assert interner.cache_info()['values'].maxsize == 2
+
+    interner.clear()
+    assert interner.cache_info()['values'].currsize == 0
+
+
+def test_interner_fields():
+    interner = Interner(['status'])
+    assert interner.cache_for('memo') is None
+    obj_1 = interner.intern_dict({'status': fresh('ok'), 'memo': fresh("a memo")})
+    obj_2 = interner.intern_dict({'status': fresh('ok'), 'memo': fresh("a memo")})
+    assert obj_1['status'] is obj_2['status']
+    assert obj_1['memo'] is not obj_2['memo']
+    assert set(interner.cache_info()) == {'keys', 'status'}
+
+
+def test_interner_errors():
+    with pytest.raises(ValueError):
+        Interner(maxsize=0)
+    with pytest.raises(TypeError):
+        JSVReader(StringIO(), intern='status')
+
+
+def test_decode_intern():
+    interner = Interner(['status', 'city'])
+    t = JSVTemplate('{"status","memo","address":{"city"},"events":[{"status"}]}')
+    rec_str = '{"ok","a memo",{"SF"},[{"ok"},{"bad"}],"country":"US"}'
+    obj_1 = t.decode(rec_str, intern=interner)
+    obj_2 = t.decode(rec_str, intern=interner)
+    assert obj_1 == obj_2 == t.decode(rec_str)
+    assert obj_1['status'] is obj_2['status'] is obj_1['events'][0]['status']
+    assert obj_1['address']['city'] is obj_2['address']['city']
+    assert obj_1['memo'] is not obj_2['memo']
+    assert [k for k in obj_1 if k == 'country'][0] is [k for k in obj_2 if k == 'country'][0]
+
+    r_1 = t.decode_record(rec_str, intern=interner)
+    assert r_1.status is obj_1['status']
+    assert r_1.extra == {'country': 'US'}
+
+    obj_1 = JSVTemplate().decode('{"status":"ok"}', intern=interner)
+    assert obj_1['status'] is obj_2['status']
+
+
+def test_reader_intern():
+    fp = StringIO('#a {"status","memo"}\n@a {"ok","a memo"}\n@a {"ok","a memo"}\n{"status":"ok"}\n')
+    with JSVReader(fp, intern=True) as r:
+        objs = list(r)
+    assert objs == [{'status': 'ok', 'memo': 'a memo'}] * 2 + [{'status': 'ok'}]
+    assert objs[0]['status'] is objs[1]['status'] is objs[2]['status']
+    assert objs[0]['memo'] is objs[1]['memo']
+
+    fp.seek(0)
+    with JSVReader(fp, intern=['status'], record_type='slots') as r:
+        objs = list(r)
+    assert objs[0].status is objs[1].status
+    assert objs[0].memo is not objs[1].memo
+
+
+def test_dropped_interner_is_collected():
+    t = cached_template('{"a","b":[{"c"}]}')
+    interner = Interner()
+    ref = weakref.ref(interner)
+    with JSVReader(StringIO('#t {"a","b":[{"c"}]}\n@t {"x",[{1}]}\n'), intern=interner) as r:
+        assert list(r) == [{'a': 'x', 'b': [{'c': 1}]}]
+    assert t.decode('{"x",[{1}]}', intern=interner) == {'a': 'x', 'b': [{'c': 1}]}
+    assert t.decode_record('{"x",[{1}]}', intern=interner).a == 'x'
+    assert len(interner._nodes) == 2
+    del r, interner
+    gc.collect()
+    assert ref() is None
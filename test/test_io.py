@@ -1,6 +1,13 @@
-from jsv import JSVCollection, JSVTemplate, JSVReader, JSVWriter
+from jsv import JSVCollection, JSVTemplate, JSVReader, JSVWriter, JSVRecordDecodeError, JSVTemplateDecodeError, \
+    iter_buffer, transcode_to_json, transcode_from_json
+from jsv.template import cached_template
 from io import StringIO
+import mmap
+import queue
+import threading
+from collections import namedtuple
 from unittest.mock import MagicMock, patch
+import pytest
 from pytest import mark
 
 
@@ -259,6 +266,20 @@ def test_reader_iter():
             assert rec == exp
 
 
+def test_reader_deeply_nested():
+    depth = 5000
+    t_str = '{"a":' * depth + '{"b"}' + '}' * depth
+    rec_str = '{' * (depth + 1) + '1' + '}' * (depth + 1)
+    with JSVReader(StringIO('#x {}\n@x {}\n@x {}\n'.format(t_str, rec_str, rec_str))) as r:
+        recs = list(r)
+        assert str(r['x']) == t_str
+    assert len(recs) == 2
+    obj = recs[0]
+    for _ in range(depth):
+        obj = obj['a']
+    assert obj == {'b': 1}
+
+
 def test_bad_template_file():
     rec_fp = StringIO()
     tmpl_fp = StringIO('\n'.join([
@@ -441,5 +462,512 @@ def test_file_manager():
         assert str(ex) == 'No file pointer to a template file. Are you in the context manager?'
 
 
+class CountingStringIO(StringIO):
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+        self.flushes = 0
+
+    def write(self, s):
+        self.writes += 1
+        return super().write(s)
+
+    def flush(self):
+        self.flushes += 1
+        super().flush()
+
+
+def test_writer_buffer_size():
+    fp = CountingStringIO()
+    w = JSVWriter(fp, template_dict={'_': writer_tmpl}, buffer_size=1000)
+    for obj in writer_recs:
+        w.write(obj)
+    assert fp.getvalue() == ''
+    w.flush()
+    assert fp.getvalue() == '#_ {"key_1"}\n{"record_1"}\n{"record_2"}\n'
+    assert fp.writes == 1
 
+    fp = CountingStringIO()
+    w = JSVWriter(fp, buffer_size=20)
+    for i in range(10):
+        w.write({'n': i})
+    assert fp.writes == 3
+    w.flush()
+    assert fp.getvalue() == '#_ {}\n' + ''.join('{{"n":{}}}\n'.format(i) for i in range(10))
 
+    try:
+        JSVWriter(StringIO(), buffer_size=0)
+        assert False
+    except ValueError as ex:
+        assert str(ex) == 'argument `buffer_size` must be a positive integer'
+
+
+def test_writer_template_flushed_before_records():
+    rec_fp = CountingStringIO()
+    tmpl_fp = CountingStringIO()
+    w = JSVWriter(rec_fp, template_file=tmpl_fp, buffer_size=1000)
+    assert tmpl_fp.getvalue() == '#_ {}\n'
+    w['a'] = '{"key_1"}'
+    assert tmpl_fp.getvalue() == '#_ {}\n#a {"key_1"}\n'
+    assert tmpl_fp.flushes == 2
+    w.write({'key_1': 1}, 'a')
+    assert rec_fp.getvalue() == ''
+    w.flush()
+    assert rec_fp.getvalue() == '@a {1}\n'
+
+
+@mark.parametrize('kwargs', [{}, {'buffer_size': 100}, {'thread_safe': True}, {'background': True}])
+def test_writer_close_is_idempotent(tmp_path, kwargs):
+    path = tmp_path / 'out.jsv'
+    with JSVWriter(str(path), 'wt', **kwargs) as w:
+        w.write({'a': 1})
+        w.close()
+        w.flush()
+    w.close()
+    w.flush()
+    assert path.read_text() == '#_ {}\n{"a":1}\n'
+    if kwargs.get('background'):
+        with pytest.raises(ValueError):
+            w.__enter__()
+    else:
+        with w:
+            w.write({'a': 2})
+        assert path.read_text() == '#_ {}\n{"a":2}\n'
+
+
+def test_writer_flush_policy():
+    fp = CountingStringIO()
+    w = JSVWriter(fp, buffer_size=1000, flush_every_records=3)
+    for i in range(7):
+        w.write({'n': i})
+    assert fp.flushes == 2
+    assert fp.getvalue().count('\n') == 7
+
+    fp = CountingStringIO()
+    w = JSVWriter(fp, buffer_size=1000, flush_interval=3600)
+    for i in range(7):
+        w.write({'n': i})
+    assert fp.flushes == 0
+
+    with patch('jsv.template_io.monotonic', MagicMock(side_effect=[0.0, 0.5, 2.0, 2.1, 2.2])):
+        fp = CountingStringIO()
+        w = JSVWriter(fp, buffer_size=1000, flush_interval=1.0)
+        w.write({'n': 0})
+        assert fp.flushes == 0
+        w.write({'n': 1})
+        assert fp.flushes == 1
+
+
+def test_transcode_to_json():
+    fp_in = StringIO('\n'.join([
+        '#_ {"key_1"}',
+        '{"record_1"}',
+        '#a {"key_1":{"key_2"},"key_3":[{"key_4"}]}',
+        '@a {{2},[{3},{4,"key_5":[5]}],"key_6":null}',
+        '',
+        '@a {,[]}'
+    ]))
+    fp_out = StringIO()
+    coll = JSVCollection()
+    assert transcode_to_json(fp_in, fp_out, coll) == 3
+    assert fp_out.getvalue() == '\n'.join([
+        '{"key_1":"record_1"}',
+        '{"key_1":{"key_2":2},"key_3":[{"key_4":3},{"key_4":4,"key_5":[5]}],"key_6":null}',
+        '{"key_3":[]}'
+    ]) + '\n'
+    assert 'a' in coll
+
+    try:
+        transcode_to_json(StringIO('@b {1}'), StringIO())
+        assert False
+    except KeyError as ex:
+        assert str(ex) == "'b'"
+
+
+def test_transcode_from_json():
+    fp_in = StringIO('{"key_1":"record_1","key_2":2}\n\n{"key_2":3}\n')
+    fp_out = StringIO()
+    coll = JSVCollection({'a': '{"key_1"}'})
+    assert transcode_from_json(fp_in, fp_out, coll, 'a') == 2
+    assert fp_out.getvalue() == '#a {"key_1"}\n@a {"record_1","key_2":2}\n@a {,"key_2":3}\n'
+
+    fp_in.seek(0)
+    with StringIO() as rec_file, StringIO() as tmpl_file:
+        w = JSVWriter(rec_file, 'at', {'_': writer_tmpl}, tmpl_file)
+        assert transcode_from_json(fp_in, w) == 2
+        assert rec_file.getvalue() == '{"record_1","key_2":2}\n{,"key_2":3}\n'
+        assert tmpl_file.getvalue() == '#_ {"key_1"}\n'
+
+
+def test_write_row_and_rows():
+    fp = StringIO()
+    w = JSVWriter(fp, template_dict={'a': '{"key_1","key_2":{"key_3"}}'})
+    w.write_row((1, (2,)), 'a')
+    w.write({'key_1': 3, 'key_2': {'key_3': 4}, 'key_4': 5}, 'a')
+    w['b'] = '[{"key_1"}]'
+    w.write_row([('x',), ('y',)], 'b')
+    w.write_row({'free': 1})
+    assert fp.getvalue().splitlines()[-5:] == [
+        '@a {1,{2}}', '@a {3,{4},"key_4":5}', '#b [{"key_1"}]', '@b [{"x"},{"y"}]', '{"free":1}']
+
+    fp.seek(0)
+    with JSVReader(fp, stats=True) as r:
+        assert list(r.rows()) == [('a', (1, (2,))), ('a', (3, (4,))), ('b', [('x',), ('y',)]), ('_', {'free': 1})]
+    assert r.stats['a'].records == 2
+
+
+def test_reader_record_type():
+    fp = StringIO('#a {"key_1","key_2":{"key_3"}}\n@a {1,{2}}\n{"free":1}\n@a {3,,"key_4":4}\n')
+    with JSVReader(fp, record_type='slots') as r:
+        recs = list(r.items())
+    Record = r['a'].record_class()
+    assert recs == [('a', Record(1, Record._types['key_2'](2))), ('_', {'free': 1}),
+                    ('a', Record(3, extra={'key_4': 4}))]
+
+    fp_keys = StringIO('#a {"first-name","class"}\n@a {"x",1}\n#b {"key_1"}\n@b {2}\n')
+    with JSVReader(fp_keys, record_type='slots') as r:
+        recs = list(r.items())
+    assert recs == [('a', {'first-name': 'x', 'class': 1}), ('b', r['b'].record_class()(2))]
+
+    try:
+        JSVReader(fp, record_type='namedtuple')
+        assert False
+    except ValueError as ex:
+        assert str(ex) == 'argument `record_type` must be one of dict, slots'
+
+
+def test_reader_into():
+    Point = namedtuple('Point', ['key_1', 'key_2'])
+    fp = StringIO('#a {"key_1","key_2"}\n@a {1,2}\n#b {"key_1"}\n@b {3}\n{"key_1":4}\n')
+    with JSVReader(fp, into={'a': Point}) as r:
+        assert list(r) == [Point(1, 2), {'key_1': 3}, {'key_1': 4}]
+    # the nodes for Point are kept by the reader, not by the template that cached_template shares
+    assert Point not in cached_template('{"key_1","key_2"}')._into_nodes
+    fp = StringIO('#a {"key_1","key_2"}\n@a {1,2}\n#a {"key_2","key_1"}\n@a {1,2}\n')
+    with JSVReader(fp, into={'a': Point}) as r:
+        assert list(r) == [Point(1, 2), Point(2, 1)]
+
+    try:
+        JSVReader(fp, into=Point)
+        assert False
+    except TypeError as ex:
+        assert str(ex) == 'argument `into` must be a dict of template id to class'
+
+
+def test_writer_ensure_ascii(tmp_path):
+    path = str(tmp_path / 'out.jsv')
+    with JSVWriter(path, 'wt', {'a': '{"名前"}'}, ensure_ascii=False, memoize=True) as w:
+        w.write({'名前': '東京', 'über': 1}, 'a')
+    with open(path, encoding='utf-8') as f:
+        assert f.read() == '#a {"名前"}\n#_ {}\n@a {"東京","über":1}\n'
+    with JSVReader(path) as r:
+        assert list(r) == [{'名前': '東京', 'über': 1}]
+
+    fp = StringIO()
+    with JSVWriter(fp, template_dict={'a': '{"名前"}'}) as w:
+        w.write({'名前': '東京'}, 'a')
+    assert fp.getvalue().splitlines()[-2:] == ['#_ {}', '@a {"\\u6771\\u4eac"}']
+    assert '#a {"\\u540d\\u524d"}' in fp.getvalue()
+
+
+@mark.parametrize('line, ex_msg', [
+    ('@ {1}', 'Template id must not be the empty string'),
+    ('@a-b {1}', 'Template id must match regex `[a-zA-Z_0-9]+`'),
+    ('#a', 'Expecting a space after the template id')
+])
+def test_read_line_tid_errors(line, ex_msg):
+    try:
+        JSVCollection({'a': '{"key_1"}'}).read_line(line)
+        assert False
+    except ValueError as ex:
+        assert str(ex) == ex_msg
+
+
+@mark.parametrize('line', ['{"key_1": 1} 2', '{"key_1": }'])
+def test_read_line_untemplated(line):
+    coll = JSVCollection()
+    assert coll.read_line(' {"key_1": [1, "two"]}\n') == ('_', {'key_1': [1, 'two']})
+    assert coll.read_line('"plain"') == ('_', 'plain')
+    try:
+        coll.read_line(line)
+        assert False
+    except JSVRecordDecodeError:
+        pass
+
+
+def test_read_line_shares_templates():
+    r_1 = JSVReader(StringIO('#a {"key_1"}\n@a {1}\n'))
+    r_2 = JSVReader(StringIO('#b {"key_1"}\n'))
+    assert list(r_1) == [{'key_1': 1}]
+    list(r_2)
+    assert r_1['a'] is r_2['b']
+    assert r_1.templates['{"key_1"}'] == 'a'
+
+
+@mark.parametrize('chunk_size', [1, 3, 1 << 16])
+def test_reader_iter_path(chunk_size):
+    s = ('#s {"id","events":[{"type","n"}]}\n'
+         '#h {"name"}\n'
+         '@s {1,[{"a",0},{"a",1},{"a",2}]}\n'
+         '@h {"x"}\n'
+         '\n'
+         '@s {2,[]}\n'
+         '@s {3,}\n'
+         '@s {4,[{"b",9,"extra":[1]}]}\n'
+         '{"events":[1,2]}\n')
+    r = JSVReader(StringIO(s), chunk_size=chunk_size)
+    assert list(r.iter_path('events')) == [{'type': 'a', 'n': 0}, {'type': 'a', 'n': 1}, {'type': 'a', 'n': 2},
+                                           {'type': 'b', 'n': 9, 'extra': [1]}]
+    assert str(r['h']) == '{"name"}'
+    r = JSVReader(StringIO('#_ {"a":{"b":[,{"c"}]}}\n{{[1,{2},{3}]}}\n{{[4]}}\n'), chunk_size=chunk_size)
+    assert list(r.iter_path(['a', 'b'])) == [1, {'c': 2}, {'c': 3}, 4]
+
+
+@mark.parametrize('buffer_size', [None, 1, 16])
+def test_writer_write_streaming(buffer_size):
+    out = StringIO()
+    writes = []
+    write = out.write
+    out.write = lambda s: writes.append(s) or write(s)
+    with JSVWriter(out, 'wt', {'s': '{"id","events":[{"type","n"}]}'}, stats=True, buffer_size=buffer_size) as w:
+        w.write({'id': 0, 'events': []}, 's')
+        w.write_streaming({'id': 1, 'events': ({'type': 't', 'n': i} for i in range(5)), 'more': iter([1])}, 's')
+        w.write_streaming({'key_1': iter(['a', {'b': iter([2])}])})
+    assert out.getvalue() == ('#s {"id","events":[{"type","n"}]}\n#_ {}\n@s {0,[]}\n'
+                              '@s {1,[{"t",0},{"t",1},{"t",2},{"t",3},{"t",4}],"more":[1]}\n'
+                              '{"key_1":["a",{"b":[2]}]}\n')
+    if buffer_size == 1:
+        assert len(writes) > 10
+    assert w.stats['s'].records == 2
+    assert w.stats['s'].overflow_keys == 1
+    assert w.stats['s'].chars == len('@s {0,[]}') + len('@s {1,[{"t",0},{"t",1},{"t",2},{"t",3},{"t",4}],"more":[1]}')
+
+
+def test_iter_buffer(tmp_path):
+    path = str(tmp_path / 'buf.jsv')
+    with JSVWriter(path, 'wt', {'a': '{"key_1","key_2"}', 'b': '[{"key_3"}]'}, ensure_ascii=False) as w:
+        w.write({'key_1': 'é', 'key_2': [1]}, 'a')
+        w.write([{'key_3': 2}], 'b')
+        w.write({'key_4': 3})
+        w['a'] = '{"key_2"}'
+        w.write({'key_2': 4}, 'a')
+    with open(path, 'rt', encoding='utf-8') as f:
+        expected = list(JSVReader(f).items())
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        assert list(iter_buffer(m)) == expected
+        assert list(iter_buffer(m, tids=['a'])) == [('a', {'key_1': 'é', 'key_2': [1]}), ('a', {'key_2': 4})]
+        assert list(iter_buffer(m, tids=['_'])) == [('_', {'key_4': 3})]
+    coll = JSVCollection({'c': '{"key_1"}'})
+    assert list(iter_buffer(b'@c {1}\n\n{"x":2}', coll)) == [('c', {'key_1': 1}), ('_', {'x': 2})]
+
+
+def test_iter_buffer_keys_and_stats():
+    buf = '#a {"key_1","key_2"}\n@a {1,[2]}\n@ab {3}\n@a {"é",,"x":5}\n{"key_2":6}\n'.encode('utf-8')
+    coll = JSVCollection({'ab': '{"key_2"}'}, stats=True)
+    assert list(iter_buffer(buf, coll, tids=['a'], keys=['key_1', 'x'])) == [
+        ('a', {'key_1': 1}), ('a', {'key_1': 'é', 'x': 5})]
+    assert coll.stats['a'].records == 2
+    assert coll.stats['a'].chars == len(b'{1,[2]}') + len('{"é",,"x":5}'.encode('utf-8'))
+    assert list(iter_buffer(buf, coll, keys=['key_2'])) == [
+        ('a', {'key_2': [2]}), ('ab', {'key_2': 3}), ('a', {}), ('_', {'key_2': 6})]
+    assert coll.stats['a'].records == 4
+    assert coll.stats['_'].records == 1
+
+
+def test_iter_buffer_errors():
+    for buf, error in ((b'#a {"\xff"}\n', JSVTemplateDecodeError), (b'#a {}\n@a\xff {1}\n', JSVRecordDecodeError),
+                       (b'{"a":"\xff"}\n', JSVRecordDecodeError), (b'@b {1}\n', KeyError),
+                       (b'@a-b {1}\n', ValueError), (b'@a\n', ValueError)):
+        with pytest.raises(error):
+            list(iter_buffer(buf))
+    # records of other templates are not decoded, or even checked
+    assert list(iter_buffer(b'@b {1}\n@\xff {1}\n{"a":1}\n', tids=['_'])) == [('_', {'a': 1})]
+
+
+def test_writer_background():
+    out = StringIO()
+    with JSVWriter(out, 'wt', {'a': '{"x"}'}, background=True, queue_size=4) as w:
+        for i in range(100):
+            w.write({'x': i}, 'a')
+        w['a'] = '{"y"}'
+        w.write({'y': 100}, 'a')
+        w.write_row([101], 'a')
+        w.write_line('@a {102}')
+        w.write_streaming({'y': iter([103])}, 'a')
+        with pytest.raises(KeyError):
+            w.write({'x': 0}, 'b')
+        w.flush()
+        assert out.getvalue().endswith('@a {[103]}\n')
+    lines = out.getvalue().splitlines()
+    assert lines[:2] == ['#a {"x"}', '#_ {}']
+    assert lines[2:102] == ['@a {{{}}}'.format(i) for i in range(100)]
+    assert lines[102:] == ['#a {"y"}', '@a {100}', '@a {101}', '@a {102}', '@a {[103]}']
+    with pytest.raises(ValueError):
+        w.write({'x': 0}, 'a')
+    w.close()
+
+
+def test_writer_background_threads():
+    out = StringIO()
+    with JSVWriter(out, 'wt', background=True) as w:
+        def produce(n):
+            w['t{}'.format(n)] = '{"n","i"}'
+            for i in range(200):
+                w.write({'n': n, 'i': i}, 't{}'.format(n))
+        threads = [threading.Thread(target=produce, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    with JSVReader(StringIO(out.getvalue())) as r:
+        records = list(r.items())
+    for n in range(4):
+        assert [obj['i'] for tid, obj in records if tid == 't{}'.format(n)] == list(range(200))
+
+
+class BlockingStringIO(StringIO):
+    def __init__(self):
+        super().__init__()
+        self.unblocked = threading.Event()
+        self.unblocked.set()
+
+    def write(self, s):
+        self.unblocked.wait()
+        return super().write(s)
+
+
+@mark.parametrize('backpressure', ['drop', 'raise'])
+def test_writer_background_backpressure(backpressure):
+    out = BlockingStringIO()
+    w = JSVWriter(out, 'wt', background=True, queue_size=2, backpressure=backpressure)
+    out.unblocked.clear()
+    for i in range(2):
+        w.write({'i': i})
+    if backpressure == 'drop':
+        for i in range(10):
+            w.write({'i': i})
+    else:
+        with pytest.raises(queue.Full):
+            for i in range(10):
+                w.write({'i': i})
+    out.unblocked.set()
+    w.close()
+    assert out.getvalue().count('\n') >= 2
+    if backpressure == 'drop':
+        assert out.getvalue().count('\n') + w.dropped == 13
+
+
+def test_writer_background_errors():
+    with pytest.raises(ValueError):
+        JSVWriter(StringIO(), 'wt', background=True, backpressure='wait')
+    with pytest.raises(ValueError):
+        JSVWriter(StringIO(), 'wt', background=True, queue_size=0)
+    w = JSVWriter(StringIO(), 'wt', background=True)
+    w.write({'a': object()})
+    with pytest.raises(TypeError):
+        w.flush()
+    w.write({'a': 1})
+    w.close()
+    assert w.files.rec_fp.getvalue() == '#_ {}\n{"a":1}\n'
+
+
+def test_collection_copy_on_write():
+    coll = JSVCollection({'a': '{"x"}', 'b': '{"x"}'}, thread_safe=True)
+    ids = iter(coll)
+    items = coll.items()
+    tids = coll.templates['{"x"}']
+    coll['c'] = '{"x"}'
+    del coll['a']
+    assert list(ids) == ['a', 'b', '_']
+    assert dict(items) == {'a': JSVTemplate('{"x"}'), 'b': JSVTemplate('{"x"}'), '_': JSVTemplate()}
+    assert tids == {'a', 'b'}
+    assert coll.templates['{"x"}'] == {'b', 'c'}
+    del coll['b']
+    assert coll.templates['{"x"}'] == 'c'
+    del coll['c']
+    assert '{"x"}' not in coll.templates
+
+
+@mark.parametrize('buffer_size', [None, 64])
+def test_writer_thread_safe(buffer_size):
+    out = StringIO()
+    with JSVWriter(out, 'wt', thread_safe=True, buffer_size=buffer_size) as w:
+        def produce(n):
+            tid = 't{}'.format(n)
+            for i in range(100):
+                # each redefinition must reach the file before the records that use it
+                if i % 10 == 0:
+                    w[tid] = '{{"n","i","k{}"}}'.format(i)
+                w.write({'n': n, 'i': i, 'k{}'.format(i - i % 10): i}, tid)
+                w.write_row([n, i, 0], tid)
+        threads = [threading.Thread(target=produce, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    with JSVReader(StringIO(out.getvalue())) as r:
+        records = [(tid, obj, r[tid]) for tid, obj in r.items()]
+    assert len(records) == 800
+    for tid, obj, tmpl in records:
+        assert tid == 't{}'.format(obj['n'])
+        assert len(obj) == 3
+        assert str(tmpl) == '{{"n","i","k{}"}}'.format(obj['i'] - obj['i'] % 10)
+
+
+def test_writer_thread_safe_encodes_outside_lock():
+    out = StringIO()
+    written = threading.Event()
+    encode = JSVTemplate.encode
+
+    def slow_encode(self, obj, *args, **kwargs):
+        if obj.get('slow'):
+            # another thread can only write while this one encodes if the lock is not held
+            assert written.wait(5)
+        return encode(self, obj, *args, **kwargs)
+
+    with JSVWriter(out, 'wt', {'a': '{"slow","x"}'}, thread_safe=True, stats=True) as w, \
+            patch.object(JSVTemplate, 'encode', slow_encode):
+        t = threading.Thread(target=w.write, args=({'slow': True, 'x': 1}, 'a'))
+        t.start()
+        w.write({'slow': False, 'x': 2}, 'a')
+        written.set()
+        t.join()
+    assert out.getvalue().splitlines()[-2:] == ['@a {false,2}', '@a {true,1}']
+    assert w.stats.template('a').records == 2
+
+
+def test_writer_write_streaming_errors():
+    def events():
+        yield {'n': 1}
+        raise RuntimeError('source failed')
+
+    out = StringIO()
+    with JSVWriter(out, 'wt', {'s': '{"id","events":[{"n"}]}'}, buffer_size=4) as w:
+        with pytest.raises(RuntimeError):
+            w.write_streaming({'id': 1, 'events': events()}, 's')
+        w.write({'id': 2, 'events': []}, 's')
+    assert out.getvalue() == '#s {"id","events":[{"n"}]}\n#_ {}\n@s {2,[]}\n'
+
+
+def test_writer_write_streaming_thread_safe():
+    out = StringIO()
+    with JSVWriter(out, 'wt', {'s': '{"id","events":[{"n"}]}'}, thread_safe=True) as w:
+        def other():
+            w.write({'id': 0, 'events': []}, 's')
+
+        def events():
+            yield {'n': 1}
+            # another thread can write, and redefine the template, while this record is encoded
+            t = threading.Thread(target=other)
+            t.start()
+            t.join(5)
+            assert not t.is_alive()
+            w['s'] = '{"id"}'
+            yield {'n': 2}
+
+        w.write_streaming({'id': 1, 'events': events()}, 's')
+        w.write({'id': 3}, 's')
+    assert out.getvalue().splitlines()[2:] == ['@s {0,[]}', '#s {"id"}', '#s {"id","events":[{"n"}]}',
+                                               '@s {1,[{1},{2}]}', '#s {"id"}', '@s {3}']
+    with JSVReader(StringIO(out.getvalue())) as r:
+        assert [obj['id'] for obj in r] == [0, 1, 3]
@@ -0,0 +1,65 @@
+from jsv import MemoEncoder, JSVTemplate, JSVWriter
+from jsv.template import encode_string
+from io import StringIO
+import pytest
+
+
+@pytest.mark.parametrize('s, expected', [
+    ('plain', 'plain'),
+    ('', ''),
+    ('a"b\\c', 'a\\"b\\\\c'),
+    ('\n\t\b\f\r\x01', '\\n\\t\\b\\f\\r\\u0001'),
+    ('café', 'caf\\u00e9'),
+    ('\U0001f600', '\\ud83d\\ude00')
+])
+def test_encode_string(s, expected):
+    assert encode_string(s) == expected
+
+
+def test_memo_encoder_global():
+    memo = MemoEncoder(maxsize=2)
+    enc = memo.get('any')
+    assert memo.get('other') is enc
+    assert enc('a "b"') == '"a \\"b\\""'
+    assert enc('a "b"') == '"a \\"b\\""'
+    assert enc(1) == '1'
+    assert enc(True) == 'true'
+    assert enc([1, 'x']) == '[1,"x"]'
+    info = memo.cache_info()['values']
+    assert (info.hits, info.misses, info.maxsize) == (1, 1, 2)
+
+    memo.clear()
+    assert memo.cache_info()['values'].currsize == 0
+
+
+def test_memo_encoder_fields():
+    memo = MemoEncoder(['status'])
+    assert memo.get('memo') is None
+    assert memo.get('memo', 1) == 1
+    assert set(memo.cache_info()) == {'status'}
+
+    with pytest.raises(ValueError):
+        MemoEncoder(maxsize=0)
+    with pytest.raises(TypeError):
+        JSVWriter(StringIO(), memoize='status')
+
+
+@pytest.mark.parametrize('t_str', ['{"status","tags":[],"address":{"city"}}', '{"status"}', '{}', '[]'])
+def test_encode_memo(t_str):
+    obj = {'status': 'ok', 'tags': ['a', 'b', 'a'], 'address': {'city': 'SF', 'zip': '94103'}, 'n': 1.5}
+    t = JSVTemplate(t_str)
+    if t_str == '[]':
+        obj = ['a', 'b', 'a', 2]
+    for memo in (MemoEncoder(), MemoEncoder(['status', 'tags', 'zip'])):
+        assert t.encode(obj, memo=memo) == t.encode(obj)
+        assert t.encode(obj, memo=memo) == t.encode(obj)
+
+
+def test_writer_memoize():
+    fp = StringIO()
+    with JSVWriter(fp, template_dict={'_': '{"status","memo"}'}, memoize=['status']) as w:
+        for i in range(3):
+            w.write({'status': 'ok', 'memo': str(i)})
+    assert fp.getvalue() == '#_ {"status","memo"}\n{"ok","0"}\n{"ok","1"}\n{"ok","2"}\n'
+    info = w._memo.cache_info()['status']
+    assert (info.hits, info.misses) == (2, 1)
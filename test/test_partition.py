@@ -0,0 +1,62 @@
+from jsv import PartitionedJSVWriter, JSVReader
+import pytest
+
+
+def read_partitions(w):
+    out = []
+    for n in range(w.partitions):
+        with JSVReader(w.partition_path(n), w.template_path) as r:
+            out.append(list(r.items()))
+    return out
+
+
+def test_partitioned_writer(tmp_path):
+    base = tmp_path / 'accounts'
+    objs = [{'account_number': i % 7, 'amount': i} for i in range(200)]
+    with PartitionedJSVWriter(base, 4, 'account_number', {'t': '{"account_number","amount"}'}, buffer_size=64,
+                              max_open=2, stats=True) as w:
+        for obj in objs:
+            w.write(obj, 't')
+        w['u'] = '{"other"}'
+        w.write({'other': 1, 'account_number': 3}, 'u')
+    assert w.partition_path(3) == str(base) + '.3.jsvr'
+    assert (tmp_path / 'accounts.jsvt').read_text() == '#t {"account_number","amount"}\n#_ {}\n#u {"other"}\n'
+    assert w.stats['t'].records == 200
+
+    parts = read_partitions(w)
+    assert sum(len(p) for p in parts) == 201
+    for n, records in enumerate(parts):
+        for tid, obj in records:
+            assert w.partition(obj) == n
+    # each key is in a single partition, in the order written
+    for key in range(7):
+        n = w.partition({'account_number': key})
+        assert [obj for tid, obj in parts[n] if tid == 't' and obj['account_number'] == key] == \
+            [obj for obj in objs if obj['account_number'] == key]
+    assert ('u', {'other': 1, 'account_number': 3}) in parts[w.partition({'account_number': 3})]
+
+
+def test_partitioned_writer_modes(tmp_path):
+    base = tmp_path / 'p'
+    with PartitionedJSVWriter(base, 12, lambda obj: obj[0], mode='wt') as w:
+        w.write([1, 2])
+    assert w.partition_path(0).endswith('p.00.jsvr')
+    assert all(len(p) == (n == w.partition([1])) for n, p in enumerate(read_partitions(w)))
+    with PartitionedJSVWriter(base, 12, lambda obj: obj[0], mode='at') as w:
+        w.write([1, 3])
+    assert read_partitions(w)[w.partition([1])] == [('_', [1, 2]), ('_', [1, 3])]
+
+
+def test_partitioned_writer_errors(tmp_path):
+    with pytest.raises(ValueError):
+        PartitionedJSVWriter(tmp_path / 'p', 0, 'k')
+    with pytest.raises(ValueError):
+        PartitionedJSVWriter(tmp_path / 'p', 2, 'k', max_open=0)
+    with pytest.raises(ValueError):
+        PartitionedJSVWriter(tmp_path / 'p', 2, 'k', mode='rt')
+    w = PartitionedJSVWriter(tmp_path / 'p', 2, 'k')
+    with pytest.raises(RuntimeError):
+        w.write({'k': 1})
+    with w:
+        with pytest.raises(KeyError):
+            w.write({'j': 1})
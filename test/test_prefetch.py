@@ -0,0 +1,52 @@
+from jsv import JSVReader
+from jsv.prefetch import Prefetcher
+from io import StringIO
+import pytest
+
+
+def make_input(n):
+    return '#_ {"key_1"}\n' + ''.join('{{{}}}\n'.format(i) for i in range(n))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 1 << 20])
+def test_prefetch_lines(chunk_size):
+    text = 'a\nbb\n\nccc\ndddd'
+    p = Prefetcher(StringIO(text), 2, chunk_size)
+    assert list(p.lines()) == ['a\n', 'bb\n', '\n', 'ccc\n', 'dddd']
+    assert not p._thread.is_alive()
+
+
+@pytest.mark.parametrize('depth, chunk_size', [(1, 5), (4, 64)])
+def test_reader_prefetch(depth, chunk_size):
+    with JSVReader(StringIO(make_input(500)), prefetch=depth, chunk_size=chunk_size, stats=True) as r:
+        assert list(r) == [{'key_1': i} for i in range(500)]
+    assert r.stats['_'].records == 500
+
+
+def test_reader_prefetch_early_close():
+    with JSVReader(StringIO(make_input(1000)), prefetch=1, chunk_size=8) as r:
+        it = r.items()
+        assert next(it) == ('_', {'key_1': 0})
+        prefetcher = r._prefetcher
+        it.close()
+        assert r._prefetcher is None
+        assert not prefetcher._thread.is_alive()
+
+    with JSVReader(StringIO(make_input(1000)), prefetch=1, chunk_size=8) as r:
+        for obj in r:
+            prefetcher = r._prefetcher
+            break
+    assert not prefetcher._thread.is_alive()
+
+
+def test_prefetch_read_error():
+    class BadFile(StringIO):
+        def read(self, size=-1):
+            raise OSError('read failed')
+
+    with JSVReader(BadFile(), prefetch=2) as r:
+        with pytest.raises(OSError):
+            list(r)
+
+    with pytest.raises(ValueError):
+        JSVReader(StringIO(), prefetch=0)
@@ -0,0 +1,101 @@
+from jsv import JSVReader, JSVWriter, split, merge
+import pytest
+
+
+def read_all(path, template_file=None):
+    with JSVReader(str(path), template_file and str(template_file)) as r:
+        return list(r.items())
+
+
+@pytest.fixture
+def jsv_file(tmp_path):
+    path = tmp_path / 'in.jsv'
+    with JSVWriter(str(path), 'wt', {'a': '{"x"}', 'unused': '{"u"}'}) as w:
+        for i in range(30):
+            w.write({'x': i}, 'a')
+            w.write({'y': i})
+            if i == 12:
+                w['a'] = '{"x","z"}'
+        w.write_line('@a {"last","z"}')
+    return path
+
+
+@pytest.mark.parametrize('max_bytes', [1, 40, 100, 10000])
+def test_split(tmp_path, jsv_file, max_bytes):
+    shards = split(jsv_file, max_bytes, str(tmp_path / 'out.{:03d}.jsv'))
+    assert [p for p, n in shards] == [str(tmp_path / 'out.{:03d}.jsv'.format(i)) for i in range(len(shards))]
+    records = []
+    for p, n in shards:
+        lines = open(p).read().splitlines()
+        assert not any(line.startswith('#unused') for line in lines)
+        assert n == sum(not line.startswith('#') for line in lines)
+        if n > 1:
+            assert len(open(p, 'rb').read()) <= max_bytes
+        records += read_all(p)
+    assert records == read_all(jsv_file)
+    if max_bytes == 10000:
+        assert open(shards[0][0]).read().splitlines()[:3] == ['#a {"x"}', '@a {0}', '#_ {}']
+
+
+def test_split_template_file(tmp_path):
+    rec, tmpl = tmp_path / 'in.jsvr', tmp_path / 'in.jsvt'
+    with JSVWriter(str(rec), 'wt', {'a': '{"x"}'}, str(tmpl)) as w:
+        for i in range(10):
+            w.write({'x': i}, 'a')
+    shards = split(rec, 30, template_file=tmpl)
+    assert [p for p, n in shards][:2] == [str(tmp_path / 'in.00000.jsvr'), str(tmp_path / 'in.00001.jsvr')]
+    assert sum(n for p, n in shards) == 10
+    assert [obj for p, n in shards for obj in read_all(p)] == read_all(rec, tmpl)
+
+
+def test_split_errors(tmp_path, jsv_file):
+    with pytest.raises(ValueError):
+        split(jsv_file, 0)
+    with pytest.raises(ValueError):
+        split(jsv_file, 100, str(tmp_path / 'out.jsv'))
+    assert split(jsv_file, 100, str(tmp_path / 'out.{}.jsv'))[0][0] == str(tmp_path / 'out.0.jsv')
+
+
+def write_jsv(path, template_dict, objs, template_file=None):
+    with JSVWriter(str(path), 'wt', template_dict, template_file and str(template_file)) as w:
+        for tid, obj in objs:
+            if obj is None:
+                w[tid[0]] = tid[1]
+            else:
+                w.write(obj, tid)
+
+
+def test_merge(tmp_path):
+    a, b, c, out = tmp_path / 'a.jsv', tmp_path / 'b.jsv', tmp_path / 'c.jsvr', tmp_path / 'out.jsv'
+    write_jsv(a, {'t': '{"x"}', 'u': '{"y"}'}, [('t', {'x': 1}), ('u', {'y': 2}), ('_', {'z': 3})])
+    # `t` is a different template, and `v` is the same as `u` in a.jsv
+    write_jsv(b, {'_': '{"z"}', 't': '{"w"}', 'v': '{"y"}'},
+              [('t', {'w': 4}), ('v', {'y': 5}), ('_', {'z': 6}), (('t', '{"x"}'), None), ('t', {'x': 7})])
+    write_jsv(c, {'t': '{"w"}'}, [('t', {'w': 8}), ('_', {'a': 9})], tmp_path / 'c.jsvt')
+    coll = merge([str(a), b, (str(c), str(tmp_path / 'c.jsvt'))], str(out), stats=True)
+
+    expected = read_all(a) + read_all(b) + read_all(c, tmp_path / 'c.jsvt')
+    assert [obj for tid, obj in read_all(out)] == [obj for tid, obj in expected]
+    assert {tid: str(t) for tid, t in coll.items()} == {'_': '{}', 't': '{"x"}', 'u': '{"y"}', 't_1': '{"w"}',
+                                                        '_1': '{"z"}'}
+    lines = out.read_text().splitlines()
+    assert [line for line in lines if line.startswith('#')] == ['#t {"x"}', '#u {"y"}', '#_1 {"z"}', '#t_1 {"w"}']
+    assert lines[-2:] == ['@t_1 {8}', '{"a":9}']
+    assert coll.stats['t'].records == 2
+    assert coll.stats['_'].records == 2
+    assert coll.stats['t_1'].records == 2
+
+
+def test_merge_template_file_and_errors(tmp_path):
+    a, b = tmp_path / 'a.jsv', tmp_path / 'b.jsv'
+    write_jsv(a, {'_': '{"x"}'}, [('_', {'x': 1})])
+    write_jsv(b, {}, [('_', {'x': 2})])
+    rec, tmpl = tmp_path / 'out.jsvr', tmp_path / 'out.jsvt'
+    merge([a, b], rec, tmpl)
+    assert tmpl.read_text() == '#_ {"x"}\n#_1 {}\n'
+    assert rec.read_text() == '{1}\n@_1 {"x":2}\n'
+    assert read_all(rec, tmpl) == [('_', {'x': 1}), ('_1', {'x': 2})]
+
+    b.write_text('@t {1}\n')
+    with pytest.raises(ValueError):
+        merge([a, b], tmp_path / 'out.jsv')
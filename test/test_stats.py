@@ -0,0 +1,79 @@
+from jsv import JSVCollection, JSVReader, JSVWriter, JSVStats
+from io import StringIO
+
+
+def test_collection_stats_disabled():
+    coll = JSVCollection({'a': '{"key_1"}'})
+    assert coll.stats is None
+    assert coll.get_record_line({'key_1': 1, 'key_2': 2}, 'a') == '@a {1,"key_2":2}'
+
+
+def test_writer_stats():
+    fp = StringIO()
+    w = JSVWriter(fp, template_dict={'a': '{"key_1","key_2":{"key_3"}}'}, stats=True)
+    assert isinstance(w.stats, JSVStats)
+    w.write({'key_1': 1, 'key_2': {'key_3': 3, 'extra_2': 0}, 'extra_1': 'x'}, 'a')
+    w.write({'key_1': 2, 'key_2': {'key_3': 4}}, 'a')
+    w.write({'free': 1})
+    w['a'] = '{"key_1"}'
+    w['b'] = '{"key_1"}'
+
+    a = w.stats['a']
+    assert a.records == 2
+    assert a.overflow_keys == 2
+    assert a.redefinitions == 1
+    assert a.chars == len('@a {1,{3,"extra_2":0},"extra_1":"x"}') + len('@a {2,{4}}')
+    assert a.encode_time > 0
+    assert a.decode_time == 0
+    assert w.stats['_'].records == 1
+    assert w.stats['_'].chars == len('{"free":1}')
+    assert 'b' not in w.stats
+    assert w.stats.totals.records == 3
+    assert w.stats.io_time > 0
+
+    d = w.stats.as_dict()
+    assert d['totals']['records'] == 3
+    assert d['templates']['a']['overflow_keys'] == 2
+
+    w.stats.reset()
+    assert len(w.stats) == 0
+    assert w.stats.io_time == 0
+
+
+def test_reader_stats():
+    fp = StringIO('\n'.join([
+        '#a {"key_1"}',
+        '@a {1}',
+        '@a {2,"key_2":3}',
+        '#a {"key_2"}',
+        '@a {4}',
+        '{"key_1":5}'
+    ]))
+    with JSVReader(fp, stats=True) as r:
+        recs = list(r.items())
+    assert recs == [('a', {'key_1': 1}), ('a', {'key_1': 2, 'key_2': 3}), ('a', {'key_2': 4}), ('_', {'key_1': 5})]
+    a = r.stats['a']
+    assert a.records == 3
+    assert a.redefinitions == 1
+    assert a.chars == len('@a {1}') + len('@a {2,"key_2":3}') + len('@a {4}')
+    assert a.decode_time > 0
+    assert r.stats['_'].records == 1
+    assert r.stats.io_time > 0
+
+
+def test_reader_stats_redefinitions():
+    fp = StringIO()
+    with JSVWriter(fp, 'wt', {'a': '{"key_1"}'}) as w:
+        w.write({'key_1': 1}, 'a')
+        w['a'] = '{"key_1"}'
+        w.write({'key_1': 2})
+    with JSVReader(StringIO(fp.getvalue()), stats=True) as r:
+        list(r)
+    assert fp.getvalue().splitlines()[:2] == ['#a {"key_1"}', '#_ {}']
+    assert all(ts.redefinitions == 0 for tid, ts in r.stats.items())
+
+    coll = JSVCollection(stats=True)
+    coll['_'] = '{"key_1"}'
+    assert '_' not in coll.stats
+    coll['_'] = '{"key_2"}'
+    assert coll.stats['_'].redefinitions == 1
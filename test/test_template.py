@@ -1,6 +1,23 @@
-from jsv import JSVTemplate, JSVTemplateDecodeError, JSVRecordDecodeError
+from jsv import Interner, JSVTemplate, JSVRecord, JSVTemplateDecodeError, JSVRecordDecodeError
+from jsv.template import cached_template
+from collections import namedtuple
+from io import StringIO
+from typing import List, Optional
+import gc
+import threading
+import json
+import random
+import sys
+import weakref
 import pytest
 
+try:
+    import dataclasses
+except ImportError:
+    dataclasses = None
+
+needs_dataclasses = pytest.mark.skipif(dataclasses is None, reason='requires dataclasses')
+
 
 wellformed_db = [
     {
@@ -317,6 +334,82 @@ def test_decode_record(t_str, rec_str, expected):
     assert obj == expected
 
 
+@pytest.mark.parametrize('t_str, rec_str, expected', create_decode_record_list(wellformed_db))
+def test_record_to_json(t_str, rec_str, expected):
+    t = JSVTemplate(t_str)
+    assert t.to_json(rec_str) == json.dumps(expected, separators=(',', ':'))
+
+
+@pytest.mark.parametrize('t_str, rec_str', [
+    ('{"key_1"}', '{1'),
+    ('{"key_1"}', '{1,"key_2"}'),
+    ('{"key_1","key_2"}', '{1}'),
+    ('[{"key_1"}]', '[{1},]'),
+    ('{}', '{"key_1":1} 2'),
+    ('{"key_1"}', '{tnrue}'),
+    ('{"key_1"}', '{[1n,2]}'),
+    ('{}', '[1n,2]'),
+    ('{}', '{"a":tnrue}'),
+    ('{"key_1"}', '{{1}}'),
+    ('{"key_1"}', '{1,"key_2":{1}}'),
+    ('{"key_1"}', '{"\\x"}'),
+    ('{"key_1"}', '{"a\tb"}'),
+    ('{"key_1"}', '{1,"a\tb":2}'),
+    ('{"key_1"}', '{[1,}'),
+    ('{"key_1"}', '{-}')
+])
+def test_record_to_json_errors(t_str, rec_str):
+    with pytest.raises(JSVRecordDecodeError):
+        JSVTemplate(t_str).to_json(rec_str)
+
+
+def test_record_to_json_mutations():
+    t = JSVTemplate('{"a","b":[{"c"}],"d":{"e"}}')
+    obj = {'a': 'x\\y', 'b': [{'c': [1, {'f': None}]}, {'c': True, 'g': -2.5e3}], 'd': {'e': {}}, 'h': 'z'}
+    rec_str = t.encode(obj)
+    rng = random.Random(0)
+    alphabet = '{}[],:"\\ ntrue0123456789.-e'
+    for _ in range(5000):
+        chars = list(rec_str)
+        for _ in range(rng.randint(1, 3)):
+            pos = rng.randrange(len(chars) + 1)
+            op = rng.randrange(3)
+            if op == 0:
+                chars.insert(pos, rng.choice(alphabet))
+            elif pos < len(chars):
+                if op == 1:
+                    del chars[pos]
+                else:
+                    chars[pos] = rng.choice(alphabet)
+        s = ''.join(chars)
+        try:
+            js = t.to_json(s)
+        except JSVRecordDecodeError:
+            with pytest.raises(JSVRecordDecodeError):
+                t.decode(s)
+            continue
+        assert json.loads(js) == t.decode(s)
+
+
+@pytest.mark.parametrize('t_str, record, expected', create_encode_record_list(wellformed_db))
+def test_record_from_json_text(t_str, record, expected):
+    t = JSVTemplate(t_str)
+    assert t.from_json_text(json.dumps(record, separators=(',', ':'))) == expected
+    assert t.decode(t.from_json_text(json.dumps(record, indent=2))) == t.decode(expected)
+
+
+@pytest.mark.parametrize('t_str, json_str', [
+    ('{"key_1"}', '{"key_1":1'),
+    ('{"key_1"}', '{"key_1" 1}'),
+    ('{"key_1"}', '{"key_1":1} 2'),
+    ('[{"key_1"}]', '[{"key_1":1},]'),
+    ('{}', '{"key_1":[1}')
+])
+def test_record_from_json_text_errors(t_str, json_str):
+    with pytest.raises(ValueError):
+        JSVTemplate(t_str).from_json_text(json_str)
+
+
 def create_encode_template_list(db):
     arr = []
     for c in db:
@@ -420,6 +513,15 @@ def test_encode_incompatible_record(tmpl, obj, err_type, err_msg):
         assert str(ex) == err_msg
 
 
+@pytest.mark.parametrize('tmpl, obj, err_type, err_msg', create_incompatible_record_array(wellformed_db))
+def test_record_from_json_text_incompatible(tmpl, obj, err_type, err_msg):
+    try:
+        tmpl.from_json_text(json.dumps(obj))
+        assert False
+    except err_type as ex:
+        assert str(ex) == err_msg
+
+
 def create_decode_incompatible_record_list(db):
     arr = []
     for c in db:
@@ -448,3 +550,395 @@ def test_template_init_exceptions(t_str, ex_class, ex_msg):
     except ex_class as ex:
         assert ex_msg == str(ex)
 
+
+
+row_db = [
+    ('{"key_1","key_2":{"key_3","key_4"},"key_5":[{"key_6"}]}', (1, (2, 3), [(4,), (5,)]), '{1,{2,3},[{4},{5}]}'),
+    ('{"key_1","key_2":{"key_3"}}', (1, None), '{1,}'),
+    ('{"key_1","key_2"}', ([1, 2], {'a': None}), '{[1,2],{"a":null}}'),
+    ('[{"key_1"}]', [(1,), ('two',)], '[{1},{"two"}]'),
+    ('[{"key_1"},[]]', [(1,), [2, 3], [4]], '[{1},[2,3],[4]]'),
+    ('{}', {'key_1': 1}, '{"key_1":1}')
+]
+
+
+@pytest.mark.parametrize('t_str, row, rec_str', row_db)
+def test_encode_decode_row(t_str, row, rec_str):
+    t = JSVTemplate(t_str)
+    assert t.encode_row(row) == rec_str
+    assert t.decode_row(rec_str) == row
+
+
+@pytest.mark.parametrize('t_str, rec_str, row', [
+    ('{"key_1","key_2":{"key_3"}}', '{ 1 , , "key_4" : [1, {"a": 2}]}', (1, None)),
+    ('{"key_1","key_2"}', '{,"value"}', (None, 'value')),
+    ('{"key_1":{"key_2"}}', '{{"v","key_3":3},"key_4":4}', (('v',),))
+])
+def test_decode_row_missing_and_overflow(t_str, rec_str, row):
+    assert JSVTemplate(t_str).decode_row(rec_str) == row
+
+
+@pytest.mark.parametrize('t_str, row, ex_msg', [
+    ('{"key_1","key_2"}', (1,), 'Expecting a row of 2 values, got 1'),
+    ('{"key_1"}', {'key_1': 1}, 'Expecting a list or tuple'),
+    ('{"key_1":[{"key_2"}]}', (1,), 'Expecting a list or tuple')
+])
+def test_encode_row_errors(t_str, row, ex_msg):
+    with pytest.raises(ValueError) as ex:
+        JSVTemplate(t_str).encode_row(row)
+    assert str(ex.value) == ex_msg
+
+
+@pytest.mark.parametrize('t_str, rec_str', [
+    ('{"key_1","key_2"}', '{1'),
+    ('{"key_1","key_2"}', '{1,2} 3'),
+    ('{"key_1"}', '{1,2}'),
+    ('[{"key_1"}]', '[{1},]')
+])
+def test_decode_row_errors(t_str, rec_str):
+    with pytest.raises(JSVRecordDecodeError):
+        JSVTemplate(t_str).decode_row(rec_str)
+
+
+def test_record_class():
+    t = JSVTemplate('{"key_1","key_2":{"key_3"},"key_4":[{"key_5"}]}')
+    Record = t.record_class()
+    assert t.record_class() is Record
+    assert issubclass(Record, JSVRecord)
+    assert Record.__slots__ == ('key_1', 'key_2', 'key_4', 'extra')
+    Nested = Record._types['key_2']
+    assert Nested.__slots__ == ('key_3', 'extra')
+    assert not hasattr(Record(), '__dict__')
+
+    r = t.decode_record('{1,{3,"x":1},[{5},{6}],"key_6":[1]}')
+    assert r == Record(1, Nested(3, extra={'x': 1}), [Record._types['key_4'][0](5), Record._types['key_4'][0](6)],
+                       extra={'key_6': [1]})
+    assert repr(r.key_2) == "Record_key_2(key_3=3, extra={'x': 1})"
+    assert r._asdict() == {'key_1': 1, 'key_2': {'key_3': 3, 'x': 1}, 'key_4': [{'key_5': 5}, {'key_5': 6}],
+                           'key_6': [1]}
+    assert t.decode_record('{,,}') == Record()
+
+
+def test_decode_record_non_dict_templates():
+    t = JSVTemplate('[{"key_1"},[]]')
+    recs = t.decode_record('[{1},[2,3]]')
+    assert [type(r).__name__ for r in recs] == ['Record_0', 'list']
+    assert recs[0].key_1 == 1
+    assert JSVTemplate().decode_record('{"key_1":1}') == {'key_1': 1}
+
+
+@pytest.mark.parametrize('t_str', ['[{"key_1"}]', '{}', '{"key-1"}', '{"extra"}', '{"_key"}', '{"class"}',
+                                   '{"key_1":{"if"}}'])
+def test_record_class_errors(t_str):
+    with pytest.raises(ValueError):
+        JSVTemplate(t_str).record_class()
+
+
+@pytest.mark.parametrize('t_str, rec_str, expected', [
+    ('{"first-name","class"}', '{"a",1,"x":2}', {'first-name': 'a', 'class': 1, 'x': 2}),
+    ('{"key_1":{"if"},"key_2"}', '{{1},}', {'key_1': {'if': 1}}),
+    ('[{"extra"},{"key_1"}]', '[{1},{2}]', [{'extra': 1}, {'key_1': 2}]),
+])
+def test_decode_record_invalid_attributes(t_str, rec_str, expected):
+    t = JSVTemplate(t_str)
+    assert t.decode_record(rec_str) == expected
+    assert t.decode_record(rec_str, intern=Interner()) == expected
+    if isinstance(expected, dict):
+        with pytest.raises(ValueError):
+            t.record_class()
+
+
+def make_into_classes():
+    field = dataclasses.field
+    Address = dataclasses.make_dataclass('Address', [('street', str), ('city', str, field(default='SF'))])
+    Event = dataclasses.make_dataclass('Event', [('name', str)])
+    Account = dataclasses.make_dataclass('Account', [
+        ('account_number', int),
+        ('amount', float, field(default=0.0)),
+        ('address', Optional[Address], field(default=None)),
+        ('events', List[Event], field(default_factory=list)),
+        ('memo', str, field(default=''))
+    ])
+    return Account, Address, Event
+
+
+@needs_dataclasses
+def test_decode_into_dataclass():
+    Account, Address, Event = make_into_classes()
+    t = JSVTemplate('{"account_number","amount","address":{"street","city"},"events":[{"name"}],"other"}')
+    assert t.decode('{111,2.5,{"main",},[{"a"},{"b"}],5,"memo":"m","extra":1}', into=Account) == \
+        Account(111, 2.5, Address('main'), [Event('a'), Event('b')], 'm')
+    assert t.decode('{111,,{,"LA"},,}', into=Account) == Account(111, address=Address(None, 'LA'))
+    assert t.decode('{,,,,}', into=Account) == Account(None)
+    assert t._into_nodes[Account] is not None
+    assert t.decode('{1,,,,}', into=Account) == Account(1)
+
+
+def test_decode_into_cache_is_bounded():
+    t = cached_template('{"a","b"}')
+    refs = []
+    for n in range(20):
+        cls = namedtuple('Point{}'.format(n), ['a', 'b'])
+        assert t.decode('{1,2}', into=cls) == cls(1, 2)
+        refs.append(weakref.ref(cls))
+        del cls
+    gc.collect()
+    assert len(t._into_nodes) <= 8
+    assert refs[0]() is None
+
+
+def test_shared_template_threads():
+    classes = [namedtuple('Point{}'.format(n), ['a', 'b']) for n in range(20)]
+    interval = sys.getswitchinterval()
+    # switch threads often, so that they interleave inside the caches
+    sys.setswitchinterval(1e-6)
+    try:
+        for _ in range(5):
+            t = JSVTemplate('{"a","b":{"c","d":{"e"}},"f":[{"g"}]}')
+            record_classes = []
+            errors = []
+            barrier = threading.Barrier(8)
+
+            def run(k):
+                barrier.wait()
+                try:
+                    record_classes.append(t.record_class())
+                    for n in range(50):
+                        cls = classes[(3 * n + k) % len(classes)]
+                        assert t.decode('{1,{2,{3}},[]}', into=cls) == cls(1, {'c': 2, 'd': {'e': 3}})
+                        assert type(t.decode_record('{1,{2,{3}},[]}')) is record_classes[-1]
+                except Exception as ex:
+                    errors.append(ex)
+
+            threads = [threading.Thread(target=run, args=(k,)) for k in range(8)]
+            for th in threads:
+                th.start()
+            for th in threads:
+                th.join()
+            assert errors == []
+            assert len(set(record_classes)) == 1
+    finally:
+        sys.setswitchinterval(interval)
+
+
+def test_decode_into_namedtuple():
+    Point = namedtuple('Point', ['key_1', 'key_2'])
+    t = JSVTemplate('[{"key_1","key_3":{"key_4"}}]')
+    assert t.decode('[{1,{2}},{3,,"key_2":4}]', into=Point) == [Point(1, None), Point(3, 4)]
+    assert JSVTemplate('{"key_1","key_2":{"key_3"}}').decode('{1,{3}}', into=Point) == Point(1, {'key_3': 3})
+
+
+def test_decode_into_errors():
+    with pytest.raises(TypeError):
+        JSVTemplate('{"key_1"}').decode('{1}', into=dict)
+    with pytest.raises(ValueError):
+        JSVTemplate().decode('{"key_1":1}', into=namedtuple('Point', ['key_1']))
+
+
+@pytest.mark.parametrize('t_str, obj, ascii_str, unicode_str', [
+    ('{"名前"}', {'名前': 'Zürich', 'über': '\U0001f600'},
+     '{"Z\\u00fcrich","\\u00fcber":"\\ud83d\\ude00"}', '{"Zürich","über":"\U0001f600"}'),
+    ('[{"key_1"}]', [{'key_1': 'a\n"é"'}], '[{"a\\n\\"\\u00e9\\""}]', '[{"a\\n\\"é\\""}]'),
+    ('{}', {'ü': 'ß'}, '{"\\u00fc":"\\u00df"}', '{"ü":"ß"}')
+])
+def test_encode_ensure_ascii(t_str, obj, ascii_str, unicode_str):
+    t = JSVTemplate(t_str)
+    assert t.encode(obj) == ascii_str
+    assert t.encode(obj, ensure_ascii=False) == unicode_str
+    assert t.decode(ascii_str) == t.decode(unicode_str) == obj
+
+
+def test_template_to_string_ensure_ascii():
+    t = JSVTemplate('{"名前","\\ud83d\\ude00":{"a\\"b"}}')
+    assert list(t._key_tree) == ['名前', '\U0001f600']
+    assert str(t) == t.to_string() == '{"\\u540d\\u524d","\\ud83d\\ude00":{"a\\"b"}}'
+    assert t.to_string(ensure_ascii=False) == '{"名前","\U0001f600":{"a\\"b"}}'
+    assert JSVTemplate(t.to_string(ensure_ascii=False)) == t
+    assert t.encode_row(('é', ('ü',)), ensure_ascii=False) == '{"é",{"ü"}}'
+
+
+def test_overflow_keys_escaped():
+    t = JSVTemplate('{"key_1"}')
+    rec_str = t.encode({'key_1': 1, 'a"b': 2, 'c\\d': 3})
+    assert rec_str == '{1,"a\\"b":2,"c\\\\d":3}'
+    assert t.decode(rec_str) == {'key_1': 1, 'a"b': 2, 'c\\d': 3}
+
+
+def test_cached_template():
+    t = cached_template('{"key_1",\n "key_2":[{"key_3"}]}')
+    assert cached_template('{"key_1",\n "key_2":[{"key_3"}]}') is t
+    assert t == JSVTemplate('{"key_1","key_2":[{"key_3"}]}')
+    assert str(t) is str(t)
+    assert hash(t) == hash(JSVTemplate(str(t)))
+
+
+@pytest.mark.parametrize('t_str, expected', [
+    (' { "a" , "b" : { "c" } } ', '{"a","b":{"c"}}'),
+    ('{"a\\"\\n":[{"b"},[],{"b"}]}', '{"a\\"\\n":[{"b"},,{"b"}]}'),
+    ('[{"a"},{"a"},{"a"}]', '[{"a"}]'),
+    ('{"a":{},"b":[[],[]]}', '{"a","b"}'),
+    ('{"a"} trailing', '{"a"}')
+])
+def test_parse_template_whitespace_and_nesting(t_str, expected):
+    assert str(JSVTemplate(t_str)) == expected
+
+
+def test_decode_deeply_nested():
+    depth = 5000
+    t = JSVTemplate('{"a":' * depth + '{"b","c":[{"d"}]}' + '}' * depth)
+    rec_str = '{' * (depth + 1) + '1,[{2},{3}]' + '}' * (depth + 1)
+    obj = t.decode(rec_str)
+    for _ in range(depth):
+        obj = obj['a']
+    assert obj == {'b': 1, 'c': [{'d': 2}, {'d': 3}]}
+    row = t.decode_row(rec_str)
+    for _ in range(depth):
+        row = row[0]
+    assert row == (1, [(2,), (3,)])
+
+    t = JSVTemplate('[' * depth + '{"a"}' + ']' * depth)
+    arr = t.decode('[' * depth + '{1},{2}' + ']' * depth)
+    for _ in range(depth - 1):
+        arr = arr[0]
+    assert arr == [{'a': 1}, {'a': 2}]
+    with pytest.raises(JSVRecordDecodeError):
+        t.decode('[' * depth + '{1}')
+
+
+def test_template_string_deeply_nested():
+    depth = 5000
+    t_str = '{"a":' * depth + '{"b","c":[,{"d"},[{"f"}]],"e"}' + '}' * depth
+    t = JSVTemplate(t_str)
+    assert t.to_string() == t_str
+    assert t.to_string(False) == t_str
+    assert t == JSVTemplate(t_str) and hash(t) == hash(JSVTemplate(t_str))
+    t_str = '[' * depth + '{"a"}' + ']' * depth
+    assert JSVTemplate(t_str).to_string() == t_str
+
+
+def test_decode_error_truncated_and_deep():
+    t = JSVTemplate('{"a","b":{"c"}}')
+    with pytest.raises(JSVRecordDecodeError, match='End of string reached unexpectedly'):
+        t.decode('{1,{')
+    depth = 5000
+    t = JSVTemplate('{"a":' * depth + '{"b"}' + '}' * depth)
+    with pytest.raises(JSVRecordDecodeError, match='End of string reached unexpectedly'):
+        t.decode('{' * (depth + 1) + '1' + '}' * depth)
+
+
+def test_to_json_deeply_nested():
+    depth = 5000
+    t = JSVTemplate('{"a":' * depth + '{"b","c":[{"d"}]}' + '}' * depth)
+    rec_str = '{' * (depth + 1) + '1,[{2},{3,"e":4}]' + '}' * (depth + 1)
+    assert t.to_json(rec_str) == '{"a":' * depth + '{"b":1,"c":[{"d":2},{"d":3,"e":4}]}' + '}' * depth
+    with pytest.raises(JSVRecordDecodeError):
+        t.to_json('{' * (depth + 1) + '1,[{2}')
+
+
+def test_decode_trailing_data():
+    t = JSVTemplate('{"key_1","key_2"}')
+    assert t.decode('{1,2} \r\n') == {'key_1': 1, 'key_2': 2}
+    with pytest.raises(JSVRecordDecodeError, match='Unexpected data after record: column 5'):
+        t.decode('{1,2},3')
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 5, None])
+def test_iter_array(chunk_size):
+    t = JSVTemplate('{"id","meta":{"a","b"},"events":[{"type","time"},{"x"}],"tail"}')
+    obj = {'id': 7, 'meta': {'a': 'x}y\\"[', 'b': [1, {'q': ']'}]}, 'tail': 'end',
+           'events': [{'type': 'c,l}i"ck', 'time': 2.5e-10}] + [{'x': i, 'z': 'w'} for i in range(20)]}
+    rec_str = t.encode(obj)
+    assert list(t.iter_array(StringIO(rec_str), 'events', chunk_size)) == obj['events']
+    assert list(t.iter_array(StringIO(rec_str + '\n'), ['meta', 'b'], chunk_size)) == obj['meta']['b']
+    assert list(t.iter_array(StringIO('{1,,[]}'), 'events', chunk_size)) == []
+    assert list(t.iter_array(StringIO('{1,,,"end"}'), 'events', chunk_size)) == []
+
+    t = JSVTemplate('[{"a":[{"c"}]}]')
+    assert list(t.iter_array(StringIO('[{[{1}]},{[{2},{3}]}]'), [1, 'a'], chunk_size)) == [{'c': 2}, {'c': 3}]
+    assert list(t.iter_array(StringIO('[{[{1}]}]'), [1, 'a'], chunk_size)) == []
+
+
+@pytest.mark.parametrize('t_str, path', [
+    ('{"key_1","key_2"}', 'key_3'),
+    ('{"key_1","key_2":{"key_3"}}', 'key_2'),
+    ('{"key_1","key_2":[{"key_3"}]}', ['key_2', 'key_3']),
+    ('[{"key_1"}]', 'key_1'),
+    ('{}', 'key_1')
+])
+def test_iter_array_path_errors(t_str, path):
+    with pytest.raises(ValueError):
+        JSVTemplate(t_str).iter_array(StringIO(''), path)
+
+
+def test_iter_array_errors():
+    t = JSVTemplate('{"key_1","key_2":[{"key_3"}]}')
+    with pytest.raises(JSVRecordDecodeError):
+        list(t.iter_array(StringIO('{1,[{2},{3'), 'key_2'))
+    with pytest.raises(JSVRecordDecodeError):
+        list(t.iter_array(StringIO('{1,"x"}'), 'key_2'))
+
+
+def test_iter_encode():
+    t = JSVTemplate('{"id","events":[{"type","time"}],"tags"}')
+    obj = {'id': 1, 'events': [{'type': 'a', 'time': 1}, {'type': 'é', 'time': 2, 'x': 3}], 'tags': ['x', 'y'],
+           'extra': {'k': [1]}}
+    streamed = dict(obj, events=iter(obj['events']), tags=(s for s in obj['tags']), extra={'k': iter([1])})
+    assert ''.join(t.iter_encode(streamed)) == t.encode(obj)
+    overflow = []
+    streamed = dict(obj, events=iter(obj['events']))
+    assert ''.join(t.iter_encode(streamed, overflow, ensure_ascii=False)) == t.encode(obj, ensure_ascii=False)
+    assert overflow == ['x', 'extra']
+    assert ''.join(JSVTemplate('{}').iter_encode(iter([{'a': 1}]))) == '[{"a":1}]'
+    with pytest.raises(ValueError):
+        ''.join(t.iter_encode({'id': 1, 'events': 'abc'}))
+
+
+def test_decode_bytes():
+    t = JSVTemplate('{"key_1","key_2":[{"key_3"}],"key_4"}')
+    obj = {'key_1': 'é "x"', 'key_2': [{'key_3': -1.5e3}, {'key_3': [1, {'a': None}]}], 'key_4': 10 ** 20, 'x': True}
+    rec_bytes = t.encode(obj, ensure_ascii=False).encode('utf-8')
+    for buf in (rec_bytes, bytearray(rec_bytes), memoryview(rec_bytes)):
+        assert t.decode_bytes(buf) == obj
+    buf = b'@t ' + rec_bytes + b'\n'
+    assert t.decode_bytes(buf, 3, len(buf) - 1) == obj
+    assert t.decode_bytes(b' {1 , , 2 } ') == {'key_1': 1, 'key_4': 2}
+    assert JSVTemplate('{}').decode_bytes(b'xx{"a":[1]}', 2) == {'a': [1]}
+    for rec in (b'{1,2,3,4}', b'{1,[{2}', b'{"\\x"}', b'{1}x', b'{1,[{01}]}'):
+        with pytest.raises(JSVRecordDecodeError):
+            t.decode_bytes(rec)
+
+
+def test_decode_bytes_keys():
+    t = JSVTemplate('{"key_1","key_2":[{"key_3"}],"key_4"}')
+    rec = t.encode({'key_1': 'a', 'key_2': [{'key_3': 1}], 'key_4': {'b': [2]}, 'x': 3, 'y': [4]}).encode('utf-8')
+    assert t.decode_bytes(rec, keys=['key_1']) == {'key_1': 'a'}
+    assert t.decode_bytes(rec, keys=['key_2', 'y', 'z']) == {'key_2': [{'key_3': 1}], 'y': [4]}
+    assert t.decode_bytes(rec, keys=[]) == {}
+    assert t.decode_bytes(b'{,,5}', keys=['key_1', 'key_4']) == {'key_4': 5}
+    assert JSVTemplate('{}').decode_bytes(b'{"a":1,"b":[2]}', keys=['b']) == {'b': [2]}
+    assert JSVTemplate('[{"a"}]').decode_bytes(b'[{1}]', keys=['b']) == [{'a': 1}]
+    # skipped values are scanned to their end, so truncated records are still rejected
+    for rec in (b'{1,[{2}],{3}', b'{1,,2,"x":[}', b'{1,[{2}]'):
+        with pytest.raises(JSVRecordDecodeError):
+            t.decode_bytes(rec, keys=['key_1'])
+
+
+def test_decode_bytes_invalid_utf8():
+    t = JSVTemplate('{"key_1","key_2"}')
+    for rec in (b'{"a\xff",1}', b'{1,"\xc3"}', b'{1,2,"\xe9":3}'):
+        with pytest.raises(JSVRecordDecodeError):
+            t.decode_bytes(rec)
+    with pytest.raises(JSVRecordDecodeError):
+        JSVTemplate('{}').decode_bytes(b'{"\xff":1}')
+
+
+@pytest.mark.parametrize('rec_str', [
+    '{"a\tb",}', '{"a\nb",[]}', '{"\x00",}', '{"\x1f\\n",}', '{1,[{"\x7f\x01"}]}', '{1,[{2,"x":"\r"}]}',
+    '{1,,"x":"a\x1fb"}', '{1,[{01}]}', '{1,[{2}', '{1,}x', '{"\\x",}', '{tru,}', '{1,2,3}'
+])
+def test_decode_bytes_rejects_what_decode_rejects(rec_str):
+    t = JSVTemplate('{"a","b":[{"c"}]}')
+    with pytest.raises(JSVRecordDecodeError):
+        t.decode(rec_str)
+    with pytest.raises(JSVRecordDecodeError):
+        t.decode_bytes(rec_str.encode('utf-8'))